@@ -1,14 +1,17 @@
-from cloudinary.forms import CloudinaryFileField
 from django import forms
 from django.contrib import admin
 from django.contrib.admin import SimpleListFilter
 from django.contrib.auth import get_user_model
 from django.contrib.auth.admin import UserAdmin
+from django.db.models import Count, Exists, OuterRef
 from django.urls import reverse
 from django.utils.html import format_html
+from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 
+from ..core.paginator import KeysetPaginator
 from .forms import UserCreationForm, UserChangeForm
+from .helpers.images import IMAGE_FIELDS, accept_upload, validate_image
 from .models import Profile,NextOfKin
 
 # Register your models here.
@@ -31,15 +34,34 @@ class UserAdmin(UserAdmin):
     )
     search_fields = ("email", "username", "first_name", "last_name", "id_no")
     ordering = ("email",)
+    paginator = KeysetPaginator
+    show_full_result_count = False
 
 
 
 class ProfileAdminForm(forms.ModelForm):
-    photo = CloudinaryFileField( options={"crop":"thumb", "width":200, "height":200, "folder":"fintech_profile"} )
+    """
+    Profile form whose image uploads are handed to the background image pipeline on save.
+    """
+    photo_upload = forms.FileField(label=_("Photo"), required=False)
+    id_photo_upload = forms.FileField(label=_("ID Photo"), required=False)
+    signature_photo_upload = forms.FileField(label=_("Signature Photo"), required=False)
+
     class Meta:
         model = Profile
         fields = "__all__"
 
+    def clean(self):
+        cleaned_data = super().clean()
+        for field in IMAGE_FIELDS:
+            upload = cleaned_data.get(f"{field}_upload")
+            if upload:
+                try:
+                    validate_image(upload)
+                except forms.ValidationError as e:
+                    self.add_error(f"{field}_upload", e)
+        return cleaned_data
+
 
 
 class NextOfKinInline(admin.TabularInline):
@@ -75,11 +97,9 @@ class ProfileCompletionFilter(SimpleListFilter):
 
     def queryset(self, request, queryset):
         if self.value() == 'complete':
-            return queryset.filter(next_of_kin__isnull=False).distinct()
+            return queryset.filter(is_complete=True)
         if self.value() == 'incomplete':
-            # This is a simplification - actual implementation would call is_complete_with_next_of_kin
-            # on each profile which would be inefficient for large datasets
-            return queryset.filter(next_of_kin__isnull=True)
+            return queryset.filter(is_complete=False)
 
 
 class EmploymentStatusFilter(SimpleListFilter):
@@ -101,14 +121,18 @@ class ProfileAdmin(admin.ModelAdmin):
     Admin for Profile model.
     """
     form = ProfileAdminForm
-    list_display = ('user', 'display_name', 'phone_number', 'employment_status',
-                    'nationality', 'profile_completion', 'has_next_of_kin', 'view_user_link')
+    list_display = ('thumbnail', 'user', 'display_name', 'phone_number', 'employment_status',
+                    'nationality_name', 'completion_score', 'profile_completion', 'has_next_of_kin', 'next_of_kin_count',
+                    'has_primary_next_of_kin', 'view_user_link')
     list_filter = ('gender', 'marital_status', EmploymentStatusFilter,
                    'nationality', 'employment_status', ProfileCompletionFilter)
     search_fields = ('user__email', 'user__first_name', 'user__last_name',
                      'phone_number', 'passport_number', 'city')
-    readonly_fields = ('created_at', 'updated_at', 'display_photos')
+    readonly_fields = ('created_at', 'updated_at', 'completion_score', 'display_photos')
     inlines = [NextOfKinInline]
+    ordering = ('-created_at',)
+    paginator = KeysetPaginator
+    show_full_result_count = False
 
     fieldsets = (
         (_('User Information'), {
@@ -130,13 +154,34 @@ class ProfileAdmin(admin.ModelAdmin):
                        'date_of_employment', 'employer_address', 'employer_city', 'employer_state')
         }),
         (_('Photos'), {
-            'fields': ('display_photos',),
+            'fields': ('display_photos', 'photo_upload', 'id_photo_upload', 'signature_photo_upload'),
             'classes': ('collapse',),
         }),
     )
 
     def get_queryset(self, request):
-        return super().get_queryset(request).select_related('user')
+        """Load the user and the next of kin columns with the page query."""
+        return super().get_queryset(request).select_related('user').annotate(
+            next_of_kin_count=Count('next_of_kin'),
+            has_primary_next_of_kin=Exists(NextOfKin.objects.filter(profile=OuterRef('pk'), is_primary=True)),
+        )
+
+    def save_model(self, request, obj, form, change):
+        """Save the profile, then queue the uploaded images for processing."""
+        super().save_model(request, obj, form, change)
+        for field in IMAGE_FIELDS:
+            upload = form.cleaned_data.get(f"{field}_upload")
+            if upload:
+                accept_upload(obj, field, upload)
+
+    def thumbnail(self, obj):
+        """Display the small profile photo variant."""
+        url = obj.image_variants.get('photo', {}).get('thumb', {}).get('jpeg')
+        if not url:
+            return ""
+        return format_html('<img src="{}" width="48" height="48" loading="lazy" alt=""/>', url)
+
+    thumbnail.short_description = _('Photo')
 
     def display_name(self, obj):
         """Display the user's full name."""
@@ -144,37 +189,67 @@ class ProfileAdmin(admin.ModelAdmin):
 
     display_name.short_description = _('Name')
 
+    def nationality_name(self, obj):
+        """Display the nationality without rebuilding the country choices for every row."""
+        return obj.nationality.name if obj.nationality else ""
+
+    nationality_name.admin_order_field = 'nationality'
+    nationality_name.short_description = _('Nationality')
+
     def has_next_of_kin(self, obj):
         """Check if the profile has next of kin."""
-        return obj.next_of_kin.exists()
+        return obj.has_next_of_kin
 
     has_next_of_kin.boolean = True
+    has_next_of_kin.admin_order_field = 'has_next_of_kin'
     has_next_of_kin.short_description = _('Has Next of Kin')
 
+    def next_of_kin_count(self, obj):
+        """Display the number of next of kin."""
+        return obj.next_of_kin_count
+
+    next_of_kin_count.admin_order_field = 'next_of_kin_count'
+    next_of_kin_count.short_description = _('Next of Kin')
+
+    def has_primary_next_of_kin(self, obj):
+        """Check if a next of kin is marked as primary."""
+        return obj.has_primary_next_of_kin
+
+    has_primary_next_of_kin.boolean = True
+    has_primary_next_of_kin.admin_order_field = 'has_primary_next_of_kin'
+    has_primary_next_of_kin.short_description = _('Primary Next of Kin')
+
     def profile_completion(self, obj):
         """Display profile completion status."""
-        return obj.is_complete_with_next_of_kin()
+        return obj.is_complete
 
     profile_completion.boolean = True
+    profile_completion.admin_order_field = 'is_complete'
     profile_completion.short_description = _('Profile Complete')
 
     def view_user_link(self, obj):
         """Create a link to the user admin."""
-        url = reverse('admin:auth_user_change', args=[obj.user.id])
+        url = reverse('admin:account_user_change', args=[obj.user_id])
         return format_html('<a href="{}">{}</a>', url, _('View User'))
 
     view_user_link.short_description = _('User Details')
 
     def display_photos(self, obj):
-        """Display profile photos in the admin."""
-        html = ""
-        if obj.photo_url:
-            html += format_html('<p><strong>Profile Photo:</strong><br/><img src="{}" width="200"/></p>', obj.photo_url)
-        if obj.id_photo_url:
-            html += format_html('<p><strong>ID Photo:</strong><br/><img src="{}" width="200"/></p>', obj.id_photo_url)
-        if obj.signature_photo_url:
-            html += format_html('<p><strong>Signature:</strong><br/><img src="{}" width="200"/></p>',
-                                obj.signature_photo_url)
+        """Display the profile photos in the admin, preferring the resized variants."""
+        html = mark_safe("")
+        for field, label in (('photo', _('Profile Photo')), ('id_photo', _('ID Photo')),
+                             ('signature_photo', _('Signature'))):
+            variants = obj.image_variants.get(field, {}).get('display')
+            if variants:
+                html += format_html(
+                    '<p><strong>{}:</strong><br/><picture><source srcset="{}" type="image/webp"/>'
+                    '<img src="{}" width="200" loading="lazy" alt=""/></picture></p>',
+                    label, variants['webp'], variants['jpeg'])
+            elif getattr(obj, IMAGE_FIELDS[field]):
+                html += format_html('<p><strong>{}:</strong><br/><img src="{}" width="200" alt=""/></p>',
+                                    label, getattr(obj, IMAGE_FIELDS[field]))
+            if 'pending' in obj.image_variants.get(field, {}):
+                html += format_html('<p>{}</p>', _('A new upload is being processed.'))
         return html or _("No photos available")
 
     display_photos.short_description = _('Profile Photos')
@@ -215,8 +290,8 @@ class NextOfKinAdmin(admin.ModelAdmin):
 
     def profile_user(self, obj):
         """Display the profile's user."""
-        user_url = reverse('admin:auth_user_change', args=[obj.profile.user.id])
-        profile_url = reverse('admin:app_profile_change', args=[obj.profile.id])
+        user_url = reverse('admin:account_user_change', args=[obj.profile.user_id])
+        profile_url = reverse('admin:account_profile_change', args=[obj.profile_id])
         return format_html(
             '<a href="{}">{}</a> (<a href="{}">{}</a>)',
             user_url, obj.profile.user.get_full_name() if hasattr(obj.profile.user,
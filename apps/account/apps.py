@@ -10,4 +10,4 @@ class AccountConfig(AppConfig):
         """
         Override the ready method to import signals.
         """
-        import apps.account.signals
\ No newline at end of file
+        import apps.account.signals
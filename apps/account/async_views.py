@@ -0,0 +1,258 @@
+import json
+from http import HTTPStatus
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import aauthenticate, get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.http import JsonResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from loguru import logger
+from rest_framework.exceptions import AuthenticationFailed, ParseError, Throttled
+from rest_framework.request import Request
+from rest_framework.settings import api_settings as drf_settings
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .cookie_auth import CookieAuthentication
+from .helpers.emails import adelay, send_otp_email
+from .helpers.lockout import get_lockout_engine
+from .helpers.otp import get_otp_store
+from .metrics import OTP_SENT, OTP_VERIFICATIONS, REFRESH_FAILURES
+from .tokens import AccountRefreshToken, check_refresh_token, revoke_tokens, rotate_refresh_token
+from .utils import generate_otp, get_client_ip
+from .views import REFRESH_FAILURE_REASONS, failed_login_logger, set_auth_cookie
+
+User = get_user_model()
+
+
+@method_decorator(csrf_exempt, name="dispatch")
+class AsyncAuthView(View):
+    """
+    Base class for the async authentication views served under ASGI.
+    Authentication, throttling and the responses match the DRF views they replace.
+    """
+    http_method_names = ["post"]
+    throttle_classes = drf_settings.DEFAULT_THROTTLE_CLASSES
+
+    @staticmethod
+    def get_data(request):
+        """
+        Parse a JSON or form encoded request body.
+        :param request: The HTTP request object.
+        :return: The request data
+        :raises ParseError: If the JSON body is invalid or not an object
+        """
+        if request.content_type == "application/json":
+            try:
+                data = json.loads(request.body or b"{}")
+            except ValueError:
+                raise ParseError("Malformed request body.")
+            if not isinstance(data, dict):
+                raise ParseError("Malformed request body.")
+            return data
+        return request.POST
+
+    def check_throttles(self, request):
+        """
+        Run the DRF throttles against the request.
+        :param request: The HTTP request object.
+        :return: The wait of every throttle that refused the request, empty if it is allowed
+        """
+        # Read the body first, so it stays available to the view after the throttles parse it.
+        request.body
+        drf_request = Request(request, parsers=[parser() for parser in drf_settings.DEFAULT_PARSER_CLASSES])
+        drf_request.user = self.user or AnonymousUser()
+        throttles = [throttle_class() for throttle_class in self.throttle_classes]
+        return [throttle.wait() for throttle in throttles if not throttle.allow_request(drf_request, self)]
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            authenticated = await sync_to_async(CookieAuthentication().authenticate)(request)
+        except AuthenticationFailed as e:
+            return JsonResponse({"detail": str(e.detail)}, status=HTTPStatus.UNAUTHORIZED)
+        self.user, self.auth = authenticated or (None, None)
+        waits = await sync_to_async(self.check_throttles)(request)
+        if waits:
+            throttled = Throttled(max((wait for wait in waits if wait is not None), default=None))
+            return JsonResponse({"detail": str(throttled.detail)}, status=HTTPStatus.TOO_MANY_REQUESTS,
+                                headers={"Retry-After": str(throttled.wait)} if throttled.wait else None)
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except ParseError as e:
+            return JsonResponse({"detail": str(e.detail)}, status=HTTPStatus.BAD_REQUEST)
+
+
+class AsyncTokenCreateView(AsyncAuthView):
+    """
+    Async version of ``CustomTokenCreatView``.
+    """
+    throttle_scope = "login"
+    throttle_key_fields = ("email",)
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Check the credentials and send an OTP to the user.
+        :param request: The HTTP request object.
+        :param args: Additional positional arguments.
+        :param kwargs: Additional keyword arguments.
+        :return: The HTTP response object.
+        """
+        data = self.get_data(request)
+        ip_address = get_client_ip(request)
+        lockout_engine = get_lockout_engine()
+        if await lockout_engine.ais_ip_blocked(ip_address):
+            logger.warning(f"Login blocked for {ip_address} after too many failed attempts")
+            return JsonResponse({"detail": "Too many failed login attempts. Please try again later."},
+                                status=HTTPStatus.TOO_MANY_REQUESTS)
+        email = data.get("email")
+        user = await aauthenticate(request, email=email, password=data.get("password")) if email else None
+        if user is None:
+            return await self.failed_login(email, ip_address)
+
+        if await user.ais_locked_out():
+            return JsonResponse({
+                "detail": f"Account is locked  due to multiple attempts try again after {settings.LOCKOUT_DURATION.total_seconds() / 60} minutes."},
+                status=HTTPStatus.FORBIDDEN)
+        await user.areset_failed_login_attempt()
+        otp = generate_otp()
+        await get_otp_store().aissue(user.email, otp)
+        await adelay(send_otp_email, user.email, otp)
+        OTP_SENT.inc()
+        logger.info(f"OTP queued for {user.email}")
+        return JsonResponse({"detail": "OTP sent to your email. Please verify to log in."}, status=HTTPStatus.OK)
+
+    @staticmethod
+    async def failed_login(email, ip_address):
+        """
+        Count a failed login and build the response.
+        :param email: The email used for the attempt.
+        :param ip_address: The client IP address.
+        :return: The HTTP response object.
+        """
+        user = await User.objects.filter(email=email).afirst() if email else None
+        if user:
+            if await user.ahandle_failed_login_attempt(ip_address):
+                return JsonResponse({
+                    "detail": "Account is temporarily locked due to multiple failed login attempts."},
+                    status=HTTPStatus.FORBIDDEN)
+        elif email:
+            await get_lockout_engine().aregister_failure(email, ip_address)
+        failed_login_logger.error(f"Failed login attempt for {email}")
+        return JsonResponse({"detail": "Invalid credentials provided."}, status=HTTPStatus.BAD_REQUEST)
+
+
+class AsyncOTPVerifyView(AsyncAuthView):
+    """
+    Async version of ``OTPVerifyView``.
+    """
+    throttle_scope = "verify_otp"
+    throttle_key_fields = ("email",)
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Verify the OTP sent to the user.
+        :param request: The HTTP request object.
+        :param args: Additional positional arguments.
+        :param kwargs: Additional keyword arguments.
+        :return: The HTTP response object.
+        """
+        data = self.get_data(request)
+        email = data.get('email')
+        otp = data.get('otp')
+        if not email or not otp:
+            return JsonResponse({"detail": "Email and OTP are required."}, status=HTTPStatus.BAD_REQUEST)
+        if not await get_otp_store().averify(email, otp):
+            OTP_VERIFICATIONS.labels("invalid").inc()
+            return JsonResponse({"detail": "Invalid or expired OTP."}, status=HTTPStatus.BAD_REQUEST)
+        user = await User.objects.filter(email=email).afirst()
+        if not user:
+            OTP_VERIFICATIONS.labels("invalid").inc()
+            return JsonResponse({"detail": "Invalid or expired OTP."}, status=HTTPStatus.BAD_REQUEST)
+
+        if await user.ais_locked_out():
+            OTP_VERIFICATIONS.labels("locked").inc()
+            return JsonResponse({
+                "detail": f"Account is locked due to multiple attempts. Try again after {settings.LOCKOUT_DURATION.total_seconds() / 60} minutes."},
+                status=HTTPStatus.FORBIDDEN)
+        OTP_VERIFICATIONS.labels("success").inc()
+        refresh = AccountRefreshToken.for_user(user)
+        access_token = str(refresh.access_token)
+        refresh_token = str(refresh)
+        response = JsonResponse({
+            "detail": "OTP verified successfully.",
+            "access": access_token,
+            "refresh": refresh_token
+        }, status=HTTPStatus.OK)
+        set_auth_cookie(response, access_token, refresh_token)
+        return response
+
+
+class AsyncTokenRefreshView(AsyncAuthView):
+    """
+    Async version of ``CustomTokenRefreshView``.
+    """
+    throttle_scope = "refresh"
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Rotate the refresh token from the cookie and set new cookies.
+        :param request: The HTTP request object.
+        :param args: Additional positional arguments.
+        :param kwargs: Additional keyword arguments.
+        :return: The HTTP response object.
+        """
+        refresh_token = request.COOKIES.get('refresh_token')
+        if not refresh_token:
+            logger.error(f"No refresh token provided for {request.path}")
+            REFRESH_FAILURES.labels("missing").inc()
+            return JsonResponse({"detail": "Refresh token not found."}, status=HTTPStatus.UNAUTHORIZED)
+        try:
+            refresh = RefreshToken(refresh_token)
+        except TokenError as e:
+            REFRESH_FAILURES.labels("invalid").inc()
+            return JsonResponse({"detail": str(e.args[0]), "code": "token_not_valid"},
+                                status=HTTPStatus.UNAUTHORIZED)
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id:
+            user = await User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).afirst()
+            if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+                REFRESH_FAILURES.labels("inactive").inc()
+                return JsonResponse({"detail": "No active account found for the given token.",
+                                     "code": "no_active_account"}, status=HTTPStatus.UNAUTHORIZED)
+            try:
+                await sync_to_async(check_refresh_token)(refresh, user)
+            except AuthenticationFailed as e:
+                REFRESH_FAILURES.labels(REFRESH_FAILURE_REASONS[e.get_codes()]).inc()
+                return JsonResponse({"detail": str(e.detail), "code": e.get_codes()}, status=HTTPStatus.UNAUTHORIZED)
+        tokens = rotate_refresh_token(refresh)
+        response = JsonResponse({"message": "Tokens refreshed successfully."}, status=HTTPStatus.OK)
+        set_auth_cookie(response, tokens["access"], tokens.get("refresh"))
+        return response
+
+
+class AsyncLogoutView(AsyncAuthView):
+    """
+    Async version of ``LogoutView``.
+    """
+
+    async def post(self, request, *args, **kwargs):
+        """
+        Handle user logout.
+        :param request: The HTTP request object.
+        :param args: Additional positional arguments.
+        :param kwargs: Additional keyword arguments.
+        :return: The HTTP response object.
+        """
+        if self.user is None:
+            return JsonResponse({"detail": "Authentication credentials were not provided."},
+                                status=HTTPStatus.UNAUTHORIZED)
+        await sync_to_async(revoke_tokens)(self.auth, request.COOKIES.get('refresh_token'))
+        response = JsonResponse({"detail": "Logged out successfully."}, status=HTTPStatus.OK)
+        response.delete_cookie(settings.COOKIE_NAME)
+        response.delete_cookie('refresh_token')
+        response.delete_cookie('logged_in')
+        return response
@@ -0,0 +1,34 @@
+from django.contrib.auth import get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+from .helpers.hashing import get_hashing_service
+
+UserModel = get_user_model()
+
+
+class AccountBackend(ModelBackend):
+    """
+    Model backend whose async path never hashes on the event loop.
+    """
+
+    async def aauthenticate(self, request, username=None, password=None, **kwargs):
+        """
+        Authenticate the user without blocking the event loop.
+        :param request: The HTTP request object.
+        :param username: The email of the user.
+        :param password: The raw password.
+        :param kwargs: Additional credentials.
+        :return: The user if the credentials are valid, None otherwise
+        """
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None or password is None:
+            return
+        try:
+            user = await UserModel._default_manager.aget_by_natural_key(username)
+        except UserModel.DoesNotExist:
+            # Hash once anyway so unknown emails take as long as wrong passwords.
+            await get_hashing_service().amake_password(password)
+        else:
+            if await user.acheck_password(password) and self.user_can_authenticate(user):
+                return user
@@ -1,7 +1,15 @@
 from django.conf import settings
+from django.utils.translation import gettext_lazy as _
 from loguru import logger
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.authentication import JWTAuthentication
-from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .helpers.revocation import get_revocation_store
+from .tokens import TOKEN_VERSION_CLAIM, ClaimsUser, get_token_version
+
+token_error_logger = logger.bind(channel="auth.token_error")
 
 
 class CookieAuthentication(JWTAuthentication):
@@ -26,5 +34,34 @@ class CookieAuthentication(JWTAuthentication):
                 validated_token = self.get_validated_token(raw_token)
                 return self.get_user(validated_token), validated_token
             except TokenError as e:
-                logger.error(f"Token error: {e}")
+                token_error_logger.error(f"Token error: {e}")
         return None
+
+    def get_validated_token(self, raw_token):
+        """
+        Validate the token and reject it if it was revoked by a logout.
+        """
+        validated_token = super().get_validated_token(raw_token)
+        if get_revocation_store().is_revoked(validated_token):
+            raise AuthenticationFailed(_("Token has been revoked."), code="token_revoked")
+        return validated_token
+
+    def get_user(self, validated_token):
+        """
+        Return the user for the token.
+        With ``AUTH_STATELESS_USER`` enabled, a ``ClaimsUser`` is built from the token claims
+        and the user row is only loaded if a view needs other fields.
+        """
+        if not settings.AUTH_STATELESS_USER or TOKEN_VERSION_CLAIM not in validated_token:
+            user = super().get_user(validated_token)
+            if validated_token.get(TOKEN_VERSION_CLAIM, user.token_version) != user.token_version:
+                raise AuthenticationFailed(_("Token has been revoked."), code="token_revoked")
+            return user
+
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+        if validated_token[TOKEN_VERSION_CLAIM] != get_token_version(user_id):
+            raise AuthenticationFailed(_("Token has been revoked."), code="token_revoked")
+        return ClaimsUser(validated_token)
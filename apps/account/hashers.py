@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher
+
+
+class TunedArgon2PasswordHasher(Argon2PasswordHasher):
+    """
+    Argon2 hasher whose cost parameters come from ``ARGON2_PARAMETERS``.
+    The algorithm name is unchanged, so existing hashes still verify and are upgraded to the
+    configured parameters on the next successful login. Use ``calibrate_hashers`` to pick them.
+    """
+
+    @property
+    def time_cost(self):
+        return settings.ARGON2_PARAMETERS.get("time_cost", Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return settings.ARGON2_PARAMETERS.get("memory_cost", Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return settings.ARGON2_PARAMETERS.get("parallelism", Argon2PasswordHasher.parallelism)
@@ -0,0 +1,157 @@
+import secrets
+import threading
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.template.loader import render_to_string
+from django.utils.html import conditional_escape, strip_tags
+from django.utils.translation import get_language
+
+
+class CompiledEmail:
+    """
+    An email template rendered once for one language, with markers in place of the per-recipient
+    variables, and its plaintext twin stripped once from that rendering. Each side is kept as a list
+    of literal parts and variable names, so a message only joins strings.
+    """
+
+    def __init__(self, subject, html_parts, text_parts):
+        self.subject = subject
+        self.html_parts = html_parts
+        self.text_parts = text_parts
+
+    @staticmethod
+    def split(rendered, markers) -> list:
+        """
+        Split a rendering on the variable markers.
+        :param rendered: The HTML or plaintext rendering.
+        :param markers: Variable name by marker.
+        :return: Alternating literal strings and ``(name,)`` tuples
+        """
+        parts = [rendered]
+        for marker, name in markers.items():
+            split = []
+            for part in parts:
+                if isinstance(part, tuple):
+                    split.append(part)
+                    continue
+                pieces = part.split(marker)
+                for index, piece in enumerate(pieces):
+                    if index:
+                        split.append((name,))
+                    split.append(piece)
+            parts = split
+        return parts
+
+    @staticmethod
+    def join(parts, values) -> str:
+        return "".join(values[part[0]] if isinstance(part, tuple) else part for part in parts)
+
+    def render(self, **variables):
+        """
+        Render the message bodies for one recipient. Values are HTML-escaped in both bodies,
+        as they were by ``render_to_string`` before the tags were stripped.
+        :param variables: The per-recipient variables.
+        :return: Tuple of the plaintext and the HTML body
+        """
+        values = {name: conditional_escape(value) for name, value in variables.items()}
+        return self.join(self.text_parts, values), self.join(self.html_parts, values)
+
+
+class EmailTemplate:
+    """
+    An email whose template is compiled once per language, see ``CompiledEmail``.
+    The context is built from the settings at compile time; only ``variables`` change per recipient
+    and they must be output as plain ``{{ variable }}`` in the template, without filters.
+    """
+
+    def __init__(self, template_name, subject, variables, context=None):
+        self.template_name = template_name
+        self.subject = subject
+        self.variables = tuple(variables)
+        self.context = context or dict
+        self._compiled = {}
+        self._lock = threading.Lock()
+
+    def compile(self) -> CompiledEmail:
+        """
+        Render the template with a marker per variable and strip the tags of that rendering.
+        :return: The compiled template of the active language
+        """
+        token = secrets.token_hex(8)
+        markers = {f"emailvar{token}{index}": name for index, name in enumerate(self.variables)}
+        html = render_to_string(self.template_name, {
+            **self.context(), **{name: marker for marker, name in markers.items()},
+        })
+        text = strip_tags(html)
+        for marker, name in markers.items():
+            if marker not in html or html.count(marker) != text.count(marker):
+                raise ImproperlyConfigured(f"{self.template_name} must output {{{{ {name} }}}} as is.")
+        return CompiledEmail(str(self.subject), CompiledEmail.split(html, markers), CompiledEmail.split(text, markers))
+
+    def compiled(self) -> CompiledEmail:
+        """
+        :return: The compiled template of the active language, compiling it on first use
+        """
+        language = get_language()
+        compiled = self._compiled.get(language)
+        if compiled is None:
+            with self._lock:
+                compiled = self._compiled.get(language)
+                if compiled is None:
+                    compiled = self._compiled[language] = self.compile()
+        return compiled
+
+    def render(self, **variables):
+        """
+        Render the subject and bodies for one recipient.
+        :param variables: The per-recipient variables.
+        :return: Tuple of the subject, the plaintext and the HTML body
+        """
+        compiled = self.compiled()
+        return (compiled.subject, *compiled.render(**variables))
+
+    def render_many(self, recipients) -> list:
+        """
+        Render the subject and bodies for many recipients, looking the compiled template up once.
+        :param recipients: Dictionaries of per-recipient variables.
+        :return: ``(subject, text, html)`` tuples in the order of the recipients
+        """
+        compiled = self.compiled()
+        return [(compiled.subject, *compiled.render(**variables)) for variables in recipients]
+
+    def clear(self):
+        self._compiled.clear()
+
+
+EMAIL_TEMPLATES = []
+
+
+def register_email_template(template) -> EmailTemplate:
+    """
+    Track a template so compiled renderings are dropped when the settings change.
+    :param template: The email template.
+    :return: The template
+    """
+    EMAIL_TEMPLATES.append(template)
+    return template
+
+
+def compile_email_templates():
+    """
+    Compile every registered template for the active language, e.g. before forking workers.
+    """
+    from . import emails  # noqa: F401, registers the templates
+
+    for template in EMAIL_TEMPLATES:
+        template.compiled()
+
+
+@receiver(setting_changed)
+def clear_email_templates(**kwargs):
+    """
+    The compiled renderings hold settings such as ``SITE_NAME``, drop them when settings change in tests.
+    """
+    for template in EMAIL_TEMPLATES:
+        template.clear()
@@ -1,11 +1,157 @@
+from smtplib import SMTPDataError, SMTPException, SMTPRecipientsRefused, SMTPServerDisconnected
+
+from asgiref.sync import sync_to_async
+from celery import shared_task
+from celery.signals import worker_process_shutdown
+from celery.utils.time import get_exponential_backoff_interval
 from django.conf import settings
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
-from django.utils.translation import  gettext as _
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.utils.translation import gettext as _, gettext_lazy
 from loguru import logger
 
+from .email_templates import EmailTemplate, register_email_template
+
+
+OTP_EMAIL = register_email_template(EmailTemplate(
+    'emails/otp_email.html',
+    gettext_lazy("OTP confirmation"),
+    variables=("otp",),
+    context=lambda: {
+        'site_name': settings.SITE_NAME,
+        'expires_time': int(settings.OTP_EXPIRATION_TIME.total_seconds() // 60),
+    },
+))
+
+ACCOUNT_LOCKED_EMAIL = register_email_template(EmailTemplate(
+    'emails/account_locked.html',
+    gettext_lazy("Account Locked"),
+    variables=("full_name",),
+    context=lambda: {
+        'site_name': settings.SITE_NAME,
+        'login_attempts_limit': settings.LOGIN_ATTEMPTS_LIMIT,
+        'lockout_duration': int(settings.LOCKOUT_DURATION.total_seconds() // 60),
+    },
+))
+
+EMAIL_TEMPLATES_BY_KIND = {
+    "otp": OTP_EMAIL,
+    "account_locked": ACCOUNT_LOCKED_EMAIL,
+}
+
+
+def make_email(email, subject, text, html):
+    """
+    Wrap rendered bodies in a message with a plaintext and an HTML alternative.
+    :param email: The recipient.
+    :param subject: The subject.
+    :param text: The plaintext body.
+    :param html: The HTML body.
+    :return: The email message
+    """
+    message = EmailMultiAlternatives(subject, text, settings.DEFAULT_FROM_EMAIL, [email])
+    message.attach_alternative(html, "text/html")
+    return message
+
+
+def build_otp_email(email, otp):
+    """
+    Build the OTP email for the user.
+    :param email:
+    :param otp:
+    :return: The email message
+    """
+    return make_email(email, *OTP_EMAIL.render(otp=otp))
+
+
+def build_account_locked_email(email, full_name):
+    """
+    Build the account locked email for the user.
+    :param email:
+    :param full_name:
+    :return: The email message
+    """
+    return make_email(email, *ACCOUNT_LOCKED_EMAIL.render(full_name=full_name))
+
+
+def build_emails(kind, recipients) -> list:
+    """
+    Build the emails of one kind for many recipients from the compiled template.
+    :param kind: A key of ``EMAIL_TEMPLATES_BY_KIND``.
+    :param recipients: Dictionaries of the builder arguments, e.g. ``{"email": ..., "otp": ...}``.
+    :return: The email messages in the order of the recipients
+    """
+    template = EMAIL_TEMPLATES_BY_KIND[kind]
+    recipients = list(recipients)
+    rendered = template.render_many({name: recipient[name] for name in template.variables}
+                                    for recipient in recipients)
+    return [make_email(recipient["email"], *parts) for recipient, parts in zip(recipients, rendered)]
+
+
+class PersistentMailSender:
+    """
+    Keeps one mail backend connection open per worker process and reuses it across messages.
+    A dropped connection is reopened once before the error is surfaced.
+    """
 
+    def __init__(self, backend=None, **connection_kwargs):
+        self.backend = backend
+        self.connection_kwargs = connection_kwargs
+        self._connection = None
+
+    @property
+    def connection(self):
+        if self._connection is None:
+            self._connection = get_connection(
+                self.backend or settings.CELERY_EMAIL_BACKEND, fail_silently=False, **self.connection_kwargs
+            )
+            self._connection.open()
+        return self._connection
+
+    def send_messages(self, messages) -> int:
+        """
+        Send the messages over the shared connection.
+        :param messages: The email messages.
+        :return: Number of messages sent
+        """
+        try:
+            return self.connection.send_messages(messages) or 0
+        except SMTPServerDisconnected:
+            logger.warning("Mail connection dropped, reconnecting")
+            self.close()
+            return self.connection.send_messages(messages) or 0
+
+    def close(self):
+        """
+        Close the shared connection.
+        :return: None
+        """
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Exception as e:
+                logger.warning(f"Failed to close mail connection: {e}")
+            self._connection = None
+
+
+mail_sender = PersistentMailSender()
+
+
+@worker_process_shutdown.connect
+def close_mail_connection(**kwargs):
+    """
+    Close the shared mail connection when the worker process stops.
+    """
+    mail_sender.close()
+
+
+@shared_task(
+    name="apps.account.helpers.emails.send_otp_email",
+    ignore_result=True,
+    autoretry_for=(SMTPException, OSError),
+    retry_backoff=True,
+    max_retries=3,
+    priority=9,
+)
 def send_otp_email(email, otp):
     """
     Send an OTP email to the user.
@@ -13,47 +159,94 @@ def send_otp_email(email, otp):
     :param otp:
     :return:
     """
-    subject = _("OTP confirmation")
-    from_email = settings.DEFAULT_FROM_EMAIL
-    recipient_list = [email]
-    context = {
-        'otp': otp,
-        'site_name': settings.SITE_NAME,
-        'expires_time': settings.OTP_EXPIRATION_TIME,
-    }
-    template_name = 'emails/otp_email.html'
-    html_message = render_to_string(template_name, context)
-    plain_email = strip_tags(html_message)
-    email = EmailMultiAlternatives(subject, plain_email, from_email, recipient_list)
-    email.attach_alternative(html_message, "text/html")
-    try:
-        email.send()
-        logger.success(_("OTP email sent"))
-    except Exception as e:
-        logger.error(_("Failed to send OTP email: {}").format(e))
-
-
-def send_account_locked_email(self):
+    mail_sender.send_messages([build_otp_email(email, otp)])
+    logger.success(_("OTP email sent"))
+
+
+@shared_task(
+    name="apps.account.helpers.emails.send_account_locked_email",
+    ignore_result=True,
+    autoretry_for=(SMTPException, OSError),
+    retry_backoff=True,
+    max_retries=3,
+    priority=9,
+)
+def send_account_locked_email(email, full_name):
     """
     Send an account locked email to the user.
-    :param self:
+    :param email:
+    :param full_name:
     :return:
     """
-    subject = _("Account Locked")
-    from_email = settings.DEFAULT_FROM_EMAIL
-    recipient_list = [self.email]
-    context = {
-        'site_name': settings.SITE_NAME,
-        'login_attempts_limit': settings.LOGIN_ATTEMPTS_LIMIT,
-        'lockout_duration': int(settings.LOCKOUT_DURATION.total_seconds() // 60),
-    }
-    template_name = 'emails/account_locked.html'
-    html_message = render_to_string(template_name, context)
-    plain_email = strip_tags(html_message)
-    email = EmailMultiAlternatives(subject, plain_email, from_email, recipient_list)
-    email.attach_alternative(html_message, "text/html")
-    try:
-        email.send()
-        logger.success(_("Account locked email sent"))
-    except Exception as e:
-        logger.error(_("Failed to send account locked email: {}").format(e))
\ No newline at end of file
+    mail_sender.send_messages([build_account_locked_email(email, full_name)])
+    logger.success(_("Account locked email sent"))
+
+
+@shared_task(
+    name="apps.account.helpers.emails.send_email_batch",
+    bind=True,
+    ignore_result=True,
+    max_retries=3,
+)
+def send_email_batch(self, payloads):
+    """
+    Render a batch of emails and send them one at a time over the shared connection.
+    A message the server refuses is logged and skipped. When the connection fails, the task is retried
+    with the messages not sent yet, so recipients already served never get a second copy.
+    :param payloads: List of ``{"kind": ..., "kwargs": {...}}`` dictionaries.
+    :return:
+    """
+    pending = []
+    for payload in payloads:
+        try:
+            pending.append((payload, build_emails(payload["kind"], [payload["kwargs"]])[0]))
+        except Exception as e:
+            logger.error(_("Failed to render {} email: {}").format(payload.get("kind"), e))
+    sent = 0
+    for index, (payload, message) in enumerate(pending):
+        try:
+            sent += mail_sender.send_messages([message])
+            continue
+        except (SMTPRecipientsRefused, SMTPDataError) as e:
+            # Only this message was refused, the rest of the batch still goes out.
+            logger.error(_("Failed to send {} email: {}").format(payload["kind"], e))
+            continue
+        except SMTPServerDisconnected as e:
+            error = e
+        except SMTPException:
+            raise
+        except OSError as e:
+            # Socket level failures, the connection is gone.
+            error = e
+        logger.warning(_("{} emails sent, retrying the other {}: {}").format(sent, len(pending) - index, error))
+        countdown = get_exponential_backoff_interval(1, self.request.retries, 600, full_jitter=True)
+        unsent = [unsent_payload for unsent_payload, _message in pending[index:]]
+        raise self.retry(args=[unsent], exc=error, countdown=countdown)
+    logger.success(_("{} emails sent").format(sent))
+
+
+def queue_emails(payloads, batch_size=None):
+    """
+    Queue emails for delivery in batches.
+    :param payloads: List of ``{"kind": ..., "kwargs": {...}}`` dictionaries.
+    :param batch_size: Number of emails per task, defaults to ``EMAIL_BATCH_SIZE``.
+    :return: Number of queued tasks
+    """
+    batch_size = batch_size or settings.EMAIL_BATCH_SIZE
+    tasks = 0
+    for start in range(0, len(payloads), batch_size):
+        send_email_batch.delay(payloads[start:start + batch_size])
+        tasks += 1
+    return tasks
+
+
+async def adelay(task, *args, **kwargs):
+    """
+    Queue a Celery task from async code.
+    Publishing blocks on the broker, so it runs on the default executor instead of the event loop.
+    :param task: The task to queue.
+    :param args: The task arguments.
+    :param kwargs: The task keyword arguments.
+    :return: The async result
+    """
+    return await sync_to_async(task.delay, thread_sensitive=False)(*args, **kwargs)
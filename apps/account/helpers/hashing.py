@@ -0,0 +1,121 @@
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth import hashers
+from prometheus_client import Gauge, Histogram
+
+HASHING_QUEUED = Gauge("account_hashing_queued", "Hashing jobs waiting for a worker.", multiprocess_mode="livesum")
+HASHING_IN_FLIGHT = Gauge("account_hashing_in_flight", "Hashing jobs running on a worker.",
+                          multiprocess_mode="livesum")
+HASHING_WAIT = Histogram("account_hashing_wait_seconds", "Time hashing jobs waited for a worker.", ["operation"])
+HASHING_DURATION = Histogram("account_hashing_duration_seconds", "Time spent hashing.", ["operation"])
+
+
+class HashingService:
+    """
+    Runs password hashing on a bounded thread pool.
+    Argon2, PBKDF2 and scrypt release the GIL while hashing, so threads hash in parallel while
+    the pool size caps how many cores hashing can take from request handling. A growing
+    ``account_hashing_queued`` gauge means signup and login are CPU-bound.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or settings.PASSWORD_HASHING_WORKERS or os.cpu_count()
+        self._executor = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self):
+        # Worker threads do not survive fork, so each process builds its own pool.
+        if self._executor is None or self._pid != os.getpid():
+            with self._lock:
+                if self._executor is None or self._pid != os.getpid():
+                    self._executor = ThreadPoolExecutor(self.max_workers, thread_name_prefix="hashing")
+                    self._pid = os.getpid()
+        return self._executor
+
+    def submit(self, operation, func, *args):
+        """
+        Queue a hashing job on the pool.
+        :param operation: The operation name used as metric label.
+        :param func: The hashing function.
+        :param args: The function arguments.
+        :return: A future of the result
+        """
+        queued_at = time.perf_counter()
+        HASHING_QUEUED.inc()
+
+        def run():
+            started_at = time.perf_counter()
+            HASHING_QUEUED.dec()
+            HASHING_WAIT.labels(operation).observe(started_at - queued_at)
+            with HASHING_IN_FLIGHT.track_inprogress():
+                try:
+                    return func(*args)
+                finally:
+                    HASHING_DURATION.labels(operation).observe(time.perf_counter() - started_at)
+
+        return self.executor.submit(run)
+
+    def make_password(self, password) -> str:
+        """
+        Hash a password with the preferred hasher.
+        :param password: The raw password.
+        :return: The encoded password
+        """
+        return self.submit("make", hashers.make_password, password).result()
+
+    def check_password(self, password, encoded, setter=None) -> bool:
+        """
+        Check a raw password against an encoded one, see ``django.contrib.auth.hashers.check_password``.
+        :param password: The raw password.
+        :param encoded: The encoded password.
+        :param setter: Called with the raw password when the encoded one must be upgraded.
+        :return: True if the password is correct, False otherwise
+        """
+        is_correct, must_update = self.submit("check", hashers.verify_password, password, encoded).result()
+        if setter and is_correct and must_update:
+            setter(password)
+        return is_correct
+
+    async def amake_password(self, password) -> str:
+        """
+        Hash a password without blocking the event loop.
+        :param password: The raw password.
+        :return: The encoded password
+        """
+        return await asyncio.wrap_future(self.submit("make", hashers.make_password, password))
+
+    async def acheck_password(self, password, encoded, setter=None) -> bool:
+        """
+        Check a password without blocking the event loop.
+        :param password: The raw password.
+        :param encoded: The encoded password.
+        :param setter: Coroutine function called with the raw password when the encoded one must be upgraded.
+        :return: True if the password is correct, False otherwise
+        """
+        is_correct, must_update = await asyncio.wrap_future(
+            self.submit("check", hashers.verify_password, password, encoded)
+        )
+        if setter and is_correct and must_update:
+            await setter(password)
+        return is_correct
+
+
+_services = {}
+
+
+def get_hashing_service() -> HashingService:
+    """
+    Return the hashing service of this process.
+    :return: The hashing service
+    """
+    service = _services.get("default")
+    if service is None:
+        service = _services["default"] = HashingService()
+    return service
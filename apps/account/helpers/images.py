@@ -0,0 +1,232 @@
+import io
+import uuid
+from pathlib import PurePosixPath
+from urllib.parse import urljoin
+
+from celery import shared_task
+from celery.utils.time import get_exponential_backoff_interval
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.db import transaction
+from django.utils.module_loading import import_string
+from django.utils.translation import gettext_lazy as _
+from loguru import logger
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from fintech.bootstrap import configure_cloudinary
+
+# Profile image fields and the URL field the pipeline fills in for each.
+IMAGE_FIELDS = {"photo": "photo_url", "id_photo": "id_photo_url", "signature_photo": "signature_photo_url"}
+# Variants by name, largest first, each bounded by the box (width, height).
+IMAGE_VARIANTS = {"display": (1024, 1024), "thumb": (128, 128)}
+IMAGE_FORMATS = {"jpeg": {"format": "JPEG", "quality": 85, "optimize": True, "progressive": True},
+                 "webp": {"format": "WEBP", "quality": 80, "method": 4}}
+ACCEPTED_FORMATS = {"JPEG", "PNG", "WEBP"}
+
+
+def validate_image(upload) -> None:
+    """
+    Check an uploaded image from its header only, so the request never decodes it.
+    :param upload: The uploaded file.
+    :raises ValidationError: If the file is too large, not an accepted format or too many pixels
+    """
+    if upload.size > settings.MAX_UPLOAD_SIZE:
+        raise ValidationError(_("The image may not be larger than %(size)s MB."),
+                              params={"size": settings.MAX_UPLOAD_SIZE // (1024 * 1024)})
+    try:
+        with Image.open(upload) as image:
+            image_format, (width, height) = image.format, image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        raise ValidationError(_("Upload a valid JPEG, PNG or WebP image."))
+    finally:
+        upload.seek(0)
+    if image_format not in ACCEPTED_FORMATS:
+        raise ValidationError(_("Upload a valid JPEG, PNG or WebP image."))
+    if width * height > settings.IMAGE_MAX_PIXELS:
+        raise ValidationError(_("The image has too many pixels."))
+
+
+def render_variants(source) -> dict:
+    """
+    Decode an image once and encode every variant in every format.
+    Orientation is applied from EXIF, transparency is flattened on white, and metadata is dropped.
+    :param source: File object of the original.
+    :return: Encoded bytes by variant name and format, e.g. ``{"thumb": {"jpeg": b"..."}}``
+    """
+    with Image.open(source) as original:
+        if original.width * original.height > settings.IMAGE_MAX_PIXELS:
+            raise Image.DecompressionBombError(f"{original.width}x{original.height} image")
+        # JPEGs are decoded straight at a reduced scale when much larger than the biggest variant.
+        original.draft("RGB", max(IMAGE_VARIANTS.values()))
+        image = ImageOps.exif_transpose(original)
+        if image.mode in ("RGBA", "LA", "P"):
+            image = image.convert("RGBA")
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.getchannel("A"))
+            image = background
+        elif image.mode != "RGB":
+            image = image.convert("RGB")
+
+    variants = {}
+    for name, box in IMAGE_VARIANTS.items():
+        # Each variant is resized from the previous, smaller one instead of the original.
+        image = image.copy()
+        image.thumbnail(box, Image.Resampling.LANCZOS, reducing_gap=3.0)
+        variants[name] = {}
+        for image_format, options in IMAGE_FORMATS.items():
+            buffer = io.BytesIO()
+            image.save(buffer, **options)
+            variants[name][image_format] = buffer.getvalue()
+    return variants
+
+
+class BaseImagePublisher:
+    """
+    Publishes encoded image variants where clients can load them.
+    """
+
+    def publish(self, name, content, image_format) -> str:
+        """
+        Publish a variant.
+        :param name: Path of the variant without extension, unique per upload.
+        :param content: The encoded image.
+        :param image_format: ``jpeg`` or ``webp``.
+        :return: The absolute URL of the variant
+        """
+        raise NotImplementedError
+
+
+class CloudinaryImagePublisher(BaseImagePublisher):
+    """
+    Uploads the variants to Cloudinary as they are, without further transformations.
+    """
+
+    def __init__(self, folder="fintech_profile"):
+        self.folder = folder
+
+    def publish(self, name, content, image_format):
+        import cloudinary.uploader
+
+        configure_cloudinary()
+        result = cloudinary.uploader.upload(io.BytesIO(content), public_id=f"{name}_{image_format}",
+                                            folder=self.folder, resource_type="image", overwrite=True)
+        return result["secure_url"]
+
+
+class StorageImagePublisher(BaseImagePublisher):
+    """
+    Saves the variants in a Django storage. Local stand-in for Cloudinary in development and tests.
+    """
+
+    def __init__(self, alias="default"):
+        self.alias = alias
+
+    def publish(self, name, content, image_format):
+        storage = storages[self.alias]
+        saved = storage.save(f"{name}.{image_format}", ContentFile(content))
+        return urljoin(f"https://{settings.DOMAIN_NAME or 'localhost'}", storage.url(saved))
+
+
+_publishers = {}
+
+
+def get_image_publisher() -> BaseImagePublisher:
+    """
+    Return the publisher configured in ``IMAGE_PUBLISHER``.
+    Publishers are instantiated once per backend path.
+    :return: The configured image publisher
+    """
+    path = settings.IMAGE_PUBLISHER
+    publisher = _publishers.get(path)
+    if publisher is None:
+        publisher = _publishers[path] = import_string(path)()
+    return publisher
+
+
+def accept_upload(profile, field, upload) -> str:
+    """
+    Store an uploaded profile image and queue its processing once the transaction commits.
+    A newer upload of the same field supersedes one still being processed.
+    :param profile: The profile the image belongs to.
+    :param field: One of ``IMAGE_FIELDS``.
+    :param upload: The uploaded file.
+    :return: The name of the stored original
+    """
+    from ..models import Profile
+
+    validate_image(upload)
+    suffix = PurePosixPath(upload.name).suffix.lower()
+    name = storages["image_uploads"].save(f"profiles/{profile.pk}/{field}/{uuid.uuid4().hex}{suffix}", upload)
+    with transaction.atomic():
+        locked = Profile.objects.select_for_update().only("image_variants").get(pk=profile.pk)
+        variants = {**locked.image_variants, field: {**locked.image_variants.get(field, {}), "pending": name}}
+        Profile.objects.filter(pk=profile.pk).update(image_variants=variants)
+        transaction.on_commit(lambda: process_profile_image.delay(profile.pk, field, name))
+    profile.image_variants = variants
+    return name
+
+
+@shared_task(
+    name="apps.account.helpers.images.process_profile_image",
+    bind=True,
+    ignore_result=True,
+    max_retries=3,
+)
+def process_profile_image(self, profile_id, field, name):
+    """
+    Render and publish the variants of an uploaded profile image, then point the profile at them.
+    Storage and publisher errors are retried with backoff; once the retries are exhausted the upload
+    is dropped like a rejected image, so the profile never keeps a pending upload nobody processes.
+    :param profile_id: The profile id.
+    :param field: One of ``IMAGE_FIELDS``.
+    :param name: The name of the original in the ``image_uploads`` storage.
+    """
+    from ..models import Profile
+
+    uploads = storages["image_uploads"]
+    pending = Profile.objects.filter(pk=profile_id).values_list("image_variants", flat=True).first()
+    if pending is None or pending.get(field, {}).get("pending") != name:
+        logger.info(f"Skipping superseded {field} upload of profile {profile_id}")
+        uploads.delete(name)
+        return
+
+    def retry_or_give_up(error):
+        if self.request.retries < self.max_retries:
+            countdown = get_exponential_backoff_interval(1, self.request.retries, 600, full_jitter=True)
+            raise self.retry(exc=error, countdown=countdown)
+        logger.error(f"Failed to process {field} upload of profile {profile_id}: {error}")
+
+    urls = None
+    try:
+        with uploads.open(name) as source:
+            variants = render_variants(source)
+    except (UnidentifiedImageError, Image.DecompressionBombError, ValueError) as e:
+        logger.error(f"Rejected {field} upload of profile {profile_id}: {e}")
+    except Exception as e:
+        retry_or_give_up(e)
+    else:
+        publisher = get_image_publisher()
+        # The upload name is part of every URL, so published variants never change and cache forever.
+        stem = f"profiles/{profile_id}/{field}/{PurePosixPath(name).stem}"
+        try:
+            urls = {variant: {image_format: publisher.publish(f"{stem}_{variant}", content, image_format)
+                              for image_format, content in formats.items()}
+                    for variant, formats in variants.items()}
+        except Exception as e:
+            retry_or_give_up(e)
+
+    with transaction.atomic():
+        profile = Profile.objects.select_for_update().filter(pk=profile_id).first()
+        if profile is None or profile.image_variants.get(field, {}).get("pending") != name:
+            logger.info(f"Dropping superseded {field} upload of profile {profile_id}")
+        elif urls is None:
+            profile.image_variants = {**profile.image_variants, field: {
+                key: value for key, value in profile.image_variants[field].items() if key != "pending"}}
+            profile.save(update_fields=["image_variants", "updated_at"])
+        else:
+            profile.image_variants = {**profile.image_variants, field: urls}
+            setattr(profile, IMAGE_FIELDS[field], urls["display"]["jpeg"])
+            profile.save(update_fields=["image_variants", IMAGE_FIELDS[field], "updated_at"])
+    uploads.delete(name)
@@ -0,0 +1,191 @@
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from ..metrics import LOCKOUTS
+
+
+class BaseLockoutEngine:
+    """
+    Counts failed logins per email and per IP address over a fixed window.
+    The window starts at the first failure and the counters expire with it.
+    """
+
+    def __init__(self, window=None, ip_limit=None):
+        self.window = window or settings.LOGIN_FAILURE_WINDOW
+        self.ip_limit = ip_limit or settings.LOGIN_IP_ATTEMPTS_LIMIT
+
+    @staticmethod
+    def email_key(email):
+        return f"lockout:email:{email.lower()}"
+
+    @staticmethod
+    def ip_key(ip_address):
+        return f"lockout:ip:{ip_address}"
+
+    def increment(self, key) -> int:
+        """
+        Atomically increment the counter for the key.
+        :param key: The counter key.
+        :return: The new count
+        """
+        raise NotImplementedError
+
+    def get(self, key) -> int:
+        """
+        Return the current count for the key.
+        :param key: The counter key.
+        :return: The count, 0 if the window expired
+        """
+        raise NotImplementedError
+
+    def delete(self, key) -> None:
+        raise NotImplementedError
+
+    async def aincrement(self, key) -> int:
+        return await sync_to_async(self.increment)(key)
+
+    async def aget(self, key) -> int:
+        return await sync_to_async(self.get)(key)
+
+    async def adelete(self, key) -> None:
+        await sync_to_async(self.delete)(key)
+
+    def register_failure(self, email, ip_address=None) -> int:
+        """
+        Record a failed login.
+        :param email: The email used for the attempt.
+        :param ip_address: The client IP address.
+        :return: Number of failures for the email in the current window
+        """
+        if ip_address and self.increment(self.ip_key(ip_address)) == self.ip_limit:
+            LOCKOUTS.labels("ip").inc()
+        return self.increment(self.email_key(email))
+
+    async def aregister_failure(self, email, ip_address=None) -> int:
+        if ip_address and await self.aincrement(self.ip_key(ip_address)) == self.ip_limit:
+            LOCKOUTS.labels("ip").inc()
+        return await self.aincrement(self.email_key(email))
+
+    def failures(self, email) -> int:
+        return self.get(self.email_key(email))
+
+    def is_ip_blocked(self, ip_address) -> bool:
+        """
+        Check if the IP address reached the failure limit.
+        :param ip_address: The client IP address.
+        :return: True if the IP address is blocked, False otherwise
+        """
+        return bool(ip_address) and self.get(self.ip_key(ip_address)) >= self.ip_limit
+
+    async def ais_ip_blocked(self, ip_address) -> bool:
+        return bool(ip_address) and await self.aget(self.ip_key(ip_address)) >= self.ip_limit
+
+    def reset(self, email) -> None:
+        """
+        Clear the failure counter of the email.
+        :param email: The email.
+        """
+        self.delete(self.email_key(email))
+
+    async def areset(self, email) -> None:
+        await self.adelete(self.email_key(email))
+
+
+class CacheLockoutEngine(BaseLockoutEngine):
+    """
+    Counters kept in the Django cache. With django-redis this is INCR plus EXPIRE.
+    """
+
+    @property
+    def timeout(self):
+        return int(self.window.total_seconds())
+
+    def increment(self, key):
+        # add() only sets the key when it is missing, so it opens the window exactly once.
+        if cache.add(key, 1, self.timeout):
+            return 1
+        try:
+            return cache.incr(key)
+        except ValueError:
+            # The window expired between add() and incr().
+            cache.add(key, 0, self.timeout)
+            return cache.incr(key)
+
+    def get(self, key):
+        return cache.get(key, 0)
+
+    def delete(self, key):
+        cache.delete(key)
+
+    async def aincrement(self, key):
+        if await cache.aadd(key, 1, self.timeout):
+            return 1
+        try:
+            return await cache.aincr(key)
+        except ValueError:
+            await cache.aadd(key, 0, self.timeout)
+            return await cache.aincr(key)
+
+    async def aget(self, key):
+        return await cache.aget(key, 0)
+
+    async def adelete(self, key):
+        await cache.adelete(key)
+
+
+class DatabaseLockoutEngine(BaseLockoutEngine):
+    """
+    Counters kept in the ``LoginFailureCounter`` table and incremented with ``F()`` updates.
+    """
+
+    def increment(self, key):
+        from ..models import LoginFailureCounter
+
+        now = timezone.now()
+        counters = LoginFailureCounter.objects.filter(key=key)
+        current = counters.filter(window_started_at__gt=now - self.window)
+        expired = counters.filter(window_started_at__lte=now - self.window)
+        with transaction.atomic():
+            if not current.update(count=F("count") + 1):
+                # Only an expired window is restarted: a request that lost the race to restart it
+                # matches nothing here and counts in the window the winner opened.
+                if (not expired.update(count=1, window_started_at=now)
+                        and not current.update(count=F("count") + 1)):
+                    try:
+                        with transaction.atomic():
+                            LoginFailureCounter.objects.create(key=key, count=1, window_started_at=now)
+                    except IntegrityError:
+                        counters.update(count=F("count") + 1)
+            return counters.values_list("count", flat=True).first()
+
+    def get(self, key):
+        from ..models import LoginFailureCounter
+
+        return LoginFailureCounter.objects.filter(
+            key=key, window_started_at__gt=timezone.now() - self.window
+        ).values_list("count", flat=True).first() or 0
+
+    def delete(self, key):
+        from ..models import LoginFailureCounter
+
+        LoginFailureCounter.objects.filter(key=key).delete()
+
+
+_engines = {}
+
+
+def get_lockout_engine() -> BaseLockoutEngine:
+    """
+    Return the lockout engine configured in ``LOGIN_LOCKOUT_ENGINE``.
+    :return: The configured lockout engine
+    """
+    path = settings.LOGIN_LOCKOUT_ENGINE
+    engine = _engines.get(path)
+    if engine is None:
+        engine = _engines[path] = import_string(path)()
+    return engine
@@ -0,0 +1,246 @@
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare, salted_hmac
+from django.utils.module_loading import import_string
+
+
+def hash_otp(key: str, otp: str) -> str:
+    """
+    Hash an OTP so that raw codes are never stored.
+    The challenge key is mixed in, so two users holding the same code never share a digest.
+    :param key: The challenge key (email or challenge id).
+    :param otp: The raw OTP.
+    :return: Hex digest of the OTP.
+    """
+    return salted_hmac("apps.account.otp", f"{key}:{otp}").hexdigest()
+
+
+class BaseOTPStore:
+    """
+    Base class for OTP challenge stores.
+    A challenge is keyed by an email address or challenge id, expires on its own
+    and is discarded after a successful verification or too many attempts.
+    """
+
+    def __init__(self, ttl=None, max_attempts=None):
+        self.ttl = int((ttl or settings.OTP_EXPIRATION_TIME).total_seconds())
+        self.max_attempts = max_attempts or settings.OTP_MAX_ATTEMPTS
+
+    @staticmethod
+    def normalize_key(key: str) -> str:
+        """
+        Email addresses are matched regardless of case and surrounding spaces, so the code issued
+        for ``User@Example.com`` verifies when ``user@example.com`` is submitted.
+        :param key: The challenge key.
+        :return: The key challenges are stored and hashed under
+        """
+        return key.strip().lower()
+
+    def issue(self, key: str, otp: str) -> None:
+        """
+        Store a new challenge for the key, replacing any previous one.
+        :param key: The challenge key.
+        :param otp: The raw OTP.
+        """
+        raise NotImplementedError
+
+    def verify(self, key: str, otp: str) -> bool:
+        """
+        Verify the OTP for the key and consume the challenge on success.
+        Every call counts as an attempt; the challenge is dropped once the limit is reached.
+        :param key: The challenge key.
+        :param otp: The raw OTP.
+        :return: True if the OTP is valid, False otherwise
+        """
+        raise NotImplementedError
+
+    def discard(self, key: str) -> None:
+        """
+        Remove the challenge for the key, if any.
+        :param key: The challenge key.
+        """
+        raise NotImplementedError
+
+    async def aissue(self, key: str, otp: str) -> None:
+        await sync_to_async(self.issue)(key, otp)
+
+    async def averify(self, key: str, otp: str) -> bool:
+        return await sync_to_async(self.verify)(key, otp)
+
+
+class InMemoryOTPStore(BaseOTPStore):
+    """
+    Process local OTP store. Meant for tests and single process development servers.
+    """
+
+    def __init__(self, ttl=None, max_attempts=None):
+        super().__init__(ttl, max_attempts)
+        self._challenges = {}
+        self._lock = threading.Lock()
+
+    def issue(self, key, otp):
+        key = self.normalize_key(key)
+        with self._lock:
+            self._challenges[key] = [hash_otp(key, otp), time.monotonic() + self.ttl, 0]
+
+    def verify(self, key, otp):
+        key = self.normalize_key(key)
+        with self._lock:
+            challenge = self._challenges.get(key)
+            if challenge is None:
+                return False
+            digest, expires_at, attempts = challenge
+            if time.monotonic() >= expires_at:
+                del self._challenges[key]
+                return False
+            challenge[2] = attempts = attempts + 1
+            if constant_time_compare(digest, hash_otp(key, otp)):
+                del self._challenges[key]
+                return True
+            if attempts >= self.max_attempts:
+                del self._challenges[key]
+            return False
+
+    def discard(self, key):
+        key = self.normalize_key(key)
+        with self._lock:
+            self._challenges.pop(key, None)
+
+    def clear(self):
+        """
+        Drop every challenge. Used by tests.
+        """
+        with self._lock:
+            self._challenges.clear()
+
+
+class DatabaseOTPStore(BaseOTPStore):
+    """
+    OTP store backed by the indexed ``OTPChallenge`` table.
+    """
+
+    def issue(self, key, otp):
+        from ..models import OTPChallenge
+
+        key = self.normalize_key(key)
+        OTPChallenge.objects.update_or_create(
+            key=key,
+            defaults={
+                "code_hash": hash_otp(key, otp),
+                "expires_at": timezone.now() + settings.OTP_EXPIRATION_TIME,
+                "attempts": 0,
+            },
+        )
+
+    def verify(self, key, otp):
+        from ..models import OTPChallenge
+
+        key = self.normalize_key(key)
+        challenges = OTPChallenge.objects.filter(key=key, expires_at__gt=timezone.now())
+        with transaction.atomic():
+            # Count the attempt first so that concurrent guesses cannot share one.
+            if not challenges.filter(attempts__lt=self.max_attempts).update(attempts=F("attempts") + 1):
+                return False
+            challenge = challenges.only("code_hash", "attempts").first()
+            if challenge is None:
+                return False
+            if constant_time_compare(challenge.code_hash, hash_otp(key, otp)):
+                challenge.delete()
+                return True
+            if challenge.attempts >= self.max_attempts:
+                challenge.delete()
+        return False
+
+    def discard(self, key):
+        from ..models import OTPChallenge
+
+        OTPChallenge.objects.filter(key=self.normalize_key(key)).delete()
+
+    def purge_expired(self) -> int:
+        """
+        Delete expired challenges.
+        :return: Number of deleted challenges
+        """
+        from ..models import OTPChallenge
+
+        deleted, _ = OTPChallenge.objects.filter(expires_at__lte=timezone.now()).delete()
+        return deleted
+
+
+class RedisOTPStore(BaseOTPStore):
+    """
+    OTP store backed by Redis hashes with native expiry.
+    Verification runs as a single Lua script, so it costs one round-trip.
+    """
+
+    VERIFY_SCRIPT = """
+    local digest = redis.call('HGET', KEYS[1], 'code')
+    if not digest then
+        return 0
+    end
+    local attempts = redis.call('HINCRBY', KEYS[1], 'attempts', 1)
+    if digest == ARGV[1] then
+        redis.call('DEL', KEYS[1])
+        return 1
+    end
+    if attempts >= tonumber(ARGV[2]) then
+        redis.call('DEL', KEYS[1])
+    end
+    return 0
+    """
+
+    def __init__(self, ttl=None, max_attempts=None, alias="default", prefix="otp"):
+        super().__init__(ttl, max_attempts)
+        self.alias = alias
+        self.prefix = prefix
+        self._verify = None
+
+    @property
+    def client(self):
+        from django_redis import get_redis_connection
+
+        return get_redis_connection(self.alias)
+
+    def make_key(self, key):
+        return f"{self.prefix}:{key}"
+
+    def issue(self, key, otp):
+        key = self.normalize_key(key)
+        redis_key = self.make_key(key)
+        pipe = self.client.pipeline()
+        pipe.delete(redis_key)
+        pipe.hset(redis_key, mapping={"code": hash_otp(key, otp), "attempts": 0})
+        pipe.expire(redis_key, self.ttl)
+        pipe.execute()
+
+    def verify(self, key, otp):
+        key = self.normalize_key(key)
+        if self._verify is None:
+            self._verify = self.client.register_script(self.VERIFY_SCRIPT)
+        result = self._verify(keys=[self.make_key(key)], args=[hash_otp(key, otp), self.max_attempts])
+        return bool(int(result))
+
+    def discard(self, key):
+        self.client.delete(self.make_key(self.normalize_key(key)))
+
+
+_stores = {}
+
+
+def get_otp_store() -> BaseOTPStore:
+    """
+    Return the OTP store configured in ``OTP_CHALLENGE_STORE``.
+    Stores are instantiated once per backend path.
+    :return: The configured OTP store
+    """
+    path = settings.OTP_CHALLENGE_STORE
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = import_string(path)()
+    return store
@@ -0,0 +1,145 @@
+import threading
+import time
+from typing import Optional
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from ..metrics import THROTTLE_REJECTIONS
+
+
+class BaseRateLimiter:
+    """
+    Generic cell rate algorithm: each key stores its theoretical arrival time (TAT), the time at
+    which it would be back to an empty bucket. A request is allowed while the TAT is less than
+    ``burst * interval`` ahead of now, and moves it ``interval`` forward.
+    A refusal stays valid until its retry time, as only allowed requests move the TAT, so refused
+    keys are remembered in-process and their next requests are rejected without reaching the store.
+    """
+
+    def __init__(self, max_denied=10_000):
+        self.max_denied = max_denied
+        self._denied = {}
+        self._lock = threading.Lock()
+
+    def acquire(self, key, interval, burst) -> Optional[float]:
+        """
+        Atomically take one request from the bucket of the key.
+        :param key: The bucket key.
+        :param interval: Seconds between requests at the sustained rate.
+        :param burst: Requests allowed at once from an empty bucket.
+        :return: None if the request is allowed, the seconds to wait otherwise
+        """
+        raise NotImplementedError
+
+    def hit(self, scope, ident, count, period) -> Optional[float]:
+        """
+        Count a request against a rate of ``count`` requests per ``period`` seconds, bursting up to ``count``.
+        :param scope: The throttle scope.
+        :param ident: The client identity within the scope.
+        :param count: Requests allowed per period.
+        :param period: The period in seconds.
+        :return: None if the request is allowed, the seconds to wait otherwise
+        """
+        key, now = f"throttle:{scope}:{ident}", time.monotonic()
+        denied_until = self._denied.get(key)
+        if denied_until is not None:
+            if now < denied_until:
+                THROTTLE_REJECTIONS.labels(scope, "local").inc()
+                return denied_until - now
+            self._denied.pop(key, None)
+        wait = self.acquire(key, period / count, count)
+        if wait is not None:
+            THROTTLE_REJECTIONS.labels(scope, "store").inc()
+            self.remember(key, now + wait)
+        return wait
+
+    def remember(self, key, denied_until):
+        with self._lock:
+            if len(self._denied) >= self.max_denied:
+                now = time.monotonic()
+                for expired in [k for k, until in self._denied.items() if until <= now]:
+                    del self._denied[expired]
+                if len(self._denied) >= self.max_denied:
+                    del self._denied[next(iter(self._denied))]
+            self._denied[key] = denied_until
+
+
+class InMemoryRateLimiter(BaseRateLimiter):
+    """
+    Process local rate limiter. Meant for tests and single process development servers.
+    """
+
+    def __init__(self, max_denied=10_000):
+        super().__init__(max_denied)
+        self._tats = {}
+        self._tat_lock = threading.Lock()
+
+    def acquire(self, key, interval, burst):
+        with self._tat_lock:
+            now = time.monotonic()
+            tat = max(self._tats.get(key, now), now)
+            allow_at = tat + interval - burst * interval
+            if now < allow_at:
+                return allow_at - now
+            self._tats[key] = tat + interval
+            return None
+
+    def clear(self):
+        """
+        Drop every bucket. Used by tests.
+        """
+        with self._tat_lock:
+            self._tats.clear()
+        self._denied.clear()
+
+
+class RedisRateLimiter(BaseRateLimiter):
+    """
+    Rate limiter keeping one TAT per key in Redis, read and updated by a single script on the
+    Redis clock. Keys expire when their bucket is full again.
+    """
+
+    GCRA_SCRIPT = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local interval = tonumber(ARGV[1])
+    local tat = math.max(tonumber(redis.call('GET', KEYS[1]) or now), now)
+    local allow_at = tat + interval - tonumber(ARGV[2]) * interval
+    if now < allow_at then
+        return tostring(allow_at - now)
+    end
+    tat = tat + interval
+    redis.call('SET', KEYS[1], tostring(tat), 'PX', math.ceil((tat - now) * 1000))
+    return false
+    """
+
+    def __init__(self, max_denied=10_000, alias="default"):
+        super().__init__(max_denied)
+        self.alias = alias
+        self._acquire = None
+
+    def acquire(self, key, interval, burst):
+        if self._acquire is None:
+            from django_redis import get_redis_connection
+
+            self._acquire = get_redis_connection(self.alias).register_script(self.GCRA_SCRIPT)
+        # Script replies truncate numbers to integers, so the wait comes back as a string.
+        wait = self._acquire(keys=[key], args=[interval, burst])
+        return float(wait) if wait else None
+
+
+_limiters = {}
+
+
+def get_rate_limiter() -> BaseRateLimiter:
+    """
+    Return the rate limiter configured in ``THROTTLE_RATE_LIMITER``.
+    Limiters are instantiated once per backend path.
+    :return: The configured rate limiter
+    """
+    path = settings.THROTTLE_RATE_LIMITER
+    limiter = _limiters.get(path)
+    if limiter is None:
+        limiter = _limiters[path] = import_string(path)()
+    return limiter
@@ -0,0 +1,279 @@
+import hashlib
+import math
+import os
+import threading
+import time
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.module_loading import import_string
+from loguru import logger
+from rest_framework_simplejwt.settings import api_settings
+
+from ..metrics import REVOCATION_CHECKS
+
+
+class BloomFilter:
+    """
+    Fixed size bloom filter over strings, using double hashing of one BLAKE2 digest.
+    """
+
+    def __init__(self, capacity, error_rate=0.001):
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def positions(self, item):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        first, second = int.from_bytes(digest[:8], "big"), int.from_bytes(digest[8:], "big") | 1
+        return [(first + index * second) % self.size for index in range(self.hashes)]
+
+    def add(self, item):
+        for position in self.positions(item):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, item):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self.positions(item))
+
+
+class BaseRevocationStore:
+    """
+    Revoked JWTs, keyed by JTI and kept until the token would have expired anyway.
+    Revoking every token of a user is done by bumping ``User.token_version``, the token epoch.
+
+    Access tokens are checked on every request, so revoked access JTIs are also published to a
+    log that each process copies into a local bloom filter every ``sync_interval`` seconds.
+    A token missing from the filter was never revoked and costs no round-trip; the store is only
+    asked on a filter hit. Refresh tokens are only checked by the refresh endpoint, which writes
+    anyway, so they are never published.
+    """
+    LOGOUT = "logout"
+    ROTATED = "rotated"
+
+    def __init__(self, sync_interval=None, capacity=None, rebuild_interval=3600):
+        self.sync_interval = settings.TOKEN_REVOCATION_SYNC_INTERVAL if sync_interval is None else sync_interval
+        self.capacity = capacity or settings.TOKEN_REVOCATION_BLOOM_CAPACITY
+        self.rebuild_interval = rebuild_interval
+        self._bloom = None
+        self._cursor = None
+        self._next_sync = self._rebuild_at = 0
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def mark(self, jti, reason, ttl, publish) -> Optional[str]:
+        """
+        Atomically revoke a JTI unless it already is.
+        :param jti: The token id.
+        :param reason: ``LOGOUT`` or ``ROTATED``.
+        :param ttl: Seconds until the token expires.
+        :param publish: Add the JTI to the log read by the bloom filters.
+        :return: None if the JTI was revoked by this call, the earlier reason otherwise
+        """
+        raise NotImplementedError
+
+    def lookup(self, jti) -> Optional[str]:
+        """
+        Return the revocation reason of a JTI.
+        :param jti: The token id.
+        :return: The reason, None if the JTI is not revoked
+        """
+        raise NotImplementedError
+
+    def changes(self, cursor):
+        """
+        Return the published JTIs since the cursor.
+        :param cursor: Position returned by the previous call, None for every live JTI.
+        :return: Tuple of the JTIs and the new cursor
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def ttl(token) -> int:
+        return max(int(token["exp"] - time.time()), 1)
+
+    def sync(self):
+        """
+        Copy the newly published JTIs into the bloom filter, rebuilding it once it is full or old,
+        as JTIs of expired tokens cannot be removed from it.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if now < self._next_sync and self._pid == os.getpid():
+                return
+            try:
+                if (self._bloom is None or self._pid != os.getpid() or now >= self._rebuild_at
+                        or self._bloom.count >= self.capacity):
+                    jtis, cursor = self.changes(None)
+                    bloom = BloomFilter(max(self.capacity, len(jtis) * 2))
+                    self._rebuild_at, self._pid = now + self.rebuild_interval, os.getpid()
+                else:
+                    bloom, (jtis, cursor) = self._bloom, self.changes(self._cursor)
+            except Exception as e:
+                # Keep the last filter; it misses at most the revocations made since the failure.
+                logger.warning(f"Token revocation sync failed: {e}")
+                self._next_sync = now + self.sync_interval
+                if self._bloom is None or self._pid != os.getpid():
+                    raise
+                return
+            for jti in jtis:
+                bloom.add(jti)
+            self._bloom, self._cursor, self._next_sync = bloom, cursor, now + self.sync_interval
+
+    def is_revoked(self, token) -> bool:
+        """
+        Check an access token.
+        :param token: The validated access token.
+        :return: True if the token was revoked
+        """
+        jti = token[api_settings.JTI_CLAIM]
+        if time.monotonic() >= self._next_sync or self._pid != os.getpid():
+            self.sync()
+        if jti not in self._bloom:
+            REVOCATION_CHECKS.labels("bloom_negative").inc()
+            return False
+        revoked = self.lookup(jti) is not None
+        REVOCATION_CHECKS.labels("revoked" if revoked else "false_positive").inc()
+        return revoked
+
+    def revoke_access_token(self, token) -> None:
+        """
+        Revoke an access token in every process.
+        :param token: The validated access token.
+        """
+        jti = token[api_settings.JTI_CLAIM]
+        self.mark(jti, self.LOGOUT, self.ttl(token), publish=True)
+        # This process sees its own revocation before the next sync.
+        if self._bloom is not None and self._pid == os.getpid():
+            with self._lock:
+                self._bloom.add(jti)
+
+    def revoke_refresh_token(self, token, reason=LOGOUT) -> Optional[str]:
+        """
+        Revoke a refresh token.
+        :param token: The validated refresh token.
+        :param reason: ``LOGOUT``, or ``ROTATED`` when it is exchanged for a new one.
+        :return: None if the token was revoked by this call, the earlier reason otherwise
+        """
+        return self.mark(token[api_settings.JTI_CLAIM], reason, self.ttl(token), publish=False)
+
+    async def ais_revoked(self, token) -> bool:
+        return await sync_to_async(self.is_revoked)(token)
+
+
+class InMemoryRevocationStore(BaseRevocationStore):
+    """
+    Process local revocation store. Meant for tests and single process development servers.
+    """
+
+    def __init__(self, sync_interval=None, capacity=None, rebuild_interval=3600):
+        super().__init__(sync_interval, capacity, rebuild_interval)
+        self._revoked = {}
+        self._log = []
+        self._store_lock = threading.Lock()
+
+    def mark(self, jti, reason, ttl, publish):
+        with self._store_lock:
+            now = time.time()
+            current = self._revoked.get(jti)
+            if current and current[1] > now:
+                return current[0]
+            self._revoked[jti] = (reason, now + ttl)
+            if publish:
+                self._log.append((jti, now + ttl))
+            return None
+
+    def lookup(self, jti):
+        with self._store_lock:
+            current = self._revoked.get(jti)
+            return current[0] if current and current[1] > time.time() else None
+
+    def changes(self, cursor):
+        with self._store_lock:
+            now = time.time()
+            start = 0 if cursor is None else cursor
+            return [jti for jti, expires_at in self._log[start:] if expires_at > now], len(self._log)
+
+    def clear(self):
+        """
+        Drop every revocation. Used by tests.
+        """
+        with self._store_lock:
+            self._revoked.clear()
+            self._log.clear()
+        self._bloom, self._next_sync = None, 0
+
+
+class RedisRevocationStore(BaseRevocationStore):
+    """
+    Revocations kept in Redis as one key per JTI that expires with the token.
+    Published JTIs also go to a sorted set scored by Redis server time, so every process reads
+    them in order from a single clock. Only access tokens are published, so entries older than the
+    access token lifetime are trimmed.
+    """
+
+    MARK_SCRIPT = """
+    if not redis.call('SET', KEYS[1], ARGV[1], 'NX', 'EX', ARGV[2]) then
+        return redis.call('GET', KEYS[1])
+    end
+    if ARGV[3] == '1' then
+        local now = redis.call('TIME')
+        local score = tonumber(now[1]) + tonumber(now[2]) / 1000000
+        redis.call('ZADD', KEYS[2], score, ARGV[4])
+        redis.call('ZREMRANGEBYSCORE', KEYS[2], '-inf', score - tonumber(ARGV[5]))
+    end
+    return false
+    """
+
+    def __init__(self, sync_interval=None, capacity=None, rebuild_interval=3600, alias="default",
+                 prefix="revoked"):
+        super().__init__(sync_interval, capacity, rebuild_interval)
+        self.alias = alias
+        self.prefix = prefix
+        self.log_key = f"{prefix}:log"
+        self.retention = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+        self._mark = None
+
+    @property
+    def client(self):
+        from django_redis import get_redis_connection
+
+        return get_redis_connection(self.alias)
+
+    def make_key(self, jti):
+        return f"{self.prefix}:{jti}"
+
+    def mark(self, jti, reason, ttl, publish):
+        if self._mark is None:
+            self._mark = self.client.register_script(self.MARK_SCRIPT)
+        previous = self._mark(keys=[self.make_key(jti), self.log_key],
+                              args=[reason, ttl, int(publish), jti, self.retention])
+        return previous.decode() if previous else None
+
+    def lookup(self, jti):
+        reason = self.client.get(self.make_key(jti))
+        return reason.decode() if reason else None
+
+    def changes(self, cursor):
+        # Inclusive bound, so a JTI published at the cursor score is never skipped.
+        entries = self.client.zrangebyscore(self.log_key, "-inf" if cursor is None else cursor, "+inf",
+                                            withscores=True)
+        return [jti.decode() for jti, _ in entries], entries[-1][1] if entries else cursor
+
+
+_stores = {}
+
+
+def get_revocation_store() -> BaseRevocationStore:
+    """
+    Return the revocation store configured in ``TOKEN_REVOCATION_STORE``.
+    Stores are instantiated once per backend path.
+    :return: The configured revocation store
+    """
+    path = settings.TOKEN_REVOCATION_STORE
+    store = _stores.get(path)
+    if store is None:
+        store = _stores[path] = import_string(path)()
+    return store
@@ -0,0 +1,136 @@
+import os
+import string
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections
+from django.utils.module_loading import import_string
+
+ALPHABET = string.digits + string.ascii_uppercase
+USERNAME_LENGTH = 12
+
+
+def username_prefix(bank_name=None) -> str:
+    """
+    Build the username prefix from the initials of the bank name.
+    :param bank_name: The bank name, defaults to ``BANK_NAME``.
+    :return: The prefix
+    """
+    return "".join(word[0] for word in (bank_name or settings.BANK_NAME).split())
+
+
+class BaseUsernameAllocator:
+    """
+    Hands out unique usernames in the ``PREFIX-XXXXXXX`` format.
+    Numbers are reserved from shared storage a block at a time, so most allocations cost no query.
+    Each number is mapped through a bijection of the number space, which keeps usernames unique
+    without making them sequential.
+    """
+    # Coprime with 36, so multiplying by it permutes every power of 36.
+    MULTIPLIER = 1_594_323_511
+    OFFSET = 7_919_130_421
+
+    def __init__(self, block_size=None, prefix=None):
+        self.block_size = block_size or settings.USERNAME_BLOCK_SIZE
+        self.prefix = prefix or username_prefix()
+        self.width = USERNAME_LENGTH - len(self.prefix) - 1
+        self.capacity = len(ALPHABET) ** self.width
+        self._lock = threading.Lock()
+        self._pid = None
+        self._next = self._end = 0
+
+    def reserve(self, size) -> int:
+        """
+        Reserve a block of numbers in shared storage.
+        :param size: The block size.
+        :return: The first number of the block
+        """
+        raise NotImplementedError
+
+    def encode(self, number) -> str:
+        """
+        Encode a number as a username.
+        :param number: The allocated number.
+        :return: The username
+        """
+        if number >= self.capacity:
+            raise OverflowError(f"Username space of prefix {self.prefix} is exhausted")
+        value = (number * self.MULTIPLIER + self.OFFSET) % self.capacity
+        characters = []
+        for _ in range(self.width):
+            value, remainder = divmod(value, len(ALPHABET))
+            characters.append(ALPHABET[remainder])
+        return f"{self.prefix}-{''.join(reversed(characters))}"
+
+    def allocate(self) -> str:
+        """
+        Return the next unique username.
+        :return: The username
+        """
+        with self._lock:
+            # A block inherited from a parent process is shared with it, so it is dropped.
+            if self._pid != os.getpid() or self._next >= self._end:
+                self._next = self.reserve(self.block_size)
+                self._end = self._next + self.block_size
+                self._pid = os.getpid()
+            number = self._next
+            self._next += 1
+        return self.encode(number)
+
+
+class DatabaseUsernameAllocator(BaseUsernameAllocator):
+    """
+    Reserves blocks from the ``UsernameCounter`` table with one upsert.
+    The upsert runs on a private autocommit connection, so a reservation made inside a
+    transaction that later rolls back is never handed out twice. SQLite allows a single
+    writer, so there it falls back to the shared connection.
+    """
+
+    def __init__(self, block_size=None, prefix=None):
+        super().__init__(block_size, prefix)
+        self._connection = None
+        self._connection_pid = None
+
+    @property
+    def connection(self):
+        if connection.vendor == "sqlite":
+            return connection
+        if self._connection is None or self._connection_pid != os.getpid():
+            self._connection = connections.create_connection(DEFAULT_DB_ALIAS)
+            self._connection_pid = os.getpid()
+        return self._connection
+
+    def reserve(self, size):
+        from ..models import UsernameCounter
+
+        database = self.connection
+        table = database.ops.quote_name(UsernameCounter._meta.db_table)
+        try:
+            with database.cursor() as cursor:
+                cursor.execute(
+                    f"INSERT INTO {table} (prefix, next_value) VALUES (%s, %s) "
+                    f"ON CONFLICT (prefix) DO UPDATE SET next_value = {table}.next_value + excluded.next_value "
+                    f"RETURNING next_value",
+                    [self.prefix, size],
+                )
+                return cursor.fetchone()[0] - size
+        except DatabaseError:
+            if database is not connection:
+                database.close()
+                self._connection = None
+            raise
+
+
+_allocators = {}
+
+
+def get_username_allocator() -> BaseUsernameAllocator:
+    """
+    Return the username allocator configured in ``USERNAME_ALLOCATOR``.
+    :return: The configured username allocator
+    """
+    path = settings.USERNAME_ALLOCATOR
+    allocator = _allocators.get(path)
+    if allocator is None:
+        allocator = _allocators[path] = import_string(path)()
+    return allocator
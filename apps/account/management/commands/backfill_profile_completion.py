@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+
+from apps.account.models import NextOfKin, Profile
+
+
+class Command(BaseCommand):
+    help = "Recalculate the materialized completion score and flags of existing profiles in chunks."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=1000, help="Profiles per chunk.")
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        queryset = Profile.objects.order_by("pk").only(
+            "pk", "completion_score", "has_next_of_kin", "is_complete", *Profile.COMPLETION_FIELDS
+        ).annotate(
+            kin_exists=Exists(NextOfKin.objects.filter(profile_id=OuterRef("pk")))
+        )
+        last_pk = None
+        processed = updated = 0
+        while True:
+            chunk = queryset if last_pk is None else queryset.filter(pk__gt=last_pk)
+            profiles = list(chunk[:chunk_size])
+            if not profiles:
+                break
+            changed = []
+            for profile in profiles:
+                score = profile.calculate_completion_score()
+                is_complete = score == 100 and profile.kin_exists
+                if (score, profile.kin_exists, is_complete) != (
+                        profile.completion_score, profile.has_next_of_kin, profile.is_complete):
+                    profile.completion_score = score
+                    profile.has_next_of_kin = profile.kin_exists
+                    profile.is_complete = is_complete
+                    changed.append(profile)
+            with transaction.atomic():
+                Profile.objects.bulk_update(changed, ["completion_score", "has_next_of_kin", "is_complete"])
+            processed += len(profiles)
+            updated += len(changed)
+            last_pk = profiles[-1].pk
+            self.stdout.write(f"Processed {processed} profiles, updated {updated}")
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} of {processed} profiles"))
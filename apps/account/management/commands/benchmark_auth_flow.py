@@ -0,0 +1,259 @@
+import json
+import math
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core import mail
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import (CaptureQueriesContext, setup_databases, setup_test_environment, teardown_databases,
+                               teardown_test_environment)
+from django.urls import reverse
+from rest_framework.views import APIView
+
+from apps.account.async_views import AsyncAuthView
+from apps.account.helpers.emails import mail_sender
+from apps.account.models import User
+from fintech.celery import app as celery_app
+
+ENDPOINTS = ("login", "verify_otp", "refresh_token", "logout")
+PASSWORD = "Benchmark-Passw0rd"
+OTP_PATTERN = re.compile(r"<strong>(\d+)</strong>")
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "auth_flow.json"
+
+
+@contextmanager
+def benchmark_environment():
+    """
+    Isolate the auth flow from external services: locmem mail and cache, in-memory OTP
+    challenges and token revocations, eager Celery tasks and no request throttling.
+    """
+    always_eager = celery_app.conf.task_always_eager
+    celery_app.conf.task_always_eager = True
+    mail_sender.close()
+    try:
+        with override_settings(
+            EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+            CELERY_EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+            CACHES={"default": {"BACKEND": "apps.core.cache.LocMemCache", "LOCATION": "auth-flow-benchmark"}},
+            OTP_CHALLENGE_STORE="apps.account.helpers.otp.InMemoryOTPStore",
+            LOGIN_LOCKOUT_ENGINE="apps.account.helpers.lockout.CacheLockoutEngine",
+            TOKEN_REVOCATION_STORE="apps.account.helpers.revocation.InMemoryRevocationStore",
+        ), mock.patch.object(APIView, "throttle_classes", []), \
+                mock.patch.object(AsyncAuthView, "throttle_classes", []):
+            yield
+    finally:
+        mail_sender.close()
+        celery_app.conf.task_always_eager = always_eager
+
+
+def create_clients(count, first_id_no=900_000_000):
+    """
+    Create one user per simulated client.
+    :param count: Number of clients.
+    :param first_id_no: ID number of the first user.
+    :return: The email addresses
+    """
+    emails = [f"auth-flow-{number}@example.com" for number in range(count)]
+    for number, email in enumerate(emails):
+        User.objects.create_user(
+            email=email, password=PASSWORD, first_name="Benchmark", last_name=f"Client{number}",
+            id_no=first_id_no + number, security_question=User.SecurityQuestion.PET_NAME,
+            security_answer="benchmark",
+        )
+    return emails
+
+
+def latest_otp(email):
+    """
+    Read the OTP from the last mail sent to the email address.
+    :param email: The email address.
+    :return: The OTP, None if no mail was sent
+    """
+    for message in reversed(mail.outbox):
+        if message.to == [email]:
+            html = message.alternatives[0][0] if message.alternatives else message.body
+            match = OTP_PATTERN.search(html)
+            return match.group(1) if match else None
+    return None
+
+
+def run_flow(client, email, samples):
+    """
+    Log in, verify the OTP, refresh the tokens and log out, recording every request.
+    :param client: The client of this simulated user.
+    :param email: The user email.
+    :param samples: List the ``(endpoint, seconds, queries, status)`` samples are appended to.
+    """
+
+    def post(endpoint, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            response = client.post(reverse(endpoint), data or {}, content_type="application/json")
+            elapsed = time.perf_counter() - started
+        samples.append((endpoint, elapsed, len(queries), response.status_code))
+        # Forget the cookies the response deleted, as a browser does.
+        for name, morsel in response.cookies.items():
+            if morsel["max-age"] == 0:
+                client.cookies.pop(name, None)
+        return response
+
+    if post("login", {"email": email, "password": PASSWORD}).status_code != 200:
+        return
+    if post("verify_otp", {"email": email, "otp": latest_otp(email)}).status_code != 200:
+        return
+    post("refresh_token")
+    post("logout")
+
+
+def run_clients(emails, rounds):
+    """
+    Run the auth flow with one thread per simulated client.
+    :param emails: The client email addresses.
+    :param rounds: Flows per client.
+    :return: Tuple of the samples and the elapsed time
+    """
+    samples = []
+
+    def simulate(email):
+        client = Client()
+        try:
+            for _ in range(rounds):
+                run_flow(client, email, samples)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(len(emails)) as pool:
+        list(pool.map(simulate, emails))
+    return samples, time.perf_counter() - started
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    return ordered[max(math.ceil(percent / 100 * len(ordered)) - 1, 0)]
+
+
+def summarize(samples, elapsed, flows):
+    """
+    Aggregate the samples per endpoint.
+    :param samples: The ``(endpoint, seconds, queries, status)`` samples.
+    :param elapsed: Wall time of the run.
+    :param flows: Number of flows started.
+    :return: The summary
+    """
+    endpoints = {}
+    for endpoint in ENDPOINTS:
+        rows = [sample for sample in samples if sample[0] == endpoint]
+        if not rows:
+            endpoints[endpoint] = {"requests": 0, "errors": 0}
+            continue
+        latencies = [row[1] * 1000 for row in rows]
+        queries = [row[2] for row in rows]
+        endpoints[endpoint] = {
+            "requests": len(rows),
+            "errors": sum(row[3] != 200 for row in rows),
+            "p50_ms": round(percentile(latencies, 50), 2),
+            "p95_ms": round(percentile(latencies, 95), 2),
+            "p99_ms": round(percentile(latencies, 99), 2),
+            "queries_mean": round(statistics.fmean(queries), 2),
+            "queries_max": max(queries),
+        }
+    return {
+        "flows_per_second": round(flows / elapsed, 2),
+        "requests_per_second": round(len(samples) / elapsed, 2),
+        "endpoints": endpoints,
+    }
+
+
+def check_budget(summary, baseline, latency_tolerance=None):
+    """
+    Compare a run with the baseline.
+    Query counts may not grow and every request must succeed. With a tolerance, p95 latency
+    may not grow by more than that fraction.
+    :param summary: The summary of the run.
+    :param baseline: The baseline summary.
+    :param latency_tolerance: Allowed p95 growth, e.g. 0.5 for 50%, None to skip latency.
+    :return: The budget violations
+    """
+    violations = []
+    for endpoint in ENDPOINTS:
+        result, budget = summary["endpoints"][endpoint], baseline["endpoints"].get(endpoint)
+        if not result["requests"] or result["errors"]:
+            violations.append(f"{endpoint}: {result['errors']} of {result['requests']} requests failed")
+            continue
+        if budget is None or "queries_max" not in budget:
+            continue
+        if result["queries_max"] > budget["queries_max"]:
+            violations.append(f"{endpoint}: {result['queries_max']} queries, budget {budget['queries_max']}")
+        if latency_tolerance is not None and result["p95_ms"] > budget["p95_ms"] * (1 + latency_tolerance):
+            violations.append(f"{endpoint}: p95 {result['p95_ms']} ms, budget {budget['p95_ms']} ms "
+                              f"+{latency_tolerance:.0%}")
+    return violations
+
+
+class Command(BaseCommand):
+    help = ("Benchmark login, OTP verification, refresh and logout through the real URLconf with "
+            "concurrent clients, on a throwaway copy of the configured database. Compares the run with "
+            "a JSON baseline and fails when an endpoint needs more queries or gets slower.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--clients", type=int, default=10, help="Concurrent simulated clients.")
+        parser.add_argument("--rounds", type=int, default=5, help="Flows per client.")
+        parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline JSON file.")
+        parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline.")
+        parser.add_argument("--latency-tolerance", type=float, default=1.0,
+                            help="Allowed p95 growth over the baseline, negative to only check queries.")
+
+    def handle(self, *args, **options):
+        clients, rounds = options["clients"], options["rounds"]
+        setup_test_environment()
+        databases = setup_databases(verbosity=0, interactive=False)
+        try:
+            with benchmark_environment():
+                emails = create_clients(clients)
+                samples, elapsed = run_clients(emails, rounds)
+        finally:
+            teardown_databases(databases, verbosity=0)
+            teardown_test_environment()
+
+        summary = summarize(samples, elapsed, clients * rounds)
+        summary["settings"] = {"clients": clients, "rounds": rounds, "database": connection.vendor,
+                               "async_views": settings.AUTH_ASYNC_VIEWS, "hasher": settings.PASSWORD_HASHERS[0]}
+        self.report(summary)
+
+        baseline_path = options["baseline"]
+        if options["save_baseline"]:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(summary, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}"))
+            return
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f"No baseline at {baseline_path}, run with --save-baseline."))
+            return
+        tolerance = options["latency_tolerance"]
+        violations = check_budget(summary, json.loads(baseline_path.read_text()),
+                                  tolerance if tolerance >= 0 else None)
+        if violations:
+            raise CommandError("Budget exceeded:\n  " + "\n  ".join(violations))
+        self.stdout.write(self.style.SUCCESS("Within the baseline budget."))
+
+    def report(self, summary):
+        self.stdout.write(f"{'endpoint':<14} {'requests':>8} {'errors':>6} {'p50 ms':>8} {'p95 ms':>8} "
+                          f"{'p99 ms':>8} {'queries':>8}")
+        for endpoint, result in summary["endpoints"].items():
+            if not result["requests"]:
+                self.stdout.write(f"{endpoint:<14} {0:>8}")
+                continue
+            self.stdout.write(
+                f"{endpoint:<14} {result['requests']:>8} {result['errors']:>6} {result['p50_ms']:>8.1f} "
+                f"{result['p95_ms']:>8.1f} {result['p99_ms']:>8.1f} {result['queries_max']:>8}"
+            )
+        self.stdout.write(f"{summary['flows_per_second']} flows/s, {summary['requests_per_second']} requests/s")
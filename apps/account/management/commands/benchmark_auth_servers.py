@@ -0,0 +1,132 @@
+import asyncio
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock
+
+from django.core.management.base import BaseCommand
+from django.test import AsyncClient, Client, override_settings
+from django.urls import path
+
+from apps.account.async_views import AsyncTokenCreateView
+from apps.account.models import User
+from apps.account.views import CustomTokenCreatView
+
+urlpatterns = [
+    path("sync/login/", CustomTokenCreatView.as_view()),
+    path("async/login/", AsyncTokenCreateView.as_view()),
+]
+
+BENCHMARK_EMAIL = "benchmark-auth@example.com"
+BENCHMARK_PASSWORD = "Benchmark-Passw0rd"
+
+
+class BrokerStub:
+    """
+    Stands in for the OTP mail task, sleeping like a broker round trip.
+    """
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def delay(self, *args, **kwargs):
+        time.sleep(self.latency)
+
+
+class Command(BaseCommand):
+    help = ("Compare login throughput of the sync views under WSGI with the async views under ASGI. "
+            "Request throttling is disabled during the runs.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Logins per run.")
+        parser.add_argument("--wsgi-workers", type=int, default=8, help="Threads of the WSGI worker.")
+        parser.add_argument("--concurrency", type=int, default=200, help="Logins in flight on the ASGI event loop.")
+        parser.add_argument("--broker-latency", type=float, default=20.0, help="Simulated mail hand-off, in ms.")
+
+    def handle(self, *args, **options):
+        requests = options["requests"]
+        user = self.create_user()
+        broker = BrokerStub(options["broker_latency"] / 1000)
+        try:
+            with override_settings(ROOT_URLCONF=__name__), \
+                    mock.patch("apps.account.views.send_otp_email", broker), \
+                    mock.patch("apps.account.async_views.send_otp_email", broker), \
+                    mock.patch.object(CustomTokenCreatView, "throttle_classes", []), \
+                    mock.patch.object(AsyncTokenCreateView, "throttle_classes", []):
+                self.stdout.write(f"{requests} logins, broker latency {options['broker_latency']:.0f} ms\n")
+                self.report(f"WSGI, sync views, {options['wsgi_workers']} threads",
+                            *self.run_wsgi(requests, options["wsgi_workers"]))
+                self.report(f"ASGI, sync views, {options['concurrency']} in flight",
+                            *asyncio.run(self.run_asgi("/sync/login/", requests, options["concurrency"])))
+                self.report(f"ASGI, async views, {options['concurrency']} in flight",
+                            *asyncio.run(self.run_asgi("/async/login/", requests, options["concurrency"])))
+        finally:
+            user.delete()
+
+    @staticmethod
+    def create_user():
+        User.objects.filter(email=BENCHMARK_EMAIL).delete()
+        id_no = random.randint(10 ** 8, 10 ** 9)
+        while User.objects.filter(id_no=id_no).exists():
+            id_no = random.randint(10 ** 8, 10 ** 9)
+        return User.objects.create_user(
+            email=BENCHMARK_EMAIL, password=BENCHMARK_PASSWORD, first_name="Benchmark", last_name="User",
+            id_no=id_no, security_question=User.SecurityQuestion.PET_NAME, security_answer="benchmark",
+        )
+
+    @staticmethod
+    def run_wsgi(requests, workers):
+        """
+        Serve the logins from a pool of threads, like a threaded WSGI worker.
+        :param requests: Number of logins.
+        :param workers: Number of threads.
+        :return: Tuple of the elapsed time, latencies and errors
+        """
+        local = threading.local()
+        payload = {"email": BENCHMARK_EMAIL, "password": BENCHMARK_PASSWORD}
+
+        def login(_):
+            if not hasattr(local, "client"):
+                local.client = Client()
+            started = time.perf_counter()
+            response = local.client.post("/sync/login/", payload, content_type="application/json")
+            return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            results = list(pool.map(login, range(requests)))
+        elapsed = time.perf_counter() - started
+        return elapsed, [latency for latency, _ in results], sum(status != 200 for _, status in results)
+
+    @staticmethod
+    async def run_asgi(url, requests, concurrency):
+        """
+        Serve the logins from one event loop, like an ASGI worker.
+        :param url: The login URL.
+        :param requests: Number of logins.
+        :param concurrency: Number of logins in flight.
+        :return: Tuple of the elapsed time, latencies and errors
+        """
+        client = AsyncClient()
+        semaphore = asyncio.Semaphore(concurrency)
+        payload = {"email": BENCHMARK_EMAIL, "password": BENCHMARK_PASSWORD}
+
+        async def login():
+            async with semaphore:
+                started = time.perf_counter()
+                response = await client.post(url, payload, content_type="application/json")
+                return time.perf_counter() - started, response.status_code
+
+        started = time.perf_counter()
+        results = await asyncio.gather(*(login() for _ in range(requests)))
+        elapsed = time.perf_counter() - started
+        return elapsed, [latency for latency, _ in results], sum(status != 200 for _, status in results)
+
+    def report(self, label, elapsed, latencies, errors):
+        percentiles = statistics.quantiles(latencies, n=100)
+        self.stdout.write(
+            f"{label:<40} {len(latencies) / elapsed:8.1f} req/s  "
+            f"p50 {percentiles[49] * 1000:7.1f} ms  p95 {percentiles[94] * 1000:7.1f} ms  errors {errors}"
+        )
@@ -0,0 +1,126 @@
+import logging
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from loguru import logger
+
+from interceptor import InterceptHandler, LogSampler, file_sink
+
+
+class UncachedDepths(dict):
+    """
+    Depth cache that never hits, to time the frame walk on every record.
+    """
+
+    def get(self, key, default=None):
+        return default
+
+
+def sinks(directory, rotation, queued=False, enqueue=False, diagnose=True, json=False):
+    """
+    Build sinks like ``LOGURU_LOGGING`` writing to a scratch directory.
+    :param directory: The scratch directory.
+    :param rotation: Size at which the files rotate.
+    :param queued: Write through ``QueuedFileSink``.
+    :param enqueue: Write through loguru's own queue.
+    :param diagnose: Render variable values in tracebacks.
+    :param json: Add the JSON lines sink.
+    :return: The loguru handler configurations
+    """
+    options = {"queued": queued, "rotation": rotation, "compression": "zip"}
+    common = {"enqueue": enqueue, "filter": LogSampler.keep}
+    handlers = [
+        {**file_sink(directory / "debug.log", **options), "level": "DEBUG", "format": settings.LOG_FORMAT,
+         **common},
+        {**file_sink(directory / "error.log", **options), "level": "ERROR", "format": settings.LOG_FORMAT,
+         "backtrace": True, "diagnose": diagnose, **common},
+    ]
+    if json:
+        handlers.append({**file_sink(directory / "app.jsonl", **options), "level": "INFO", "serialize": True,
+                         **common})
+    return handlers
+
+
+class Command(BaseCommand):
+    help = "Measure the time a log call takes on the request path with the synchronous and queued logging setups."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--calls", type=int, default=20000, help="Log calls per run.")
+        parser.add_argument("--rotation", default="1 MB", help="Rotation size of the scratch sinks.")
+
+    def handle(self, *args, **options):
+        calls, rotation = options["calls"], options["rotation"]
+        exceptions = max(calls // 50, 10)
+        self.stdout.write(f"{'setup':<36} {'mean':>9} {'p99':>9} {'max':>10} {'drain':>9}")
+        try:
+            with tempfile.TemporaryDirectory() as scratch:
+                directory = Path(scratch)
+                self.run("sync sinks", sinks(directory, rotation), self.info, calls)
+                self.run("loguru enqueue=True", sinks(directory, rotation, enqueue=True), self.info, calls)
+                self.run("queued sinks", sinks(directory, rotation, queued=True), self.info, calls)
+                self.run("queued sinks + JSON", sinks(directory, rotation, queued=True, json=True),
+                         self.info, calls)
+                sampler = LogSampler({"benchmark": {"sample_rate": 0.0}})
+                self.run("sampled out channel", sinks(directory, rotation, queued=True),
+                         self.channel, calls, patcher=sampler)
+                self.run("exception, sync, diagnose", sinks(directory, rotation),
+                         self.exception, exceptions)
+                self.run("exception, queued, no diagnose", sinks(directory, rotation, queued=True, diagnose=False),
+                         self.exception, exceptions)
+                with mock.patch.object(InterceptHandler, "_depths", UncachedDepths()):
+                    self.run("stdlib record, frame walk", sinks(directory, rotation, queued=True),
+                             self.stdlib, calls)
+                self.run("stdlib record, cached depth", sinks(directory, rotation, queued=True),
+                         self.stdlib, calls)
+        finally:
+            logger.configure(**settings.LOGURU_LOGGING)
+
+    @staticmethod
+    def info(number):
+        logger.info("Benchmark message {}", number)
+
+    @staticmethod
+    def channel(number):
+        logger.bind(channel="benchmark").error("Benchmark message {}", number)
+
+    @staticmethod
+    def exception(number):
+        password = f"secret-{number}"  # noqa: F841 - rendered by diagnose
+        try:
+            raise ValueError(number)
+        except ValueError:
+            logger.exception("Benchmark failure")
+
+    @staticmethod
+    def stdlib(number):
+        logging.getLogger("benchmark").info("Benchmark message %s", number)
+
+    def run(self, label, handlers, log, calls, patcher=None):
+        """
+        Time each log call in the calling thread, then the time the sinks need to catch up and close.
+        :param label: Row label.
+        :param handlers: The loguru handler configurations.
+        :param log: Function making one log call.
+        :param calls: Number of log calls.
+        :param patcher: Optional loguru patcher.
+        """
+        logger.configure(handlers=handlers, patcher=patcher)
+        latencies = []
+        for number in range(calls):
+            started = time.perf_counter()
+            log(number)
+            latencies.append(time.perf_counter() - started)
+        started = time.perf_counter()
+        logger.complete()
+        logger.remove()
+        drain = time.perf_counter() - started
+        p99 = statistics.quantiles(latencies, n=100)[98]
+        self.stdout.write(
+            f"{label:<36} {statistics.fmean(latencies) * 1e6:7.1f}µs {p99 * 1e6:7.1f}µs "
+            f"{max(latencies) * 1e3:8.1f}ms {drain * 1e3:7.1f}ms"
+        )
@@ -0,0 +1,109 @@
+import socketserver
+import threading
+import time
+
+from django.core.mail import get_connection
+from django.core.management.base import BaseCommand
+
+from apps.account.helpers.emails import PersistentMailSender, build_otp_email
+
+SMTP_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+
+
+class SMTPSinkHandler(socketserver.StreamRequestHandler):
+    """
+    Minimal SMTP dialogue that accepts and drops every message.
+    """
+
+    def reply(self, line):
+        if self.server.latency:
+            time.sleep(self.server.latency)
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        self.reply("220 sink ESMTP")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line[:4].upper()
+            if command in (b"EHLO", b"HELO"):
+                self.reply("250 sink")
+            elif command == b"DATA":
+                self.reply("354 End data with <CR><LF>.<CR><LF>")
+                while self.rfile.readline() not in (b".\r\n", b""):
+                    pass
+                self.server.received += 1
+                self.reply("250 OK")
+            elif command == b"QUIT":
+                self.reply("221 Bye")
+                return
+            else:
+                self.reply("250 OK")
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """
+    Local stand-in for an SMTP server with configurable per-reply latency.
+    """
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, latency=0.0):
+        super().__init__(("127.0.0.1", 0), SMTPSinkHandler)
+        self.latency = latency
+        self.received = 0
+
+
+class Command(BaseCommand):
+    help = "Benchmark OTP mail delivery with a connection per message, a persistent connection and batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--count", type=int, default=200, help="Messages per mode.")
+        parser.add_argument("--batch-size", type=int, default=50, help="Messages per batch in batch mode.")
+        parser.add_argument("--latency", type=float, default=0.0,
+                            help="Per-reply latency of the local SMTP stand-in, in milliseconds.")
+        parser.add_argument("--host", help="Use this SMTP server instead of the local stand-in (e.g. mailpit).")
+        parser.add_argument("--port", type=int, default=1025)
+
+    def handle(self, *args, **options):
+        sink = None
+        host, port = options["host"], options["port"]
+        if not host:
+            sink = SMTPSink(latency=options["latency"] / 1000)
+            threading.Thread(target=sink.serve_forever, daemon=True).start()
+            host, port = sink.server_address
+        connection_kwargs = {"host": host, "port": port, "use_tls": False, "use_ssl": False}
+        count, batch_size = options["count"], options["batch_size"]
+        messages = [build_otp_email(f"user{i}@example.com", f"{i:06d}") for i in range(count)]
+
+        def connection_per_message():
+            for message in messages:
+                get_connection(SMTP_BACKEND, **connection_kwargs).send_messages([message])
+
+        def persistent_connection():
+            sender = PersistentMailSender(SMTP_BACKEND, **connection_kwargs)
+            for message in messages:
+                sender.send_messages([message])
+            sender.close()
+
+        def batched():
+            sender = PersistentMailSender(SMTP_BACKEND, **connection_kwargs)
+            for start in range(0, count, batch_size):
+                sender.send_messages(messages[start:start + batch_size])
+            sender.close()
+
+        self.stdout.write(f"SMTP server {host}:{port}, {count} messages per mode")
+        for label, run in (
+            ("connection per message", connection_per_message),
+            ("persistent connection", persistent_connection),
+            (f"batches of {batch_size}", batched),
+        ):
+            started = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f"{label:<24} {elapsed * 1000:9.1f} ms  {count / elapsed:9.1f} msg/s")
+
+        if sink is not None:
+            sink.shutdown()
+            sink.server_close()
@@ -0,0 +1,99 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# Runs in a fresh interpreter, like a newly forked worker: Django is set up, then the warm-up runs
+# or not, then each probe is timed on its first use.
+CHILD = """
+import json, sys, time
+import django
+django.setup()
+from django.test.utils import setup_test_environment
+setup_test_environment()
+
+from apps.account.management.commands.benchmark_auth_flow import benchmark_environment
+
+warm, role = sys.argv[1] == "warm", sys.argv[2]
+steps = []
+with benchmark_environment():
+    if warm:
+        from apps.core.warmup import prefork_warmup, worker_warmup
+        steps = prefork_warmup(role) + worker_warmup()
+
+    from django.test import Client
+    from django.urls import reverse
+    client = Client()
+
+    def schema():
+        assert client.get(reverse("schema")).status_code == 200
+
+    def login():
+        response = client.post(reverse("login"), {}, content_type="application/json")
+        assert response.status_code == 400, response.status_code
+
+    def next_of_kin_validation():
+        from apps.account.serializers import NextOfKinSerializer
+        serializer = NextOfKinSerializer(data={"first_name": "John", "last_name": "Doe", "other_name": "K",
+                                               "gender": "Male", "relationship": "Sibling", "country": "CM",
+                                               "phone_number": "+237650282777"})
+        assert serializer.is_valid(), serializer.errors
+
+    def otp_email():
+        from apps.account.helpers.emails import build_otp_email
+        build_otp_email("probe@example.com", "123456")
+
+    probes = {}
+    for probe in (login, schema, next_of_kin_validation, otp_email):
+        started = time.perf_counter()
+        probe()
+        probes[probe.__name__] = time.perf_counter() - started
+print(json.dumps({"steps": steps, "probes": probes}))
+"""
+
+
+def run_child(warm, role):
+    """
+    Time the first use of each probe in a fresh interpreter.
+    :param warm: Run the warm-up first.
+    :param role: The warm-up role, ``web`` or ``celery``.
+    :return: The child report
+    """
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+    result = subprocess.run([sys.executable, "-c", CHILD, "warm" if warm else "cold", role],
+                            cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    if result.returncode:
+        raise CommandError(f"Probe run failed:\n{result.stderr[-2000:]}")
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+class Command(BaseCommand):
+    help = ("Report how long each warm-up step takes and the latency of the first requests of a fresh "
+            "worker with and without the warm-up, each in its own interpreter.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per mode.")
+        parser.add_argument("--role", choices=sorted(settings.WARMUP_STEPS), default="web",
+                            help="Warm-up steps to run.")
+
+    def handle(self, *args, **options):
+        runs, role = options["runs"], options["role"]
+        cold = [run_child(False, role) for _ in range(runs)]
+        warm = [run_child(True, role) for _ in range(runs)]
+
+        self.stdout.write(f"{'warm-up step':<44} {'median ms':>10}")
+        for index, (path, _, error) in enumerate(warm[0]["steps"]):
+            median = statistics.median(report["steps"][index][1] for report in warm) * 1000
+            self.stdout.write(f"{path:<44} {median:>10.1f}" + (f"  failed: {error}" if error else ""))
+        total = statistics.median(sum(step[1] for step in report["steps"]) for report in warm) * 1000
+        self.stdout.write(f"{'total':<44} {total:>10.1f}")
+
+        self.stdout.write(f"\n{'first use':<24} {'cold ms':>10} {'warm ms':>10}")
+        for probe in cold[0]["probes"]:
+            cold_ms = statistics.median(report["probes"][probe] for report in cold) * 1000
+            warm_ms = statistics.median(report["probes"][probe] for report in warm) * 1000
+            self.stdout.write(f"{probe:<24} {cold_ms:>10.1f} {warm_ms:>10.1f}")
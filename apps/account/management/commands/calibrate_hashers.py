@@ -0,0 +1,88 @@
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import Argon2PasswordHasher, get_hashers
+from django.core.management.base import BaseCommand
+
+from apps.account.helpers.hashing import get_hashing_service
+
+
+def measure(hasher, samples):
+    """
+    Median time in milliseconds to hash a password with the hasher.
+    :param hasher: The password hasher.
+    :param samples: Number of hashes to time.
+    :return: The median time in milliseconds
+    """
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        hasher.encode("calibration-password", hasher.salt())
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def argon2_hasher(time_cost, memory_cost, parallelism):
+    return type("CalibrationArgon2Hasher", (Argon2PasswordHasher,), {
+        "time_cost": time_cost, "memory_cost": memory_cost, "parallelism": parallelism,
+    })()
+
+
+class Command(BaseCommand):
+    help = "Benchmark the configured password hashers and recommend Argon2 parameters for a target latency."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target-ms", type=float, default=50.0, help="Target time for one hash.")
+        parser.add_argument("--samples", type=int, default=5, help="Hashes timed per candidate.")
+        parser.add_argument("--memory-costs", type=int, nargs="+", default=[19456, 47104, 65536, 102400],
+                            help="Argon2 memory costs to try, in KiB.")
+        parser.add_argument("--max-time-cost", type=int, default=6, help="Largest Argon2 time cost to try.")
+        parser.add_argument("--parallelism", type=int, default=settings.ARGON2_PARAMETERS.get("parallelism", 8),
+                            help="Argon2 lanes.")
+
+    def handle(self, *args, **options):
+        target, samples = options["target_ms"], options["samples"]
+
+        self.stdout.write("Configured hashers:")
+        for hasher in get_hashers():
+            self.stdout.write(f"  {hasher.algorithm:<24} {measure(hasher, samples):8.1f} ms")
+
+        self.stdout.write(f"\nArgon2 candidates (target {target:.0f} ms):")
+        best = None
+        for memory_cost in options["memory_costs"]:
+            for time_cost in range(1, options["max_time_cost"] + 1):
+                hasher = argon2_hasher(time_cost, memory_cost, options["parallelism"])
+                elapsed = measure(hasher, samples)
+                self.stdout.write(f"  m={memory_cost:<7} t={time_cost}  {elapsed:8.1f} ms")
+                if elapsed > target:
+                    break
+                # Memory hardness counts for more than extra passes, so prefer it on ties.
+                if best is None or (memory_cost * time_cost, memory_cost) > (best[1] * best[0], best[1]):
+                    best = (time_cost, memory_cost, elapsed)
+
+        if best is None:
+            self.stdout.write(self.style.WARNING("No candidate met the target, raise --target-ms."))
+            return
+        time_cost, memory_cost, elapsed = best
+        self.report_throughput(argon2_hasher(time_cost, memory_cost, options["parallelism"]), samples)
+        self.stdout.write(self.style.SUCCESS(
+            f"\nRecommended ({elapsed:.1f} ms per hash):\n"
+            f"ARGON2_TIME_COST={time_cost}\nARGON2_MEMORY_COST={memory_cost}\n"
+            f"ARGON2_PARALLELISM={options['parallelism']}"
+        ))
+
+    def report_throughput(self, hasher, samples):
+        """
+        Show how many hashes per second the hashing pool sustains with the recommended parameters.
+        :param hasher: The recommended hasher.
+        :param samples: Hashes per worker.
+        """
+        workers = get_hashing_service().max_workers
+        jobs = workers * samples
+        started = time.perf_counter()
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(lambda _: hasher.encode("calibration-password", hasher.salt()), range(jobs)))
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"\nPool of {workers} workers: {jobs / elapsed:.1f} hashes/s")
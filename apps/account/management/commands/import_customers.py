@@ -0,0 +1,286 @@
+import csv
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django_countries import countries
+from django_countries.fields import CountryField
+from loguru import logger
+
+from apps.account.managers import generate_username
+from apps.account.models import NextOfKin, Profile
+
+User = get_user_model()
+
+USER_FIELDS = ("email", "password", "first_name", "middle_name", "last_name", "id_no", "role",
+               "security_question", "security_answer")
+PROFILE_FIELDS = tuple(
+    field.name for field in Profile._meta.concrete_fields if field.editable and field.name not in ("id", "user")
+)
+KIN_FIELDS = tuple(
+    field.name for field in NextOfKin._meta.concrete_fields if field.editable and field.name not in ("id", "profile")
+)
+KIN_PREFIX = "next_of_kin__"
+# CountryField validation translates every country name on each call, so codes are checked directly.
+PROFILE_COUNTRY_FIELDS = [field.name for field in Profile._meta.concrete_fields if isinstance(field, CountryField)]
+KIN_COUNTRY_FIELDS = [field.name for field in NextOfKin._meta.concrete_fields if isinstance(field, CountryField)]
+
+
+def hash_credentials(credentials):
+    """
+    Hash a password and security answer. Runs in the worker processes.
+    :param credentials: Tuple of the raw password and security answer.
+    :return: Tuple of the hashed password and security answer, None if hashing failed
+    """
+    password, security_answer = credentials
+    try:
+        return make_password(password), make_password(security_answer)
+    except Exception as e:
+        # Fails the row instead of the whole map, and the run with it.
+        logger.error(f"Failed to hash customer credentials: {e}")
+        return None
+
+
+def clean_secret(instance, field):
+    """
+    Check a raw credential before it is hashed. Numbers, e.g. from JSON, are taken as their digits.
+    :param instance: The user.
+    :param field: ``password`` or ``security_answer``.
+    """
+    value = getattr(instance, field)
+    if isinstance(value, int) and not isinstance(value, bool):
+        value = str(value)
+    if not isinstance(value, str) or not value.strip():
+        raise ValidationError({field: "A non-empty string is required."})
+    setattr(instance, field, value)
+
+
+def clean_countries(instance, fields):
+    """
+    Normalize the country codes of an instance.
+    :param instance: The model instance.
+    :param fields: The country field names.
+    """
+    for field in fields:
+        value = getattr(instance, field).code
+        if value:
+            code = countries.alpha2(value)
+            if not code:
+                raise ValidationError({field: f"Unknown country {value}."})
+            setattr(instance, field, code)
+
+
+def read_records(path, file_format):
+    """
+    Stream the records of a CSV or JSONL file.
+    :param path: The input file path.
+    :param file_format: Either ``csv`` or ``jsonl``.
+    :return: Iterator of dicts
+    """
+    with open(path, newline="", encoding="utf-8") as source:
+        if file_format == "csv":
+            yield from csv.DictReader(source)
+        else:
+            for line in source:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def split_record(record):
+    """
+    Split a flat or nested record into user, profile and next of kin data.
+    Flat records prefix next of kin columns with ``next_of_kin__``.
+    :param record: The input record.
+    :return: Tuple of the user data, profile data and a list of next of kin data
+    """
+    values = {key: None if value == "" else value for key, value in record.items() if key}
+    user_data = {field: values[field] for field in USER_FIELDS if field in values}
+    profile_data = values.get("profile") or {field: values[field] for field in PROFILE_FIELDS if field in values}
+    kin = values.get("next_of_kin")
+    if kin is None:
+        kin_data = {key[len(KIN_PREFIX):]: value for key, value in values.items()
+                    if key.startswith(KIN_PREFIX) and key[len(KIN_PREFIX):] in KIN_FIELDS and value is not None}
+        kin = [kin_data] if kin_data else []
+    elif isinstance(kin, dict):
+        kin = [kin]
+    return user_data, profile_data, kin
+
+
+class Command(BaseCommand):
+    help = "Import customers from a CSV or JSONL file with bulk inserts and parallel credential hashing."
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="CSV or JSONL file with one customer per row.")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format, guessed from the extension.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Customers per transaction.")
+        parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Hashing processes.")
+        parser.add_argument("--checkpoint", help="Checkpoint file, defaults to <path>.checkpoint.")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint.")
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        if not os.path.exists(path):
+            raise CommandError(f"{path} does not exist")
+        file_format = options["format"] or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+        batch_size = options["batch_size"]
+        self.checkpoint_path = options["checkpoint"] or f"{path}.checkpoint"
+        self.stats = {"processed": 0, "imported": 0, "skipped": 0, "rejected": 0}
+        self.timings = {"validate": 0.0, "hash": 0.0, "write": 0.0}
+
+        done = 0 if options["restart"] else self.load_checkpoint(path)
+        if done:
+            self.stdout.write(f"Resuming after record {done}")
+
+        started = time.perf_counter()
+        records = islice(enumerate(read_records(path, file_format), start=1), done, None)
+        with ProcessPoolExecutor(max_workers=options["workers"], initializer=django.setup) as pool:
+            pending = None
+            while batch := list(islice(records, batch_size)):
+                validated, rejected = self.validate_batch(batch)
+                chunksize = max(1, len(validated) // (options["workers"] * 4))
+                # Hash this batch while the previous one is written.
+                hashed = pool.map(hash_credentials, [(row[0].password, row[0].security_answer) for row in validated],
+                                  chunksize=chunksize)
+                if pending:
+                    self.write_batch(*pending, path)
+                pending = (validated, hashed, rejected, batch[-1][0])
+            if pending:
+                self.write_batch(*pending, path)
+        self.report(time.perf_counter() - started, done)
+
+    def load_checkpoint(self, path):
+        """
+        Read the number of records already committed for the input file.
+        :param path: The input file path.
+        :return: Number of records to skip
+        """
+        try:
+            with open(self.checkpoint_path) as checkpoint:
+                state = json.load(checkpoint)
+        except FileNotFoundError:
+            return 0
+        if state.get("source") != os.path.abspath(path):
+            raise CommandError(f"{self.checkpoint_path} belongs to {state.get('source')}, use --restart")
+        self.stats.update({key: state[key] for key in self.stats if key in state})
+        return state["records"]
+
+    def save_checkpoint(self, path, records):
+        temporary = f"{self.checkpoint_path}.tmp"
+        with open(temporary, "w") as checkpoint:
+            json.dump({"source": os.path.abspath(path), "records": records, **self.stats}, checkpoint)
+        os.replace(temporary, self.checkpoint_path)
+
+    def validate_batch(self, batch):
+        """
+        Build and validate the model instances of a batch without touching the database.
+        The rejections are counted by ``write_batch``, with the checkpoint of their batch.
+        :param batch: List of ``(record number, record)`` tuples.
+        :return: Tuple of a list of ``(user, profile, next of kin list)`` tuples and the number of rejected records
+        """
+        started = time.perf_counter()
+        validated = []
+        rejected = 0
+        emails, id_nos = set(), set()
+        for number, record in batch:
+            try:
+                user, profile, kin = self.build_customer(record)
+                if user.email in emails or user.id_no in id_nos:
+                    raise ValidationError("Duplicate email or ID number in the same batch.")
+            except (ValidationError, ValueError, TypeError) as e:
+                rejected += 1
+                logger.warning(f"Rejected customer record {number}: {e}")
+                continue
+            emails.add(user.email)
+            id_nos.add(user.id_no)
+            validated.append((user, profile, kin))
+        self.timings["validate"] += time.perf_counter() - started
+        return validated, rejected
+
+    def build_customer(self, record):
+        user_data, profile_data, kin_data = split_record(record)
+        user_data["email"] = User.objects.normalize_email(user_data.get("email"))
+        user = User(username=generate_username(), **user_data)
+        clean_secret(user, "password")
+        clean_secret(user, "security_answer")
+        user.full_clean(exclude=["password", "username"], validate_unique=False, validate_constraints=False)
+
+        profile = Profile(user=user, **profile_data)
+        profile.full_clean(exclude=["user", *PROFILE_COUNTRY_FIELDS], validate_unique=False,
+                           validate_constraints=False)
+        clean_countries(profile, PROFILE_COUNTRY_FIELDS)
+        kin = []
+        for data in kin_data:
+            next_of_kin = NextOfKin(profile=profile, **data)
+            next_of_kin.clean_fields(exclude=["profile", *KIN_COUNTRY_FIELDS])
+            clean_countries(next_of_kin, KIN_COUNTRY_FIELDS)
+            kin.append(next_of_kin)
+        if sum(next_of_kin.is_primary for next_of_kin in kin) > 1:
+            raise ValidationError("Only one next of kin can be marked as primary.")
+
+        profile.completion_score = profile.calculate_completion_score()
+        profile.has_next_of_kin = bool(kin)
+        profile.is_complete = profile.completion_score == 100 and profile.has_next_of_kin
+        return user, profile, kin
+
+    def write_batch(self, validated, hashed, rejected, last_record, path):
+        """
+        Insert a validated batch in one transaction and advance the checkpoint.
+        Customers whose email or ID number already exist are skipped, which also makes
+        re-running a batch that committed before its checkpoint was written harmless.
+        :param validated: List of ``(user, profile, next of kin list)`` tuples.
+        :param hashed: Iterator of hashed credentials in the same order.
+        :param rejected: Number of records of the batch rejected by ``validate_batch``.
+        :param last_record: Number of the last record of the batch.
+        :param path: The input file path.
+        """
+        started = time.perf_counter()
+        rows = []
+        for row, credentials in zip(validated, hashed):
+            if credentials is None:
+                rejected += 1
+                logger.warning(f"Rejected customer {row[0].email}: credentials could not be hashed")
+                continue
+            row[0].password, row[0].security_answer = credentials
+            rows.append(row)
+        validated = rows
+        self.timings["hash"] += time.perf_counter() - started
+
+        started = time.perf_counter()
+        existing = User.objects.filter(email__in=[user.email for user, _, _ in validated]).values_list("email", flat=True)
+        existing_ids = User.objects.filter(id_no__in=[user.id_no for user, _, _ in validated]).values_list("id_no", flat=True)
+        existing, existing_ids = set(existing), set(existing_ids)
+        customers = [row for row in validated if row[0].email not in existing and row[0].id_no not in existing_ids]
+        with transaction.atomic():
+            User.objects.bulk_create([user for user, _, _ in customers])
+            Profile.objects.bulk_create([profile for _, profile, _ in customers])
+            NextOfKin.objects.bulk_create([next_of_kin for _, _, kin in customers for next_of_kin in kin])
+        self.timings["write"] += time.perf_counter() - started
+
+        self.stats["imported"] += len(customers)
+        self.stats["skipped"] += len(validated) - len(customers)
+        self.stats["rejected"] += rejected
+        self.stats["processed"] = last_record
+        self.save_checkpoint(path, last_record)
+        self.stdout.write(f"Committed up to record {last_record}: {self.stats['imported']} imported")
+
+    def report(self, elapsed, resumed_from):
+        processed = self.stats["processed"] - resumed_from
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {processed} records in {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.0f} records/s)"
+        ))
+        self.stdout.write(
+            f"Imported {self.stats['imported']}, skipped {self.stats['skipped']} existing, "
+            f"rejected {self.stats['rejected']} invalid"
+        )
+        self.stdout.write(
+            f"Validation {self.timings['validate']:.1f}s, waiting on hashing {self.timings['hash']:.1f}s, "
+            f"writing {self.timings['write']:.1f}s"
+        )
@@ -0,0 +1,169 @@
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "startup.json"
+TARGETS = ("check", "celery")
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+# Runs in a fresh interpreter, so nothing is imported or configured yet. It times the settings,
+# django.setup() and each app's ready(), then the target: the system checks, or what a Celery
+# worker does before connecting to the broker.
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+phases, ready = {}, {}
+
+def mark(phase):
+    phases[phase] = time.perf_counter() - started - sum(phases.values())
+
+from django.apps import AppConfig
+
+create = AppConfig.create.__func__
+
+def timed_create(cls, entry):
+    config = create(cls, entry)
+    original = config.ready
+
+    def timed_ready():
+        begin = time.perf_counter()
+        original()
+        ready[config.label] = time.perf_counter() - begin
+
+    config.ready = timed_ready
+    return config
+
+AppConfig.create = classmethod(timed_create)
+target = sys.argv[1]
+if target == "celery":
+    from fintech.celery import app
+mark("import")
+from django.conf import settings
+settings.INSTALLED_APPS
+mark("settings")
+import django
+django.setup()
+mark("setup")
+if target == "check":
+    from django.core.management import call_command
+    call_command("check", verbosity=0)
+else:
+    app.loader.import_default_modules()
+    app.finalize(auto=True)
+mark(target)
+print(json.dumps({"phases": phases, "ready": ready}))
+"""
+
+
+def parse_importtime(output):
+    """
+    Parse the report of ``python -X importtime``.
+    :param output: The stderr of the interpreter.
+    :return: ``(module, self_us, cumulative_us, depth)`` tuples in import order
+    """
+    imports = []
+    for line in output.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            own, cumulative, indent, module = match.groups()
+            imports.append((module, int(own), int(cumulative), len(indent) // 2))
+    return imports
+
+
+def cold_start(target, importtime=False):
+    """
+    Start a fresh interpreter with the current settings module and run the target in it.
+    :param target: One of ``TARGETS``.
+    :param importtime: Also record the import times.
+    :return: Tuple of the wall time, the child report and the parsed import times
+    """
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", CHILD, target]
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+    started = time.perf_counter()
+    result = subprocess.run(command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if result.returncode:
+        raise CommandError(f"{target} failed to start:\n{result.stderr[-2000:]}")
+    report = json.loads(result.stdout.strip().splitlines()[-1])
+    return elapsed, report, parse_importtime(result.stderr) if importtime else []
+
+
+def check_budget(summary, baseline, tolerance):
+    """
+    Compare the median cold start of each target with the baseline.
+    :param summary: Median milliseconds by target.
+    :param baseline: The baseline medians.
+    :param tolerance: Allowed growth, e.g. 0.25 for 25%.
+    :return: The budget violations
+    """
+    violations = []
+    for target, median in summary["cold_start_ms"].items():
+        budget = baseline.get("cold_start_ms", {}).get(target)
+        if budget is not None and median > budget * (1 + tolerance):
+            violations.append(f"{target}: {median} ms, budget {budget} ms +{tolerance:.0%}")
+    return violations
+
+
+class Command(BaseCommand):
+    help = ("Profile the cold start of manage.py check and of a Celery worker in fresh interpreters: "
+            "time per phase, per app ready() and the slowest imports. With --runs, compares the median "
+            "cold start with a JSON baseline and fails when it got slower.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--target", choices=TARGETS, action="append", help="Targets, both by default.")
+        parser.add_argument("--top", type=int, default=25, help="Slowest imports to list.")
+        parser.add_argument("--runs", type=int, default=0, help="Timed cold starts per target for the benchmark.")
+        parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline JSON file.")
+        parser.add_argument("--save-baseline", action="store_true", help="Write this run as the new baseline.")
+        parser.add_argument("--tolerance", type=float, default=0.5, help="Allowed cold start growth over the baseline.")
+
+    def handle(self, *args, **options):
+        targets = options["target"] or TARGETS
+        for target in targets:
+            self.profile(target, options["top"])
+        if not options["runs"]:
+            return
+
+        summary = {"cold_start_ms": {}, "settings": {"runs": options["runs"], "module": settings.SETTINGS_MODULE,
+                                                     "python": sys.version.split()[0]}}
+        for target in targets:
+            timings = [cold_start(target)[0] * 1000 for _ in range(options["runs"])]
+            summary["cold_start_ms"][target] = round(statistics.median(timings), 1)
+            self.stdout.write(f"{target:<8} median {summary['cold_start_ms'][target]:>8.1f} ms, "
+                              f"min {min(timings):.1f} ms over {len(timings)} runs")
+
+        baseline_path = options["baseline"]
+        if options["save_baseline"]:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps(summary, indent=2) + "\n")
+            self.stdout.write(self.style.SUCCESS(f"Baseline written to {baseline_path}"))
+            return
+        if not baseline_path.exists():
+            self.stdout.write(self.style.WARNING(f"No baseline at {baseline_path}, run with --save-baseline."))
+            return
+        violations = check_budget(summary, json.loads(baseline_path.read_text()), options["tolerance"])
+        if violations:
+            raise CommandError("Budget exceeded:\n  " + "\n  ".join(violations))
+        self.stdout.write(self.style.SUCCESS("Within the baseline budget."))
+
+    def profile(self, target, top):
+        elapsed, report, imports = cold_start(target, importtime=True)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"{target}: {elapsed * 1000:.1f} ms wall time"))
+        for phase, seconds in report["phases"].items():
+            self.stdout.write(f"  {phase:<34} {seconds * 1000:>9.1f} ms")
+        self.stdout.write("  ready()")
+        for label, seconds in sorted(report["ready"].items(), key=lambda item: -item[1]):
+            if seconds >= 0.0005:
+                self.stdout.write(f"    {label:<32} {seconds * 1000:>9.1f} ms")
+        self.stdout.write(f"  {'slowest imports':<34} {'cumulative':>12} {'self':>9}")
+        for module, own, cumulative, depth in sorted(imports, key=lambda item: -item[2])[:top]:
+            self.stdout.write(f"    {'  ' * min(depth, 4)}{module:<{32 - 2 * min(depth, 4)}} "
+                              f"{cumulative / 1000:>9.1f} ms {own / 1000:>6.1f} ms")
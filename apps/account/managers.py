@@ -1,26 +1,19 @@
-import random
-import string
-from os import getenv
 from typing import Any
 
-from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import UserManager as DjangoUserManager
 from django.core.exceptions import ValidationError
+from django.core.validators import validate_email as django_validate_email
 from django.utils.translation import gettext_lazy as _
 
+from .helpers.usernames import get_username_allocator
+
 
 def generate_username() -> str:
     """
-    Generate a random username.
-    :return: A random username
+    Generate a unique username.
+    :return: A unique username
     """
-    bank_name = getenv("BANK_NAME")
-    words = bank_name.split()
-    prefix = "".join(word[0] for word in words)
-    remaining_characters = 12 - len(prefix) - 1
-    random_string = "".join(random.choices(string.ascii_uppercase + string.digits, k=remaining_characters))
-    username = f"{prefix}-{random_string}"
-    return username
+    return get_username_allocator().allocate()
 
 
 def validate_email(email: str) -> None:
@@ -30,7 +23,7 @@ def validate_email(email: str) -> None:
     :return: Validate email address
     """
     try:
-        validate_email(email)
+        django_validate_email(email)
     except ValidationError:
         raise ValueError(_("Invalid email address"))
 
@@ -57,7 +50,8 @@ class UserManager(DjangoUserManager):
         validate_email(email)
         username = generate_username()
         user = self.model(email=email, username=username, **extra_fields)
-        user.password = make_password(password)
+        user.set_password(password)
+        user.set_security_answer(user.security_answer)
         user.save(using=self._db)
         return user
 
@@ -0,0 +1,14 @@
+from prometheus_client import Counter
+
+OTP_SENT = Counter("account_otp_sent_total", "Login OTPs issued and queued for delivery.")
+OTP_VERIFICATIONS = Counter("account_otp_verifications_total", "Login OTP checks by result.", ["result"])
+LOCKOUTS = Counter("account_lockouts_total", "Accounts locked and IP addresses blocked after failed logins.",
+                   ["scope"])
+REFRESH_FAILURES = Counter("account_token_refresh_failures_total", "Rejected token refreshes by reason.",
+                           ["reason"])
+REVOCATION_CHECKS = Counter("account_token_revocation_checks_total",
+                            "Access token revocation checks by result. Only bloom filter hits reach the store.",
+                            ["result"])
+THROTTLE_REJECTIONS = Counter("account_throttle_rejections_total",
+                              "Throttled requests by scope and where they were rejected, in-process or by the store.",
+                              ["scope", "source"])
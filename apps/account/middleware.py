@@ -1,14 +1,38 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject, empty
+
+
 class CustomHeaderMiddleware:
     """
     Middleware to add a custom header to the response.
+    It supports both sync and async requests, so async views run without a thread hop.
     """
+    sync_capable = True
+    async_capable = True
 
     def __init__(self, get_response):
         self.get_response = get_response
+        self.skip_prefixes = tuple(prefix for prefix in (settings.STATIC_URL, settings.MEDIA_URL) if prefix)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
 
     def __call__(self, request):
-        response = self.get_response(request)
-        if request.user.is_authenticated:
-            response['X-Django-User'] = request.user.email
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.process_response(request, self.get_response(request))
+
+    async def __acall__(self, request):
+        return self.process_response(request, await self.get_response(request))
+
+    def process_response(self, request, response):
+        if request.path.startswith(self.skip_prefixes):
+            return response
+        user = getattr(request, "user", None)
+        # Do not resolve a lazy session user just for the header; only report users the view already loaded.
+        if user is None or (isinstance(user, SimpleLazyObject) and user._wrapped is empty):
+            return response
+        if user.is_authenticated:
+            response['X-Django-User'] = user.email
 
         return response
@@ -0,0 +1,107 @@
+# Generated by Django 5.2 on 2026-10-17 02:05
+
+import cloudinary.models
+import datetime
+import django.db.models.deletion
+import django_countries.fields
+import phonenumber_field.modelfields
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OTPChallenge',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=254, unique=True, verbose_name='Key')),
+                ('code_hash', models.CharField(max_length=64, verbose_name='Code hash')),
+                ('expires_at', models.DateTimeField(db_index=True, verbose_name='Expires at')),
+                ('attempts', models.PositiveSmallIntegerField(default=0, verbose_name='Attempts')),
+            ],
+            options={
+                'verbose_name': 'OTP challenge',
+                'verbose_name_plural': 'OTP challenges',
+            },
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='otp',
+        ),
+        migrations.RemoveField(
+            model_name='user',
+            name='otp_expiry',
+        ),
+        migrations.CreateModel(
+            name='Profile',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('title', models.CharField(choices=[('mr', 'Mr.'), ('mrs', 'Mrs.'), ('ms', 'Ms.'), ('dr', 'Dr.'), ('prof', 'Prof.')], default='mr', max_length=5, verbose_name='Salutation')),
+                ('gender', models.CharField(choices=[('Male', 'Male'), ('Female', 'Female')], default='Male', max_length=10, verbose_name='Gender')),
+                ('marital_status', models.CharField(choices=[('Single', 'Single'), ('Married', 'Married'), ('Divorced', 'Divorced'), ('Widowed', 'Widowed')], default='Married', max_length=10, verbose_name='Marital status')),
+                ('phone_number', phonenumber_field.modelfields.PhoneNumberField(blank=True, default='+237650282777', max_length=15, null=True, region=None, verbose_name='Phone number')),
+                ('address', models.TextField(blank=True, null=True, verbose_name='Address')),
+                ('date_of_birth', models.DateField(blank=True, default=datetime.date(1900, 1, 1), null=True, verbose_name='Date of birth')),
+                ('identification_type', models.CharField(choices=[('Passport', 'Passport'), ('ID Card', 'ID Card'), ('Driver License', 'Driver License'), ('National ID', 'National ID'), ('Other', 'Other')], default='ID Card', max_length=20, verbose_name='Identification type')),
+                ('country_of_birth', django_countries.fields.CountryField(blank=True, default='CM', max_length=2, null=True, verbose_name='Country')),
+                ('place_of_birth', models.CharField(default='Unknown', max_length=100, verbose_name='Place of birth')),
+                ('id_issue_date', models.DateField(blank=True, default=datetime.date(2000, 1, 1), null=True, verbose_name='ID issue date')),
+                ('id_expiry_date', models.DateField(blank=True, default=datetime.date(2024, 1, 1), null=True, verbose_name='ID expiry date')),
+                ('employment_status', models.CharField(choices=[('Employed', 'Employed'), ('Unemployed', 'Unemployed'), ('Self Employed', 'Self Employed'), ('Retired', 'Retired'), ('Student', 'Student')], default='Unemployed', max_length=20, verbose_name='Employment status')),
+                ('passport_number', models.CharField(blank=True, max_length=20, null=True, verbose_name='Passport number')),
+                ('nationality', django_countries.fields.CountryField(blank=True, default='CM', max_length=2, null=True, verbose_name='Nationality')),
+                ('city', models.CharField(blank=True, max_length=100, null=True, verbose_name='City')),
+                ('employer_name', models.CharField(blank=True, max_length=100, null=True, verbose_name='Employer name')),
+                ('annual_income', models.DecimalField(blank=True, decimal_places=2, max_digits=15, null=True, verbose_name='Annual income')),
+                ('date_of_employment', models.DateField(blank=True, null=True, verbose_name='Date of employment')),
+                ('employer_address', models.TextField(blank=True, null=True, verbose_name='Employer address')),
+                ('employer_city', models.CharField(blank=True, max_length=100, null=True, verbose_name='Employer city')),
+                ('employer_state', models.CharField(blank=True, max_length=100, null=True, verbose_name='Employer state')),
+                ('photo', cloudinary.models.CloudinaryField(blank=True, max_length=255, null=True, verbose_name='Photo')),
+                ('photo_url', models.URLField(blank=True, null=True, verbose_name='Photo URL')),
+                ('id_photo', cloudinary.models.CloudinaryField(blank=True, max_length=255, null=True, verbose_name='ID Photo')),
+                ('id_photo_url', models.URLField(blank=True, null=True, verbose_name='ID Photo URL')),
+                ('signature_photo', cloudinary.models.CloudinaryField(blank=True, max_length=255, null=True, verbose_name='Signature Photo')),
+                ('signature_photo_url', models.URLField(blank=True, null=True, verbose_name='Signature Photo URL')),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='profile', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='NextOfKin',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('title', models.CharField(choices=[('mr', 'Mr.'), ('mrs', 'Mrs.'), ('ms', 'Ms.'), ('dr', 'Dr.'), ('prof', 'Prof.')], default='mr', max_length=5, verbose_name='Salutation')),
+                ('first_name', models.CharField(max_length=100, verbose_name='First Name')),
+                ('last_name', models.CharField(max_length=100, verbose_name='Last Name')),
+                ('other_name', models.CharField(max_length=100, verbose_name='Other Name')),
+                ('date_of_birth', models.DateField(blank=True, null=True, verbose_name='Date of birth')),
+                ('gender', models.CharField(choices=[('Male', 'Male'), ('Female', 'Female')], max_length=10, verbose_name='Gender')),
+                ('email_address', models.EmailField(blank=True, db_index=True, max_length=100, null=True, verbose_name='Email address')),
+                ('relationship', models.CharField(choices=[('Parent', 'Parent'), ('Sibling', 'Sibling'), ('Child', 'Child'), ('Friend', 'Friend'), ('Other', 'Other')], max_length=10, verbose_name='Relationship')),
+                ('phone_number', phonenumber_field.modelfields.PhoneNumberField(blank=True, max_length=15, null=True, region=None, verbose_name='Phone number')),
+                ('address', models.TextField(blank=True, null=True, verbose_name='Address')),
+                ('city', models.CharField(blank=True, max_length=100, null=True, verbose_name='City')),
+                ('state', models.CharField(blank=True, max_length=100, null=True, verbose_name='State')),
+                ('country', django_countries.fields.CountryField(blank=True, max_length=2, null=True, verbose_name='Country')),
+                ('is_primary', models.BooleanField(default=False, verbose_name='Is primary')),
+                ('profile', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='next_of_kin', to='account.profile')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('is_primary', True)), fields=('profile', 'is_primary'), name='unique_primary_next_of_kin')],
+            },
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-17 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0003_user_token_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LoginFailureCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=300, unique=True, verbose_name='Key')),
+                ('count', models.PositiveIntegerField(default=0, verbose_name='Count')),
+                ('window_started_at', models.DateTimeField(verbose_name='Window started at')),
+            ],
+            options={
+                'verbose_name': 'Login failure counter',
+                'verbose_name_plural': 'Login failure counters',
+            },
+        ),
+        migrations.AlterField(
+            model_name='profile',
+            name='id_expiry_date',
+            field=models.DateField(blank=True, null=True, verbose_name='ID expiry date'),
+        ),
+    ]
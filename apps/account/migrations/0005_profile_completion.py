@@ -0,0 +1,28 @@
+# Generated by Django 5.2 on 2026-10-17 02:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0004_login_failure_counter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='completion_score',
+            field=models.PositiveSmallIntegerField(db_index=True, default=0, editable=False, verbose_name='Completion score'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='has_next_of_kin',
+            field=models.BooleanField(default=False, editable=False, verbose_name='Has next of kin'),
+        ),
+        migrations.AddField(
+            model_name='profile',
+            name='is_complete',
+            field=models.BooleanField(db_index=True, default=False, editable=False, verbose_name='Is complete'),
+        ),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-17 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0005_profile_completion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UsernameCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('prefix', models.CharField(max_length=12, unique=True, verbose_name='Prefix')),
+                ('next_value', models.PositiveBigIntegerField(default=0, verbose_name='Next value')),
+            ],
+            options={
+                'verbose_name': 'Username counter',
+                'verbose_name_plural': 'Username counters',
+            },
+        ),
+    ]
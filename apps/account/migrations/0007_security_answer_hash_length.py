@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-17 02:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('account', '0006_username_counter'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='security_answer',
+            field=models.CharField(max_length=128, verbose_name='Security answer'),
+        ),
+    ]
@@ -1,24 +1,58 @@
 import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
 
 from cloudinary.models import CloudinaryField
-from django.contrib.auth.hashers import make_password, check_password
 from django.contrib.auth.models import AbstractUser
 from django.core.exceptions import ValidationError
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Exists, ExpressionWrapper, OuterRef, Q
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django_countries.fields import CountryField
 from phonenumber_field.modelfields import PhoneNumberField
 from django.conf import settings
 
+from .helpers.emails import adelay, send_account_locked_email
+from .helpers.hashing import get_hashing_service
+from .helpers.lockout import get_lockout_engine
+from .helpers.otp import get_otp_store
 from .managers import UserManager
-from ..core.models import TimeStampedModel
+from .metrics import LOCKOUTS
+from .tokens import acache_token_version, cache_token_version
+from ..core.models import DirtyFieldsMixin, TimeStampedModel
 
 
 # Create your models here.
 
 
-class User(AbstractUser):
+def clean_for_save(instance, update_fields=None):
+    """
+    Run ``full_clean`` before a save.
+    When only some fields are written, the other fields are excluded and uniqueness
+    is only checked if a written field takes part in it.
+    :param instance: The model instance.
+    :param update_fields: The fields passed to ``save``.
+    :return: None
+    """
+    if update_fields is None:
+        instance.full_clean()
+        return
+    update_fields = set(update_fields)
+    exclude = set()
+    unique_fields = set()
+    for field in instance._meta.concrete_fields:
+        if field.name not in update_fields and field.attname not in update_fields:
+            exclude.add(field.name)
+        elif field.unique and not field.primary_key:
+            unique_fields.add(field.name)
+    for constraint in instance._meta.constraints:
+        unique_fields.update(getattr(constraint, "fields", ()))
+    check_unique = bool(unique_fields - exclude)
+    instance.full_clean(exclude=exclude, validate_unique=check_unique, validate_constraints=check_unique)
+
+
+class User(DirtyFieldsMixin, AbstractUser):
     """
     Custom user model that uses email as the unique identifier.
     """
@@ -59,7 +93,7 @@ class User(AbstractUser):
 
     security_question = models.CharField(_("Security questions"), choices=SecurityQuestion.choices, max_length=30)
 
-    security_answer = models.CharField(_("Security answer"), max_length=100)
+    security_answer = models.CharField(_("Security answer"), max_length=128)
 
     account_status = models.CharField(_("Account status"), choices=AccountStatus.choices, max_length=10,
                                       default=AccountStatus.ACTIVE)
@@ -78,59 +112,154 @@ class User(AbstractUser):
 
     last_login_attempt = models.DateTimeField(_("Last login attempt"), null=True, blank=True)
 
-    otp = models.CharField(_("OTP"), max_length=6, blank=True, null=True)
-
-    otp_expiry = models.DateTimeField(_("OTP expiry"), null=True, blank=True)
+    token_version = models.PositiveIntegerField(_("Token version"), default=0)
 
     objects = UserManager()
 
     USERNAME_FIELD = "email"
     REQUIRED_FIELDS = ["username", "first_name", "last_name", "id_no", "security_question", "security_answer"]
 
+    # Changing any of these invalidates every token issued to the user.
+    TOKEN_CLAIM_FIELDS = ("role", "account_status", "email", "is_active")
+
+    def save(self, *args, **kwargs):
+        """
+        Save the user, bumping the token version when a field embedded in tokens changed.
+        With ``update_fields``, only the claim fields being written count.
+        :param args:
+        :param kwargs:
+        :return: None
+        """
+        update_fields = kwargs.get("update_fields")
+        fields = [field for field in self.TOKEN_CLAIM_FIELDS if update_fields is None or field in update_fields]
+        claims_changed = not self._state.adding and bool(fields) and self.is_dirty(*fields)
+        if claims_changed:
+            self.token_version += 1
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, "token_version"}
+        super().save(*args, **kwargs)
+        if claims_changed:
+            transaction.on_commit(lambda: cache_token_version(self.pk, self.token_version))
+
+    def bump_token_version(self):
+        """
+        Invalidate every token issued to the user.
+        :return: None
+        """
+        User.objects.filter(pk=self.pk).update(token_version=models.F("token_version") + 1)
+        self.refresh_from_db(fields=["token_version"])
+        transaction.on_commit(lambda: cache_token_version(self.pk, self.token_version))
+
     def set_otp(self, otp):
-        self.otp = otp
-        self.otp_expiry = timezone.now() + settings.OTP_EXPIRATION_TIME
-        self.save(update_fields=["otp", "otp_expiry"])
+        """
+        Issue a new OTP challenge for the user.
+        The challenge lives in the configured OTP store, the user row is not written.
+        :param otp:
+        :return: None
+        """
+        get_otp_store().issue(self.email, otp)
 
     def is_otp_valid(self, otp):
         """
-        Check if the OTP is valid and not expired.
+        Check if the OTP is valid and not expired. A valid OTP is consumed.
         :param otp:
         :return: True if OTP is valid, False otherwise
         """
-        if self.otp == otp and timezone.now() < self.otp_expiry:
-            self.otp = ""
-            self.otp_expiry = None
-            self.save(update_fields=["otp", "otp_expiry"])
-            return True
-        return False
+        return get_otp_store().verify(self.email, otp)
 
-    def handle_failed_login_attempt(self):
+    def handle_failed_login_attempt(self, ip_address=None):
         """
         Handle failed login attempts.
+        Failures are counted atomically by the lockout engine; the user row is only
+        written when the account switches to locked.
+        :param ip_address: The client IP address.
         :return: True if the user is locked out, False otherwise
         """
-        self.failed_login_attempts += 1
-        self.last_login_attempt = timezone.now()
-
-        if self.failed_login_attempts >= settings.LOGIN_ATTEMPTS_LIMIT:
-            self.account_status = self.AccountStatus.LOCKED
-            self.save(update_fields=["failed_login_attempts", "last_login_attempt", "account_status"])
+        failures = get_lockout_engine().register_failure(self.email, ip_address)
+        if failures < settings.LOGIN_ATTEMPTS_LIMIT:
+            return False
+        if self.account_status == self.AccountStatus.LOCKED:
             return True
-        else:
-            self.save(update_fields=["failed_login_attempts", "last_login_attempt"])
+
+        now = timezone.now()
+        # The status filter makes sure only one of several concurrent requests locks the account.
+        locked = User.objects.filter(pk=self.pk).exclude(account_status=self.AccountStatus.LOCKED).update(
+            account_status=self.AccountStatus.LOCKED,
+            failed_login_attempts=failures,
+            last_login_attempt=now,
+            token_version=models.F("token_version") + 1,
+        )
+        self.account_status = self.AccountStatus.LOCKED
+        self.failed_login_attempts = failures
+        self.last_login_attempt = now
+        self.mark_clean(["account_status", "failed_login_attempts", "last_login_attempt"])
+        if locked:
+            LOCKOUTS.labels("account").inc()
+            self.refresh_from_db(fields=["token_version"])
+            transaction.on_commit(lambda: cache_token_version(self.pk, self.token_version))
+            transaction.on_commit(lambda: send_account_locked_email.delay(self.email, self.full_name))
+        return True
+
+    async def ahandle_failed_login_attempt(self, ip_address=None):
+        """
+        Async version of ``handle_failed_login_attempt``.
+        The async ORM runs in autocommit mode, so the follow-up work runs right after the update.
+        :param ip_address: The client IP address.
+        :return: True if the user is locked out, False otherwise
+        """
+        failures = await get_lockout_engine().aregister_failure(self.email, ip_address)
+        if failures < settings.LOGIN_ATTEMPTS_LIMIT:
             return False
+        if self.account_status == self.AccountStatus.LOCKED:
+            return True
+
+        now = timezone.now()
+        locked = await User.objects.filter(pk=self.pk).exclude(account_status=self.AccountStatus.LOCKED).aupdate(
+            account_status=self.AccountStatus.LOCKED,
+            failed_login_attempts=failures,
+            last_login_attempt=now,
+            token_version=models.F("token_version") + 1,
+        )
+        self.account_status = self.AccountStatus.LOCKED
+        self.failed_login_attempts = failures
+        self.last_login_attempt = now
+        self.mark_clean(["account_status", "failed_login_attempts", "last_login_attempt"])
+        if locked:
+            LOCKOUTS.labels("account").inc()
+            await self.arefresh_from_db(fields=["token_version"])
+            await acache_token_version(self.pk, self.token_version)
+            await adelay(send_account_locked_email, self.email, self.full_name)
+        return True
 
     def reset_failed_login_attempt(self):
         """
         Reset the last login attempt and failed login attempts.
+        The user row is only written if it holds lockout state.
         :return: None
         """
+        get_lockout_engine().reset(self.email)
+        if (self.account_status == self.AccountStatus.ACTIVE
+                and not self.failed_login_attempts and self.last_login_attempt is None):
+            return
         self.failed_login_attempts = 0
         self.last_login_attempt = None
         self.account_status = self.AccountStatus.ACTIVE
         self.save(update_fields=["failed_login_attempts", "last_login_attempt", "account_status"])
 
+    async def areset_failed_login_attempt(self):
+        """
+        Async version of ``reset_failed_login_attempt``.
+        :return: None
+        """
+        await get_lockout_engine().areset(self.email)
+        if (self.account_status == self.AccountStatus.ACTIVE
+                and not self.failed_login_attempts and self.last_login_attempt is None):
+            return
+        self.failed_login_attempts = 0
+        self.last_login_attempt = None
+        self.account_status = self.AccountStatus.ACTIVE
+        await self.asave(update_fields=["failed_login_attempts", "last_login_attempt", "account_status"])
+
     @property
     def is_locked_out(self):
         """
@@ -140,28 +269,72 @@ class User(AbstractUser):
         """
         if self.account_status == self.AccountStatus.LOCKED:
             # Check if lockout duration has expired
-            if timezone.now() > self.last_login_attempt + settings.LOCKOUT_DURATION:
-                # Unlock the account
-                self.account_status = self.AccountStatus.ACTIVE
-                self.failed_login_attempts = 0
-                self.last_login_attempt = None
-                self.save(update_fields=["account_status", "failed_login_attempts", "last_login_attempt"])
-                return False
-            else:
+            if self.last_login_attempt and timezone.now() <= self.last_login_attempt + settings.LOCKOUT_DURATION:
+                return True
+            # Unlock the account and start a fresh failure window
+            self.reset_failed_login_attempt()
+        return False
+
+    async def ais_locked_out(self):
+        """
+        Async version of ``is_locked_out``.
+        :return: Boolean indicating if the account is still locked out
+        """
+        if self.account_status == self.AccountStatus.LOCKED:
+            if self.last_login_attempt and timezone.now() <= self.last_login_attempt + settings.LOCKOUT_DURATION:
                 return True
+            await self.areset_failed_login_attempt()
         return False
 
+    def set_password(self, raw_password):
+        """
+        Sets a hashed password, hashing on the shared hashing pool
+        """
+        self.password = get_hashing_service().make_password(raw_password)
+        self._password = raw_password
+
+    def check_password(self, raw_password):
+        """
+        Checks the password on the shared hashing pool, upgrading the hash if needed
+        """
+
+        def setter(raw_password):
+            self.set_password(raw_password)
+            # Password hash upgrades shouldn't be considered password changes.
+            self._password = None
+            self.save(update_fields=["password"])
+
+        return get_hashing_service().check_password(raw_password, self.password, setter)
+
+    async def acheck_password(self, raw_password):
+        """
+        Checks the password without blocking the event loop
+        """
+
+        async def setter(raw_password):
+            self.password = await get_hashing_service().amake_password(raw_password)
+            self._password = None
+            await self.asave(update_fields=["password"])
+
+        return await get_hashing_service().acheck_password(raw_password, self.password, setter)
+
     def set_security_answer(self, raw_answer):
         """
         Sets a hashed security answer
         """
-        self.security_answer = make_password(raw_answer)
+        self.security_answer = get_hashing_service().make_password(raw_answer)
 
     def check_security_answer(self, raw_answer):
         """
         Checks if the provided answer matches the stored security answer
         """
-        return check_password(raw_answer, self.security_answer)
+        return get_hashing_service().check_password(raw_answer, self.security_answer)
+
+    async def acheck_security_answer(self, raw_answer):
+        """
+        Checks the security answer without blocking the event loop
+        """
+        return await get_hashing_service().acheck_password(raw_answer, self.security_answer)
 
     @property
     def full_name(self):
@@ -174,6 +347,8 @@ class User(AbstractUser):
         verbose_name = _("User")
         verbose_name_plural = _("Users")
         ordering = ["-date_joined"]
+        # Keyset of the default ordering, scanned backwards for newest first.
+        indexes = [models.Index(fields=["date_joined", "id"], name="account_user_joined_keyset")]
 
 
     def has_role(self, role_name):
@@ -194,7 +369,7 @@ class User(AbstractUser):
 
 
 
-class Profile(TimeStampedModel):
+class Profile(DirtyFieldsMixin, TimeStampedModel):
     """
     User profile model.
     """
@@ -251,7 +426,7 @@ class Profile(TimeStampedModel):
 
     id_issue_date = models.DateField(_("ID issue date"), blank=True, null=True, default=settings.DEFAULT_DATE)
 
-    id_expiry_date = models.DateField(_("ID expiry date"), blank=True, null=True, default=settings.DEFAULT_EXPIRY_DATE)
+    id_expiry_date = models.DateField(_("ID expiry date"), blank=True, null=True)
 
     employment_status = models.CharField(_("Employment status"), choices=EmploymentChoice.choices, default=EmploymentChoice.UNEMPLOYED, max_length=20)
 
@@ -285,6 +460,25 @@ class Profile(TimeStampedModel):
 
     signature_photo_url = models.URLField(_("Signature Photo URL"), blank=True, null=True)
 
+    image_variants = models.JSONField(_("Image variants"), default=dict, blank=True, editable=False)
+
+    completion_score = models.PositiveSmallIntegerField(_("Completion score"), default=0, editable=False, db_index=True)
+
+    has_next_of_kin = models.BooleanField(_("Has next of kin"), default=False, editable=False)
+
+    is_complete = models.BooleanField(_("Is complete"), default=False, editable=False, db_index=True)
+
+    COMPLETION_FIELDS = (
+        "gender", "marital_status", "phone_number", "address", "date_of_birth", "identification_type",
+        "country_of_birth", "place_of_birth", "id_issue_date", "id_expiry_date", "employment_status",
+        "passport_number", "nationality", "city", "employer_name", "annual_income", "date_of_employment",
+        "employer_address", "employer_city", "employer_state", "photo", "photo_url", "id_photo",
+        "id_photo_url", "signature_photo", "signature_photo_url",
+    )
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [models.Index(fields=["created_at", "id"], name="account_profile_created_keyset")]
 
     def clean(self):
         """
@@ -311,55 +505,89 @@ class Profile(TimeStampedModel):
     def save(self, *args, **kwargs):
         """
         Save the profile data.
+        Partial saves only validate the fields being written. The completion score is only
+        recalculated when a completion field is written, and the next of kin derived flags are
+        left to ``refresh_next_of_kin_state`` so a stale instance never overwrites them.
         :param args:
         :param kwargs:
         :return: None
         """
-        self.full_clean()
+        update_fields = kwargs.get("update_fields")
+        clean_for_save(self, update_fields)
+        if update_fields is None or set(update_fields) & set(self.COMPLETION_FIELDS):
+            self.completion_score = self.calculate_completion_score()
+        if self._state.adding:
+            self.is_complete = False
+            super().save(*args, **kwargs)
+            return
+
+        score_changed = self.is_dirty("completion_score")
+        if update_fields is None:
+            update_fields = [field.name for field in self._meta.concrete_fields if not field.primary_key]
+        kwargs["update_fields"] = (
+            {*update_fields, "completion_score"} if score_changed else set(update_fields)
+        ) - {"has_next_of_kin", "is_complete"}
         super().save(*args, **kwargs)
+        if score_changed:
+            Profile.refresh_next_of_kin_state(self.pk)
+            # has_next_of_kin may be stale on this instance, so both flags are read back.
+            self.refresh_from_db(fields=["has_next_of_kin", "is_complete"])
 
+    def calculate_completion_score(self):
+        """
+        Calculate the share of completion fields that are filled in.
+        :return: Completion percentage between 0 and 100
+        """
+        filled = sum(1 for field in self.COMPLETION_FIELDS if getattr(self, field))
+        return filled * 100 // len(self.COMPLETION_FIELDS)
 
     def is_complete_with_next_of_kin(self):
         """
         Check if the profile is complete with next of kin.
         :return: True if complete, False otherwise
         """
-        required_fields = [
-            self.gender,
-            self.marital_status,
-            self.phone_number,
-            self.address,
-            self.date_of_birth,
-            self.identification_type,
-            self.country_of_birth,
-            self.place_of_birth,
-            self.id_issue_date,
-            self.id_expiry_date,
-            self.employment_status,
-            self.passport_number,
-            self.nationality,
-            self.city,
-            self.employer_name,
-            self.annual_income,
-            self.date_of_employment,
-            self.employer_address,
-            self.employer_city,
-            self.employer_state,
-            self.photo,
-            self.photo_url,
-            self.id_photo,
-            self.id_photo_url,
-            self.signature_photo,
-            self.signature_photo_url
-        ]
-        return  all(required_fields) and self.next_of_kin.exists()
+        return self.calculate_completion_score() == 100 and self.has_next_of_kin
+
+    # Set while a caller changes next of kin in bulk and refreshes the state once itself.
+    _next_of_kin_refresh_deferred = ContextVar("next_of_kin_refresh_deferred", default=False)
+
+    @classmethod
+    @contextmanager
+    def defer_next_of_kin_refresh(cls):
+        """
+        Skip the per-row refresh of the next of kin signals, e.g. around a bulk delete.
+        The caller must call ``refresh_next_of_kin_state`` afterwards.
+        """
+        token = cls._next_of_kin_refresh_deferred.set(True)
+        try:
+            yield
+        finally:
+            cls._next_of_kin_refresh_deferred.reset(token)
+
+    @classmethod
+    def next_of_kin_refresh_deferred(cls) -> bool:
+        return cls._next_of_kin_refresh_deferred.get()
+
+    @classmethod
+    def refresh_next_of_kin_state(cls, *profile_ids):
+        """
+        Recompute ``has_next_of_kin`` and ``is_complete`` in the database with one UPDATE.
+        :param profile_ids: The profiles to refresh.
+        :return: None
+        """
+        has_next_of_kin = Exists(NextOfKin.objects.filter(profile_id=OuterRef("pk")))
+        cls.objects.filter(pk__in=profile_ids).update(
+            has_next_of_kin=has_next_of_kin,
+            is_complete=ExpressionWrapper(Q(completion_score=100) & Q(has_next_of_kin),
+                                          output_field=models.BooleanField()),
+        )
 
     def __str__(self):
         return f"{self.gender} {self.marital_status} {self.phone_number}"
 
 
 
-class NextOfKin(TimeStampedModel):
+class NextOfKin(DirtyFieldsMixin, TimeStampedModel):
     """
     Next of kin model.
     """
@@ -412,7 +640,7 @@ class NextOfKin(TimeStampedModel):
 
     def clean(self):
         super().clean()
-        if self.is_primary:
+        if self.is_primary and (self._state.adding or self.is_dirty("is_primary", "profile")):
             primary = NextOfKin.objects.filter(
                 profile=self.profile,
                 is_primary=True
@@ -424,15 +652,19 @@ class NextOfKin(TimeStampedModel):
     def save(self, *args, **kwargs):
         """
         Save the next of kin data.
+        Partial saves only validate the fields being written.
         :param args:
         :param kwargs:
         :return: None
         """
-        self.full_clean()
+        clean_for_save(self, kwargs.get("update_fields"))
         super().save(*args, **kwargs)
 
     def __str__(self):
-        return f"{self.first_name} - {self.last_name} - Next of kin for {self.profile.user.full_name}"
+        # The user is only named when already loaded, so listing next of kin costs no query per row.
+        if NextOfKin.profile.is_cached(self) and Profile.user.is_cached(self.profile):
+            return f"{self.first_name} - {self.last_name} - Next of kin for {self.profile.user.full_name}"
+        return f"{self.first_name} - {self.last_name} - Next of kin"
 
 
     class Meta:
@@ -442,4 +674,58 @@ class NextOfKin(TimeStampedModel):
                 name="unique_primary_next_of_kin",
                 condition=models.Q(is_primary=True)
             )
-        ]
\ No newline at end of file
+        ]
+
+
+class OTPChallenge(models.Model):
+    """
+    Pending OTP challenge used by the database OTP store.
+    """
+    key = models.CharField(_("Key"), max_length=254, unique=True)
+
+    code_hash = models.CharField(_("Code hash"), max_length=64)
+
+    expires_at = models.DateTimeField(_("Expires at"), db_index=True)
+
+    attempts = models.PositiveSmallIntegerField(_("Attempts"), default=0)
+
+    class Meta:
+        verbose_name = _("OTP challenge")
+        verbose_name_plural = _("OTP challenges")
+
+    def __str__(self):
+        return f"{self.key} - {self.expires_at}"
+
+
+class LoginFailureCounter(models.Model):
+    """
+    Failed login counter used by the database lockout engine.
+    """
+    key = models.CharField(_("Key"), max_length=300, unique=True)
+
+    count = models.PositiveIntegerField(_("Count"), default=0)
+
+    window_started_at = models.DateTimeField(_("Window started at"))
+
+    class Meta:
+        verbose_name = _("Login failure counter")
+        verbose_name_plural = _("Login failure counters")
+
+    def __str__(self):
+        return f"{self.key} - {self.count}"
+
+
+class UsernameCounter(models.Model):
+    """
+    Last reserved username number per prefix, used by the database username allocator.
+    """
+    prefix = models.CharField(_("Prefix"), max_length=12, unique=True)
+
+    next_value = models.PositiveBigIntegerField(_("Next value"), default=0)
+
+    class Meta:
+        verbose_name = _("Username counter")
+        verbose_name_plural = _("Username counters")
+
+    def __str__(self):
+        return f"{self.prefix} - {self.next_value}"
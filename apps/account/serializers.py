@@ -1,5 +1,15 @@
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django_countries.serializers import CountryFieldMixin
 from djoser.serializers import UserCreateSerializer as BaseUserCreateSerializer
+from rest_framework import serializers
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer as BaseTokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+
+from .models import NextOfKin, Profile
+from .tokens import check_refresh_token, rotate_refresh_token
 
 User = get_user_model()
 
@@ -19,3 +29,98 @@ class UserCreateSerializer(BaseUserCreateSerializer):
         Create a new user instance.
         """
         return User.objects.create_user(**validated_data)
+
+
+class TokenRefreshSerializer(BaseTokenRefreshSerializer):
+    """
+    Serializer for refreshing tokens without the token blacklist app.
+    """
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        user_id = refresh.payload.get(api_settings.USER_ID_CLAIM)
+        if user_id:
+            user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+            if user is None or not api_settings.USER_AUTHENTICATION_RULE(user):
+                raise AuthenticationFailed(self.error_messages["no_active_account"], "no_active_account")
+            check_refresh_token(refresh, user)
+        return rotate_refresh_token(refresh)
+
+
+class NextOfKinListSerializer(serializers.ListSerializer):
+    """
+    Replaces the whole next of kin list of a profile.
+    Items with an ``id`` update that contact, items without one are created, and contacts left out
+    are deleted. The instance is the current list, read once, so validation needs no further query
+    and the changes are written with a fixed number of bulk queries whatever the list size.
+    """
+
+    def validate(self, attrs):
+        existing = {kin.pk for kin in self.instance or ()}
+        ids = [item["id"] for item in attrs if item.get("id")]
+        if len(ids) != len(set(ids)):
+            raise serializers.ValidationError(_("A next of kin may only be listed once."))
+        if set(ids) - existing:
+            raise serializers.ValidationError(_("Unknown next of kin."))
+        if sum(1 for item in attrs if item["is_primary"]) > 1:
+            raise serializers.ValidationError(_("Only one next of kin can be marked as primary."))
+        return attrs
+
+    def update(self, instance, validated_data):
+        """
+        Apply the list. Callers run this in a transaction holding the profile row lock.
+        The primary contact is unset before any other write, so the partial unique constraint on
+        primaries holds after every statement.
+        :param instance: The current next of kin of the profile.
+        :param validated_data: The validated list.
+        :return: The next of kin in the order of the list
+        """
+        profile_id = self.context["profile_id"]
+        current = {kin.pk: kin for kin in instance}
+        fields = [name for name in self.child.Meta.fields if name != "id"]
+        now = timezone.now()
+        primary = next((item.get("id") for item in validated_data if item["is_primary"]), None)
+        # Read before the loop below changes the instances.
+        stale_primary = [kin.pk for kin in instance if kin.is_primary and kin.pk != primary]
+
+        result, created, updated = [], [], []
+        for item in validated_data:
+            kin = current.pop(item["id"], None) if item.get("id") else None
+            if kin is None:
+                kin = NextOfKin(profile_id=profile_id, **{k: v for k, v in item.items() if k != "id"})
+                created.append(kin)
+            elif any(getattr(kin, name) != item.get(name, getattr(kin, name)) for name in fields):
+                for name, value in item.items():
+                    setattr(kin, name, value)
+                kin.updated_at = now
+                updated.append(kin)
+            result.append(kin)
+
+        if stale_primary:
+            NextOfKin.objects.filter(pk__in=stale_primary).update(is_primary=False, updated_at=now)
+        if current:
+            # The state is refreshed once below instead of by the signal for every deleted row.
+            with Profile.defer_next_of_kin_refresh():
+                NextOfKin.objects.filter(pk__in=current).delete()
+        if updated:
+            NextOfKin.objects.bulk_update(updated, [*fields, "updated_at"])
+        if created:
+            NextOfKin.objects.bulk_create(created)
+        Profile.refresh_next_of_kin_state(profile_id)
+        return result
+
+
+class NextOfKinSerializer(CountryFieldMixin, serializers.ModelSerializer):
+    """
+    Serializer for a next of kin in the bulk next of kin API.
+    """
+    id = serializers.UUIDField(required=False)
+    # Always part of the item, so the list alone says which contact is primary.
+    is_primary = serializers.BooleanField(default=False)
+
+    class Meta:
+        model = NextOfKin
+        fields = ["id", "title", "first_name", "last_name", "other_name", "date_of_birth", "gender",
+                  "email_address", "relationship", "phone_number", "address", "city", "state", "country",
+                  "is_primary"]
+        list_serializer_class = NextOfKinListSerializer
@@ -1,8 +1,8 @@
 from django.contrib.auth import get_user_model
-from django.db.models.signals import post_save
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
 
-from apps.account.models import Profile
+from apps.account.models import NextOfKin, Profile
 
 
 User = get_user_model()
@@ -22,11 +22,47 @@ def create_user_profile(sender, instance, created, **kwargs):
 
 
 @receiver(post_save, sender=User)
-def save_user_profile(sender, instance, **kwargs):
+def save_user_profile(sender, instance, created, **kwargs):
     """
     Signal to save the user profile when the user is saved.
+    Only a profile already loaded on the user can hold unsaved changes, and only its
+    changed fields are written, so saves such as lockout bookkeeping cost no profile query.
+    :param sender: The model class.
+    :param instance: The instance of the model.
+    :param created: Boolean indicating if the instance was created.
+    :param kwargs: Additional keyword arguments.
+    """
+    if created or not User.profile.is_cached(instance):
+        return
+    profile = instance.profile
+    dirty_fields = profile.get_dirty_fields()
+    if dirty_fields:
+        profile.save(update_fields=[*dirty_fields, "updated_at"])
+
+
+
+@receiver(post_save, sender=NextOfKin)
+def next_of_kin_saved(sender, instance, created, **kwargs):
+    """
+    Signal to keep the profile completion state in sync when a next of kin is added or moved.
+    :param sender: The model class.
+    :param instance: The instance of the model.
+    :param created: Boolean indicating if the instance was created.
+    :param kwargs: Additional keyword arguments.
+    """
+    if created:
+        Profile.refresh_next_of_kin_state(instance.profile_id)
+    elif instance.is_dirty("profile"):
+        Profile.refresh_next_of_kin_state(instance.profile_id, instance.get_dirty_fields()["profile"])
+
+
+@receiver(post_delete, sender=NextOfKin)
+def next_of_kin_deleted(sender, instance, **kwargs):
+    """
+    Signal to keep the profile completion state in sync when a next of kin is removed.
     :param sender: The model class.
     :param instance: The instance of the model.
     :param kwargs: Additional keyword arguments.
     """
-    instance.profile.save()
\ No newline at end of file
+    if not Profile.next_of_kin_refresh_deferred():
+        Profile.refresh_next_of_kin_state(instance.profile_id)
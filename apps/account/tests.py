@@ -1,3 +1,1027 @@
-from django.test import TestCase
+import io
+import json
+import multiprocessing
+import os
+import re
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib import admin
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.core.files.storage import storages
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.db.models.signals import post_save
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.template.loader import render_to_string
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import strip_tags
+from PIL import Image
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+
+from .async_views import AsyncOTPVerifyView
+from .hashers import TunedArgon2PasswordHasher
+from .helpers import usernames
+from .helpers.emails import build_account_locked_email, build_emails, build_otp_email, mail_sender, send_email_batch
+from .helpers.hashing import HashingService
+from .helpers.images import StorageImagePublisher, accept_upload, get_image_publisher, process_profile_image
+from .helpers.lockout import CacheLockoutEngine, DatabaseLockoutEngine
+from .helpers.otp import DatabaseOTPStore, InMemoryOTPStore
+from .helpers.ratelimit import InMemoryRateLimiter, get_rate_limiter
+from .helpers.revocation import get_revocation_store
+from .management.commands import benchmark_auth_flow, import_customers, startup_profile
+from .models import LoginFailureCounter, NextOfKin, Profile
+from .throttling import ScopedGCRAThrottle
+from .tokens import AccountRefreshToken, ClaimsUser
+from .utils import get_client_ip
+
+User = get_user_model()
+
+test_settings = override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    OTP_CHALLENGE_STORE="apps.account.helpers.otp.InMemoryOTPStore",
+    LOGIN_LOCKOUT_ENGINE="apps.account.helpers.lockout.CacheLockoutEngine",
+    TOKEN_REVOCATION_STORE="apps.account.helpers.revocation.InMemoryRevocationStore",
+    THROTTLE_RATE_LIMITER="apps.account.helpers.ratelimit.InMemoryRateLimiter",
+    BANK_NAME="Next Gen Bank",
+)
+
+
+def create_user(email="jane@example.com", id_no=1, **extra_fields):
+    return User.objects.create_user(
+        email=email,
+        password="Str0ng-Passw0rd",
+        first_name="Jane",
+        last_name="Doe",
+        id_no=id_no,
+        security_question=User.SecurityQuestion.PET_NAME,
+        security_answer="rex",
+        **extra_fields,
+    )
+
+
+@test_settings
+class LockoutEngineConcurrencyTests(TransactionTestCase):
+    """
+    Parallel failures against the same account must never lose an increment.
+    """
+    parallel_failures = 100
+
+    def setUp(self):
+        cache.clear()
+        self.user = create_user()
+
+    def fail_in_parallel(self, engine_path):
+        def fail(_):
+            try:
+                user = User.objects.get(pk=self.user.pk)
+                return user.handle_failed_login_attempt("10.0.0.1")
+            finally:
+                connection.close()
+
+        with override_settings(LOGIN_LOCKOUT_ENGINE=engine_path), \
+                mock.patch("apps.account.models.send_account_locked_email") as locked_email:
+            with ThreadPoolExecutor(max_workers=16) as pool:
+                results = list(pool.map(fail, range(self.parallel_failures)))
+        return results, locked_email
+
+    @override_settings(LOGIN_ATTEMPTS_LIMIT=1000, LOGIN_IP_ATTEMPTS_LIMIT=1000)
+    def test_cache_engine_counts_every_failure(self):
+        results, _ = self.fail_in_parallel("apps.account.helpers.lockout.CacheLockoutEngine")
+        self.assertFalse(any(results))
+        engine = CacheLockoutEngine()
+        self.assertEqual(engine.failures(self.user.email), self.parallel_failures)
+        self.assertEqual(engine.get(engine.ip_key("10.0.0.1")), self.parallel_failures)
+
+    @override_settings(LOGIN_ATTEMPTS_LIMIT=1000, LOGIN_IP_ATTEMPTS_LIMIT=1000)
+    def test_database_engine_counts_every_failure(self):
+        results, _ = self.fail_in_parallel("apps.account.helpers.lockout.DatabaseLockoutEngine")
+        self.assertFalse(any(results))
+        self.assertEqual(DatabaseLockoutEngine().failures(self.user.email), self.parallel_failures)
+
+    @override_settings(LOGIN_ATTEMPTS_LIMIT=1000, LOGIN_IP_ATTEMPTS_LIMIT=1000)
+    def test_database_engine_restarts_an_expired_window_once(self):
+        engine = DatabaseLockoutEngine()
+        expired = timezone.now() - engine.window - timedelta(minutes=1)
+        for key in (engine.email_key(self.user.email), engine.ip_key("10.0.0.1")):
+            LoginFailureCounter.objects.create(key=key, count=50, window_started_at=expired)
+        self.fail_in_parallel("apps.account.helpers.lockout.DatabaseLockoutEngine")
+        self.assertEqual(engine.failures(self.user.email), self.parallel_failures)
+        self.assertEqual(engine.get(engine.ip_key("10.0.0.1")), self.parallel_failures)
+
+    @override_settings(LOGIN_ATTEMPTS_LIMIT=3, LOGIN_IP_ATTEMPTS_LIMIT=1000)
+    def test_account_is_locked_once(self):
+        results, locked_email = self.fail_in_parallel("apps.account.helpers.lockout.CacheLockoutEngine")
+        self.assertEqual(sum(results), self.parallel_failures - 2)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.account_status, User.AccountStatus.LOCKED)
+        self.assertEqual(self.user.token_version, 1)
+        locked_email.delay.assert_called_once()
+
+
+def legacy_save_user_profile(sender, instance, **kwargs):
+    """
+    The profile sync receiver as it was before dirty-field tracking.
+    """
+    instance.profile.save()
+
+
+@test_settings
+class LoginFlowQueryCountTests(TestCase):
+    """
+    Query-count benchmark of the login -> verify OTP flow.
+    """
+
+    def setUp(self):
+        cache.clear()
+        get_rate_limiter().clear()
+        self.user = create_user()
+
+    def login_and_verify(self):
+        """
+        Run the flow and return the executed SQL for both requests.
+        """
+        with mock.patch("apps.account.views.send_otp_email") as otp_email:
+            with CaptureQueriesContext(connection) as login_queries:
+                response = self.client.post(
+                    reverse("login"), {"email": self.user.email, "password": "Str0ng-Passw0rd"}
+                )
+            self.assertEqual(response.status_code, 200)
+        otp = otp_email.delay.call_args.args[1]
+        with CaptureQueriesContext(connection) as verify_queries:
+            response = self.client.post(reverse("verify_otp"), {"email": self.user.email, "otp": otp})
+        self.assertEqual(response.status_code, 200)
+        return [query["sql"] for query in login_queries], [query["sql"] for query in verify_queries]
+
+    def test_flow_never_writes_profile(self):
+        login_sql, verify_sql = self.login_and_verify()
+        for sql in login_sql + verify_sql:
+            self.assertNotIn("account_profile", sql)
+            self.assertFalse(sql.startswith("UPDATE"), sql)
+        self.assertLessEqual(len(login_sql), 1)
+        self.assertLessEqual(len(verify_sql), 1)
+
+    def test_flow_after_failed_attempts(self):
+        self.client.post(reverse("login"), {"email": self.user.email, "password": "wrong"})
+        login_sql, verify_sql = self.login_and_verify()
+        self.assertFalse(any("account_profile" in sql for sql in login_sql + verify_sql))
+
+    def test_fewer_queries_than_legacy_profile_sync(self):
+        post_save.connect(legacy_save_user_profile, sender=User, dispatch_uid="legacy_save_user_profile")
+        try:
+            # The old login flow saved the user several times, and each save re-saved the full profile.
+            with CaptureQueriesContext(connection) as legacy_queries:
+                self.user.save(update_fields=["failed_login_attempts"])
+        finally:
+            post_save.disconnect(sender=User, dispatch_uid="legacy_save_user_profile")
+        with CaptureQueriesContext(connection) as queries:
+            self.user.save(update_fields=["failed_login_attempts"])
+        self.assertLess(len(queries), len(legacy_queries))
+        self.assertEqual(len(queries), 1)
+
+
+def create_users_in_process(worker, count):
+    """
+    Sign up users from a separate process and return their usernames.
+    """
+    connections.close_all()
+    try:
+        return [
+            create_user(email=f"worker{worker}-{index}@example.com", id_no=worker * 1000 + index + 1).username
+            for index in range(count)
+        ]
+    finally:
+        connections.close_all()
+
+
+class OTPStoreTests(TestCase):
+    """
+    Challenges are keyed by the normalized email address, whatever case the client sends.
+    """
+
+    def test_key_case_and_spaces_are_ignored(self):
+        for store in (InMemoryOTPStore(), DatabaseOTPStore()):
+            store.issue("Jane.Doe@Example.com", "123456")
+            self.assertTrue(store.verify(" jane.doe@example.COM ", "123456"), type(store).__name__)
+            store.issue("jane.doe@example.com", "654321")
+            store.discard("JANE.DOE@EXAMPLE.COM")
+            self.assertFalse(store.verify("jane.doe@example.com", "654321"), type(store).__name__)
+
+
+@test_settings
+class AsyncAuthViewTests(TestCase):
+    """
+    The async views answer bodies they cannot read the way the DRF views do.
+    """
+
+    def setUp(self):
+        get_rate_limiter().clear()
+
+    def test_malformed_bodies_are_rejected(self):
+        view = AsyncOTPVerifyView.as_view()
+        for body in ("[]", '"jane@example.com"', "null", "{", b"\xff"):
+            request = RequestFactory().post("/", body, content_type="application/json")
+            response = async_to_sync(view)(request)
+            self.assertEqual(response.status_code, 400, body)
+            self.assertEqual(json.loads(response.content), {"detail": "Malformed request body."})
+
+
+class RateLimiterTests(SimpleTestCase):
+    """
+    A client may burst up to the rate and is then paced at one request per interval.
+    """
+
+    def setUp(self):
+        self.limiter = InMemoryRateLimiter()
+        self.now = 1000.0
+        clock = mock.patch("apps.account.helpers.ratelimit.time.monotonic", side_effect=lambda: self.now)
+        clock.start()
+        self.addCleanup(clock.stop)
+
+    def test_burst_then_pacing(self):
+        self.assertEqual([self.limiter.hit("login", "k", 10, 60) for _ in range(10)], [None] * 10)
+        self.assertAlmostEqual(self.limiter.hit("login", "k", 10, 60), 6)
+        self.now += 4
+        self.assertAlmostEqual(self.limiter.hit("login", "k", 10, 60), 2)
+        self.now += 2
+        self.assertIsNone(self.limiter.hit("login", "k", 10, 60))
+        self.assertAlmostEqual(self.limiter.hit("login", "k", 10, 60), 6)
+        # A quiet client gets its whole burst back.
+        self.now += 60
+        self.assertEqual([self.limiter.hit("login", "k", 10, 60) for _ in range(10)], [None] * 10)
+        self.assertIsNotNone(self.limiter.hit("login", "k", 10, 60))
+
+    def test_refused_keys_skip_the_store(self):
+        for _ in range(2):
+            self.limiter.hit("register", "k", 2, 3600)
+        with mock.patch.object(self.limiter, "acquire", wraps=self.limiter.acquire) as acquire:
+            self.assertAlmostEqual(self.limiter.hit("register", "k", 2, 3600), 1800)
+            self.now += 1000
+            self.assertAlmostEqual(self.limiter.hit("register", "k", 2, 3600), 800)
+            self.assertEqual(acquire.call_count, 1)
+            self.assertIsNone(self.limiter.hit("register", "other", 2, 3600))
+            self.now += 800
+            self.assertIsNone(self.limiter.hit("register", "k", 2, 3600))
+            self.assertEqual(acquire.call_count, 3)
+
+    def test_denied_cache_is_bounded(self):
+        limiter = InMemoryRateLimiter(max_denied=2)
+        for ident in ("a", "b", "c"):
+            limiter.hit("login", ident, 1, 60)
+            limiter.hit("login", ident, 1, 60)
+        self.assertEqual(len(limiter._denied), 2)
+
+
+@test_settings
+class ThrottleTests(TestCase):
+    """
+    The scoped throttles apply the rate of each scope per client IP address and email address.
+    """
+
+    def setUp(self):
+        get_rate_limiter().clear()
+
+    @staticmethod
+    def request(email=None, ip_address="10.0.0.1"):
+        data = {"email": email} if email else {}
+        request = RequestFactory().post("/", data, content_type="application/json", REMOTE_ADDR=ip_address)
+        return Request(request, parsers=[JSONParser()])
+
+    @staticmethod
+    def allowed(view, request, attempts=20):
+        return sum(ScopedGCRAThrottle().allow_request(request, view) for _ in range(attempts))
+
+    def test_scope_rates(self):
+        login = SimpleNamespace(throttle_scope="login", throttle_key_fields=("email",))
+        verify_otp = SimpleNamespace(throttle_scope="verify_otp", throttle_key_fields=("email",))
+        register = SimpleNamespace(throttle_scope={"create": "register"}, action="create")
+        self.assertEqual(self.allowed(login, self.request("jane@example.com")), 10)
+        self.assertEqual(self.allowed(verify_otp, self.request("jane@example.com")), 10)
+        self.assertEqual(self.allowed(register, self.request()), 5)
+        self.assertEqual(self.allowed(SimpleNamespace(throttle_scope={"create": "register"}, action="list"),
+                                      self.request()), 20)
+
+    def test_ip_and_email_have_their_own_buckets(self):
+        login = SimpleNamespace(throttle_scope="login", throttle_key_fields=("email",))
+        self.assertEqual(self.allowed(login, self.request("jane@example.com")), 10)
+        self.assertEqual(self.allowed(login, self.request(" JANE@example.com")), 0)
+        self.assertEqual(self.allowed(login, self.request("john@example.com")), 10)
+        self.assertEqual(self.allowed(login, self.request("jane@example.com", ip_address="10.0.0.2")), 10)
+
+    @override_settings(LOGIN_ATTEMPTS_LIMIT=1000, LOGIN_IP_ATTEMPTS_LIMIT=1000)
+    def test_retry_after(self):
+        for _ in range(10):
+            response = self.client.post(reverse("login"), {"email": "nobody@example.com", "password": "wrong"})
+            self.assertNotEqual(response.status_code, 429)
+        response = self.client.post(reverse("login"), {"email": "nobody@example.com", "password": "wrong"})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "6")
+
+
+class ClientIpTests(SimpleTestCase):
+    """
+    Forwarded addresses are only trusted up to the configured number of proxies.
+    """
+
+    def request(self, forwarded_for):
+        return RequestFactory().get("/", HTTP_X_FORWARDED_FOR=forwarded_for, REMOTE_ADDR="10.0.0.1")
+
+    def test_header_ignored_without_trusted_proxies(self):
+        with override_settings(TRUSTED_PROXY_COUNT=0):
+            self.assertEqual(get_client_ip(self.request("203.0.113.9")), "10.0.0.1")
+
+    def test_forged_entries_are_skipped(self):
+        with override_settings(TRUSTED_PROXY_COUNT=1):
+            self.assertEqual(get_client_ip(self.request("198.51.100.1, 203.0.113.9")), "203.0.113.9")
+        with override_settings(TRUSTED_PROXY_COUNT=2):
+            self.assertEqual(get_client_ip(self.request("198.51.100.1, 203.0.113.9, 10.0.0.2")), "203.0.113.9")
+            self.assertEqual(get_client_ip(self.request("203.0.113.9")), "203.0.113.9")
+
+
+@test_settings
+@override_settings(USERNAME_BLOCK_SIZE=5)
+class UsernameAllocatorTests(TransactionTestCase):
+    """
+    Usernames must stay unique when many processes sign users up at once.
+    """
+    processes = 8
+    users_per_process = 30
+
+    def setUp(self):
+        usernames._allocators.clear()
+
+    def test_username_format(self):
+        self.assertRegex(create_user().username, r"^NGB-[0-9A-Z]{8}$")
+
+    def test_usernames_are_not_sequential(self):
+        allocator = usernames.get_username_allocator()
+        first, second = allocator.allocate(), allocator.allocate()
+        self.assertNotEqual(first[:-1], second[:-1])
+
+    def test_concurrent_signups_never_collide(self):
+        # Allocate in the parent first, so every child inherits a block it must not reuse.
+        create_user()
+        connections.close_all()
+        with ProcessPoolExecutor(self.processes, mp_context=multiprocessing.get_context("fork")) as pool:
+            results = pool.map(create_users_in_process, range(1, self.processes + 1),
+                               [self.users_per_process] * self.processes)
+            allocated = [username for result in results for username in result]
+        self.assertEqual(len(allocated), self.processes * self.users_per_process)
+        self.assertEqual(len(set(allocated)), len(allocated))
+        self.assertEqual(User.objects.count(), len(allocated) + 1)
+        self.assertTrue(all(re.match(r"^NGB-[0-9A-Z]{8}$", username) for username in allocated))
+
+
+@test_settings
+@mock.patch.object(Profile, "COMPLETION_FIELDS", ("address", "city"))
+class ProfileCompletionTests(TestCase):
+    """
+    The completion score and flags stored on the profile follow profile saves and next of kin changes.
+    """
+
+    def setUp(self):
+        self.profile = create_user().profile
+
+    @staticmethod
+    def stored(profile):
+        return Profile.objects.values_list("completion_score", "has_next_of_kin", "is_complete").get(pk=profile.pk)
+
+    def add_next_of_kin(self, profile):
+        return NextOfKin.objects.create(profile=profile, first_name="John", last_name="Doe", other_name="K",
+                                        gender="Male", relationship="Sibling")
+
+    def test_score_and_flags_follow_saves(self):
+        self.profile.address = "1 Main Street"
+        self.profile.save()
+        self.assertEqual(self.stored(self.profile), (50, False, False))
+
+        self.add_next_of_kin(self.profile)
+        self.assertEqual(self.stored(self.profile), (50, True, False))
+        self.profile.city = "Nairobi"
+        self.profile.save(update_fields=["city"])
+        self.assertEqual(self.stored(self.profile), (100, True, True))
+        self.assertEqual((self.profile.completion_score, self.profile.has_next_of_kin, self.profile.is_complete),
+                         (100, True, True))
+
+        # Fields outside the score leave it alone, and a stale instance never clears the flags.
+        self.profile.has_next_of_kin = self.profile.is_complete = False
+        self.profile.place_of_birth = "Mombasa"
+        self.profile.save(update_fields=["place_of_birth"])
+        self.assertEqual(self.stored(self.profile), (100, True, True))
+
+    def test_next_of_kin_create_and_delete(self):
+        self.profile.address, self.profile.city = "1 Main Street", "Nairobi"
+        self.profile.save()
+        first, second = self.add_next_of_kin(self.profile), self.add_next_of_kin(self.profile)
+        self.assertEqual(self.stored(self.profile), (100, True, True))
+        first.delete()
+        self.assertEqual(self.stored(self.profile), (100, True, True))
+        second.delete()
+        self.assertEqual(self.stored(self.profile), (100, False, False))
+
+    def test_backfill(self):
+        other = create_user(email="john@example.com", id_no=2).profile
+        self.profile.address, self.profile.city = "1 Main Street", "Nairobi"
+        self.profile.save()
+        self.add_next_of_kin(self.profile)
+        Profile.objects.update(completion_score=0, has_next_of_kin=False, is_complete=True)
+        stdout = io.StringIO()
+        call_command("backfill_profile_completion", "--chunk-size", "1", stdout=stdout)
+        self.assertIn("Backfilled 2 of 2 profiles", stdout.getvalue())
+        self.assertEqual(self.stored(self.profile), (100, True, True))
+        self.assertEqual(self.stored(other), (0, False, False))
+
+
+@test_settings
+@override_settings(
+    PASSWORD_HASHERS=["apps.account.hashers.TunedArgon2PasswordHasher",
+                      "django.contrib.auth.hashers.MD5PasswordHasher"],
+    ARGON2_PARAMETERS={"time_cost": 1, "memory_cost": 1024, "parallelism": 1},
+)
+class PasswordHashingTests(TestCase):
+    """
+    Passwords and security answers are hashed on the pool, and outdated hashes are upgraded on login.
+    """
+
+    def setUp(self):
+        self.service = HashingService(max_workers=2)
+
+    def test_make_and_check(self):
+        encoded = self.service.make_password("Str0ng-Passw0rd")
+        self.assertTrue(encoded.startswith("argon2$"))
+        setter = mock.Mock()
+        self.assertTrue(self.service.check_password("Str0ng-Passw0rd", encoded, setter))
+        self.assertFalse(self.service.check_password("wrong", encoded, setter))
+        setter.assert_not_called()
+
+        # An MD5 hash is correct but outdated, so the setter rehashes it; a wrong password never is.
+        md5 = make_password("Str0ng-Passw0rd", hasher="md5")
+        self.assertFalse(self.service.check_password("wrong", md5, setter))
+        setter.assert_not_called()
+        self.assertTrue(self.service.check_password("Str0ng-Passw0rd", md5, setter))
+        setter.assert_called_once_with("Str0ng-Passw0rd")
+
+    def test_async_make_and_check(self):
+        async def run():
+            encoded = await self.service.amake_password("Str0ng-Passw0rd")
+            setter = mock.AsyncMock()
+            checks = [await self.service.acheck_password("Str0ng-Passw0rd", encoded, setter),
+                      await self.service.acheck_password("wrong", encoded, setter)]
+            setter.assert_not_awaited()
+            checks.append(await self.service.acheck_password(
+                "Str0ng-Passw0rd", make_password("Str0ng-Passw0rd", hasher="md5"), setter))
+            setter.assert_awaited_once_with("Str0ng-Passw0rd")
+            return checks
+
+        self.assertEqual(async_to_sync(run)(), [True, False, True])
+
+    def test_pool_is_rebuilt_after_fork(self):
+        executor = self.service.executor
+        self.assertIs(self.service.executor, executor)
+        with mock.patch("apps.account.helpers.hashing.os.getpid", return_value=-1):
+            self.assertIsNot(self.service.executor, executor)
+
+    def test_tuned_argon2_parameters_are_upgraded_on_login(self):
+        user = create_user()
+        hasher = TunedArgon2PasswordHasher()
+        self.assertEqual(hasher.decode(user.password)["memory_cost"], 1024)
+        with override_settings(ARGON2_PARAMETERS={"time_cost": 2, "memory_cost": 2048, "parallelism": 1}):
+            self.assertTrue(hasher.must_update(user.password))
+            self.assertTrue(user.check_password("Str0ng-Passw0rd"))
+            user.refresh_from_db()
+            self.assertEqual({key: hasher.decode(user.password)[key] for key in ("time_cost", "memory_cost")},
+                             {"time_cost": 2, "memory_cost": 2048})
+            self.assertFalse(hasher.must_update(user.password))
+
+        async def check():
+            return await user.acheck_password("Str0ng-Passw0rd")
+
+        self.assertTrue(async_to_sync(check)())
+        user.refresh_from_db()
+        self.assertEqual(hasher.decode(user.password)["memory_cost"], 1024)
+
+    def test_security_answer_is_hashed(self):
+        user = create_user()
+        self.assertTrue(user.security_answer.startswith("argon2$"))
+        user.refresh_from_db()
+        self.assertTrue(user.check_security_answer("rex"))
+        self.assertFalse(user.check_security_answer("tom"))
+
+        async def check(answer):
+            return await user.acheck_security_answer(answer)
+
+        self.assertTrue(async_to_sync(check)("rex"))
+
+    def test_calibrate_hashers(self):
+        stdout = io.StringIO()
+        call_command("calibrate_hashers", "--target-ms", "10000", "--samples", "1", "--memory-costs", "1024",
+                     "--max-time-cost", "2", "--parallelism", "1", stdout=stdout)
+        output = stdout.getvalue()
+        self.assertIn("argon2", output)
+        self.assertIn("ARGON2_TIME_COST=2\nARGON2_MEMORY_COST=1024\nARGON2_PARALLELISM=1", output)
+        self.assertIn("hashes/s", output)
+
+
+@test_settings
+class ImportCustomersTests(TestCase):
+    """
+    Customers are imported in batches with their profile and next of kin, bad rows are rejected
+    one by one and an interrupted import resumes after the last committed batch.
+    """
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, "customers.jsonl")
+
+    @staticmethod
+    def customer(number, **fields):
+        return {
+            "email": f"customer{number}@example.com", "password": "Str0ng-Passw0rd", "first_name": "Jane",
+            "last_name": "Doe", "id_no": 1000 + number, "security_question": User.SecurityQuestion.PET_NAME,
+            "security_answer": "rex", "profile": {"place_of_birth": "Nairobi"},
+            "next_of_kin": {"first_name": "John", "last_name": "Doe", "other_name": "K", "gender": "Male",
+                            "relationship": "Sibling", "is_primary": True},
+            **fields,
+        }
+
+    def write(self, *records):
+        with open(self.path, "a") as file:
+            for record in records:
+                file.write(json.dumps(record) + "\n")
+
+    def run_import(self, *args):
+        stdout = io.StringIO()
+        call_command("import_customers", self.path, "--batch-size", "2", "--workers", "2", *args, stdout=stdout)
+        return stdout.getvalue()
+
+    def checkpoint(self):
+        with open(f"{self.path}.checkpoint") as file:
+            return json.load(file)
+
+    def test_batches_and_rejected_rows(self):
+        create_user(email="customer1@example.com", id_no=1)
+        self.write(
+            self.customer(0, password=12345),
+            self.customer(1),
+            self.customer(2, password=["not", "a", "password"]),
+            self.customer(3, security_answer=""),
+            self.customer(4),
+            self.customer(5, email="customer4@example.com"),
+        )
+        output = self.run_import()
+        self.assertIn("Committed up to record 2", output)
+        self.assertIn("Imported 2, skipped 1 existing, rejected 3 invalid", output)
+        self.assertEqual(self.checkpoint()["records"], 6)
+
+        user = User.objects.get(email="customer0@example.com")
+        self.assertTrue(user.check_password("12345"))
+        self.assertNotEqual(user.security_answer, "rex")
+        profile = Profile.objects.get(user=user)
+        self.assertEqual(profile.place_of_birth, "Nairobi")
+        self.assertTrue(profile.has_next_of_kin)
+        self.assertEqual(profile.completion_score, profile.calculate_completion_score())
+        self.assertEqual(list(NextOfKin.objects.filter(profile=profile).values_list("first_name", "is_primary")),
+                         [("John", True)])
+        self.assertFalse(User.objects.filter(email__in=["customer2@example.com", "customer3@example.com"]).exists())
+
+    def test_failed_hash_rejects_the_row(self):
+        self.assertIsNone(import_customers.hash_credentials((object(), "rex")))
+        self.write(self.customer(0), self.customer(1))
+        hash_credentials = import_customers.hash_credentials
+
+        def hash_or_fail(credentials):
+            return None if credentials[0] == "fail" else hash_credentials(credentials)
+
+        self.write(self.customer(2, password="fail"))
+        with mock.patch.object(import_customers, "hash_credentials", hash_or_fail), \
+                mock.patch.object(import_customers, "ProcessPoolExecutor", ThreadPoolExecutor):
+            output = self.run_import()
+        self.assertIn("Imported 2, skipped 0 existing, rejected 1 invalid", output)
+        self.assertFalse(User.objects.filter(email="customer2@example.com").exists())
+
+    def test_resume_counts_every_row_once(self):
+        self.write(self.customer(0), self.customer(1), self.customer(2, first_name=""), self.customer(3))
+        write_batch, calls = import_customers.Command.write_batch, []
+
+        def crash_after_first_batch(command, *args):
+            if calls:
+                raise RuntimeError("interrupted")
+            calls.append(args)
+            return write_batch(command, *args)
+
+        with mock.patch.object(import_customers.Command, "write_batch", crash_after_first_batch), \
+                self.assertRaises(RuntimeError):
+            self.run_import()
+        self.assertEqual(self.checkpoint()["records"], 2)
+        self.assertEqual(self.checkpoint()["rejected"], 0)
+
+        self.write(self.customer(4))
+        output = self.run_import()
+        self.assertIn("Resuming after record 2", output)
+        self.assertIn("Imported 4, skipped 0 existing, rejected 1 invalid", output)
+        self.assertEqual(User.objects.filter(email__startswith="customer").count(), 4)
+
+
+@test_settings
+class AuthFlowBudgetTests(TransactionTestCase):
+    """
+    The login, OTP verification, refresh and logout endpoints may not need more queries than
+    recorded in the auth flow baseline, see ``manage.py benchmark_auth_flow``.
+    """
+
+    def test_flow_stays_within_query_budget(self):
+        with benchmark_auth_flow.benchmark_environment():
+            emails = benchmark_auth_flow.create_clients(2)
+            samples, elapsed = benchmark_auth_flow.run_clients(emails, rounds=2)
+        summary = benchmark_auth_flow.summarize(samples, elapsed, flows=4)
+        baseline = json.loads(benchmark_auth_flow.DEFAULT_BASELINE.read_text())
+        self.assertEqual(benchmark_auth_flow.check_budget(summary, baseline), [])
+
+
+class ClaimsUserTests(TestCase):
+    """
+    A user built from token claims answers from the claims without a query and from the user row otherwise.
+    """
+
+    def setUp(self):
+        self.user = create_user(is_staff=True)
+        self.claims_user = ClaimsUser(AccountRefreshToken.for_user(self.user).access_token)
+
+    def test_claims_need_no_query(self):
+        with self.assertNumQueries(0):
+            self.assertEqual((self.claims_user.pk, self.claims_user.email), (str(self.user.pk), self.user.email))
+            self.assertTrue(self.claims_user.has_role(User.RoleChoices.CUSTOMER))
+            self.assertEqual(self.claims_user, self.user)
+
+    def test_staff_and_permissions_come_from_the_user(self):
+        self.assertTrue(self.claims_user.is_staff)
+        self.assertFalse(self.claims_user.is_superuser)
+        self.assertFalse(self.claims_user.has_perm("account.change_user"))
+        self.user.is_superuser = True
+        self.user.save(update_fields=["is_superuser"])
+        claims_user = ClaimsUser(AccountRefreshToken.for_user(self.user).access_token)
+        self.assertTrue(claims_user.has_perm("account.change_user"))
+        self.assertTrue(claims_user.has_module_perms("account"))
+
+    def test_save_writes_the_user(self):
+        self.claims_user.first_name = "Janet"
+        self.claims_user.save(update_fields=["first_name"])
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.first_name, "Janet")
+        self.assertTrue(self.claims_user.check_password("Str0ng-Passw0rd"))
+
+
+class StartupTests(TestCase):
+    """
+    Importing the settings and setting Django up stay free of work that only some processes need.
+    """
+
+    def test_setup_defers_optional_imports(self):
+        code = ("import sys; from django.conf import settings; settings.INSTALLED_APPS; "
+                "settings_only = 'cloudinary' in sys.modules; import django; django.setup(); "
+                "print(settings_only, *(module in sys.modules for module in ('djoser.views', 'rest_framework.pagination')))")
+        env = {**os.environ, "DJANGO_SETTINGS_MODULE": settings.SETTINGS_MODULE}
+        result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                cwd=settings.BASE_DIR, env=env)
+        self.assertEqual(result.stdout.split(), ["False", "False", "False"])
+
+    def test_parse_importtime(self):
+        output = ("import time: self [us] | cumulative | imported package\n"
+                  "import time:       120 |        120 |     django.utils\n"
+                  "import time:      1500 |       1620 |   django\n")
+        self.assertEqual(startup_profile.parse_importtime(output),
+                         [("django.utils", 120, 120, 2), ("django", 1500, 1620, 1)])
+
+
+class CompiledEmailTests(TestCase):
+    """
+    Compiled email templates produce the same bodies as rendering and stripping the template per message.
+    """
+
+    def test_bodies_match_per_message_rendering(self):
+        full_name = "Jo <b>& 'Doe'"
+        message = build_account_locked_email("jo@example.com", full_name)
+        html = render_to_string("emails/account_locked.html", {
+            "full_name": full_name,
+            "site_name": settings.SITE_NAME,
+            "login_attempts_limit": settings.LOGIN_ATTEMPTS_LIMIT,
+            "lockout_duration": int(settings.LOCKOUT_DURATION.total_seconds() // 60),
+        })
+        self.assertEqual(message.alternatives[0][0], html)
+        self.assertEqual(message.body, strip_tags(html))
+        self.assertEqual((message.subject, message.to), ("Account Locked", ["jo@example.com"]))
+
+    def test_batch_and_settings_changes(self):
+        messages = build_emails("otp", [{"email": f"user{i}@example.com", "otp": f"00000{i}"} for i in range(3)])
+        self.assertEqual([message.to for message in messages], [[f"user{i}@example.com"] for i in range(3)])
+        self.assertIn("000002", messages[2].body)
+        with override_settings(SITE_NAME="Renamed Bank"):
+            self.assertIn("The Renamed Bank Team", build_otp_email("a@example.com", "123456").body)
+        self.assertNotIn("Renamed Bank", build_otp_email("a@example.com", "123456").body)
+
+
+class EmailBatchTests(TestCase):
+    """
+    A dropped connection retries only the messages of the batch that were not sent.
+    """
+
+    def test_retry_skips_sent_messages(self):
+        payloads = [{"kind": "otp", "kwargs": {"email": f"user{i}@example.com", "otp": f"00000{i}"}} for i in range(4)]
+        payloads.insert(2, {"kind": "otp", "kwargs": {"email": "broken@example.com"}})
+        delivered, failures = [], [SMTPServerDisconnected("gone")]
+
+        def send_messages(messages):
+            if len(delivered) == 2 and failures:
+                raise failures.pop()
+            delivered.extend(message.to[0] for message in messages)
+            return len(messages)
+
+        with mock.patch.object(mail_sender, "send_messages", side_effect=send_messages):
+            send_email_batch.apply(args=[payloads])
+        self.assertEqual(delivered, [f"user{i}@example.com" for i in range(4)])
+
+    def test_refused_recipient_is_skipped(self):
+        payloads = [{"kind": "otp", "kwargs": {"email": f"user{i}@example.com", "otp": f"00000{i}"}} for i in range(4)]
+        delivered = []
+
+        def send_messages(messages):
+            recipient = messages[0].to[0]
+            if recipient == "user1@example.com":
+                raise SMTPRecipientsRefused({recipient: (550, b"No such user")})
+            delivered.append(recipient)
+            return 1
+
+        with mock.patch.object(mail_sender, "send_messages", side_effect=send_messages) as send, \
+                mock.patch.object(send_email_batch, "retry") as retry:
+            result = send_email_batch.apply(args=[payloads])
+        self.assertTrue(result.successful())
+        retry.assert_not_called()
+        self.assertEqual(send.call_count, 4)
+        self.assertEqual(delivered, ["user0@example.com", "user2@example.com", "user3@example.com"])
+
+
+@test_settings
+class TokenRevocationTests(TestCase):
+    """
+    Logged out tokens and reused refresh tokens must stop working before they expire.
+    """
+
+    def setUp(self):
+        cache.clear()
+        get_revocation_store().clear()
+        get_rate_limiter().clear()
+        self.user = create_user()
+
+    def log_in(self):
+        with mock.patch("apps.account.views.send_otp_email") as otp_email:
+            self.client.post(reverse("login"), {"email": self.user.email, "password": "Str0ng-Passw0rd"})
+        otp = otp_email.delay.call_args.args[1]
+        response = self.client.post(reverse("verify_otp"), {"email": self.user.email, "otp": otp})
+        self.assertEqual(response.status_code, 200)
+        return {name: morsel.value for name, morsel in self.client.cookies.items()}
+
+    def test_logout_revokes_access_and_refresh_tokens(self):
+        cookies = self.log_in()
+        self.assertEqual(self.client.post(reverse("logout")).status_code, 200)
+        for name, value in cookies.items():
+            self.client.cookies[name] = value
+        self.assertEqual(self.client.post(reverse("logout")).status_code, 401)
+        self.assertEqual(self.client.post(reverse("refresh_token")).status_code, 401)
+
+    def test_refresh_token_reuse_revokes_every_token(self):
+        stolen = self.log_in()["refresh_token"]
+        self.assertEqual(self.client.post(reverse("refresh_token")).status_code, 200)
+        rotated = {name: morsel.value for name, morsel in self.client.cookies.items()}
+        self.client.cookies["refresh_token"] = stolen
+        self.assertEqual(self.client.post(reverse("refresh_token")).status_code, 401)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.token_version, 1)
+        for name, value in rotated.items():
+            self.client.cookies[name] = value
+        self.assertEqual(self.client.post(reverse("refresh_token")).status_code, 401)
+        self.assertEqual(self.client.post(reverse("logout")).status_code, 401)
+
+    def test_token_version_follows_the_written_claims(self):
+        self.user.role = User.RoleChoices.BRANCH_MANAGER
+        self.user.first_name = "Janet"
+        self.user.save(update_fields=["first_name"])
+        self.user.refresh_from_db(fields=["token_version"])
+        self.assertEqual(self.user.token_version, 0)
+        self.user.save(update_fields=["role"])
+        self.user.refresh_from_db()
+        self.assertEqual((self.user.role, self.user.token_version), (User.RoleChoices.BRANCH_MANAGER, 1))
+
+
+@test_settings
+class ImagePipelineTests(TestCase):
+    """
+    Uploads are stored and processed in the background into resized, metadata free variants.
+    """
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        storage = {"BACKEND": "django.core.files.storage.FileSystemStorage", "OPTIONS": {"location": directory.name}}
+        overrides = override_settings(
+            STORAGES={"default": storage, "image_uploads": storage},
+            IMAGE_PUBLISHER="apps.account.helpers.images.StorageImagePublisher",
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        self.profile = create_user().profile
+
+    @staticmethod
+    def upload(size=(3000, 2000), image_format="PNG", mode="RGBA"):
+        buffer = io.BytesIO()
+        Image.new(mode, size, "red").save(buffer, image_format)
+        return SimpleUploadedFile(f"photo.{image_format.lower()}", buffer.getvalue())
+
+    def test_upload_is_processed_on_commit(self):
+        with mock.patch.object(process_profile_image, "delay", side_effect=process_profile_image) as delay, \
+                self.captureOnCommitCallbacks(execute=True):
+            name = accept_upload(self.profile, "photo", self.upload())
+            delay.assert_not_called()
+        self.profile.refresh_from_db()
+        variants = self.profile.image_variants["photo"]
+        self.assertNotIn("pending", variants)
+        self.assertEqual(self.profile.photo_url, variants["display"]["jpeg"])
+        storage = storages["default"]
+        for variant, box in (("display", (1024, 683)), ("thumb", (128, 85))):
+            for image_format in ("jpeg", "webp"):
+                path = variants[variant][image_format].split("/media/")[-1]
+                with storage.open(path) as published, Image.open(published) as image:
+                    self.assertEqual(image.size, box)
+                    self.assertEqual(image.mode, "RGB")
+        self.assertFalse(storages["image_uploads"].exists(name))
+
+    def test_newer_upload_supersedes_pending_one(self):
+        with mock.patch.object(process_profile_image, "delay"):
+            first = accept_upload(self.profile, "id_photo", self.upload(image_format="JPEG", mode="RGB"))
+            second = accept_upload(self.profile, "id_photo", self.upload(image_format="JPEG", mode="RGB"))
+        process_profile_image(self.profile.pk, "id_photo", first)
+        self.profile.refresh_from_db()
+        self.assertIsNone(self.profile.id_photo_url)
+        process_profile_image(self.profile.pk, "id_photo", second)
+        self.profile.refresh_from_db()
+        self.assertTrue(self.profile.id_photo_url)
+
+    def test_failing_publisher_is_retried(self):
+        with mock.patch.object(process_profile_image, "delay"):
+            name = accept_upload(self.profile, "photo", self.upload(size=(300, 200)))
+        publish = get_image_publisher().publish
+        failures = [RuntimeError("publisher down")]
+
+        def flaky_publish(*args):
+            if failures:
+                raise failures.pop()
+            return publish(*args)
+
+        with mock.patch.object(StorageImagePublisher, "publish", side_effect=flaky_publish):
+            process_profile_image.apply(args=[self.profile.pk, "photo", name])
+        self.profile.refresh_from_db()
+        self.assertEqual(self.profile.photo_url, self.profile.image_variants["photo"]["display"]["jpeg"])
+        self.assertFalse(storages["image_uploads"].exists(name))
+
+    def test_publisher_failures_drop_the_upload(self):
+        with mock.patch.object(process_profile_image, "delay"):
+            name = accept_upload(self.profile, "photo", self.upload(size=(300, 200)))
+        with mock.patch.object(StorageImagePublisher, "publish", side_effect=RuntimeError("publisher down")) as publish:
+            process_profile_image.apply(args=[self.profile.pk, "photo", name])
+        self.assertEqual(publish.call_count, process_profile_image.max_retries + 1)
+        self.profile.refresh_from_db()
+        self.assertNotIn("pending", self.profile.image_variants.get("photo", {}))
+        self.assertIsNone(self.profile.photo_url)
+        self.assertFalse(storages["image_uploads"].exists(name))
+
+
+@test_settings
+class AdminChangelistQueryCountTests(TestCase):
+    """
+    The profile and next of kin changelists run the same number of queries for any page size.
+    """
+    rows = 500
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            email="admin@example.com", password="Str0ng-Passw0rd", first_name="Ada", last_name="Admin",
+            id_no=1, security_question=User.SecurityQuestion.PET_NAME, security_answer="rex",
+        )
+        users = User.objects.bulk_create(
+            User(email=f"user{number}@example.com", username=f"NGB-{number:08d}", first_name="Jane",
+                 last_name=f"Doe{number}", id_no=1000 + number, security_question=User.SecurityQuestion.PET_NAME)
+            for number in range(cls.rows)
+        )
+        profiles = Profile.objects.bulk_create(Profile(user=user) for user in users)
+        NextOfKin.objects.bulk_create(
+            NextOfKin(profile=profile, first_name="John", last_name="Doe", other_name="K", gender="Male",
+                      relationship="Sibling", is_primary=True)
+            for profile in profiles
+        )
+
+    def changelist_queries(self, model, per_page):
+        model_admin = admin.site._registry[model]
+        url = reverse(f"admin:account_{model._meta.model_name}_changelist")
+        with mock.patch.object(model_admin, "list_per_page", per_page), \
+                CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'name="_selected_action"', count=per_page)
+        return len(queries)
+
+    def test_changelists_run_a_constant_number_of_queries(self):
+        self.client.force_login(self.admin)
+        for model in (Profile, NextOfKin):
+            with self.subTest(model=model.__name__):
+                self.assertEqual(self.changelist_queries(model, 10), self.changelist_queries(model, self.rows))
+
+
+@test_settings
+class NextOfKinBulkApiTests(TestCase):
+    """
+    The next of kin list is replaced in one transaction with a query count independent of its size.
+    """
+
+    def setUp(self):
+        get_rate_limiter().clear()
+        self.user = create_user()
+        self.client.cookies[settings.COOKIE_NAME] = str(AccountRefreshToken.for_user(self.user).access_token)
+        self.url = reverse("next_of_kin")
+
+    @staticmethod
+    def contact(number, **fields):
+        return {"first_name": f"John{number}", "last_name": "Doe", "other_name": "K", "gender": "Male",
+                "relationship": "Sibling", **fields}
+
+    def put(self, items):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.put(self.url, items, content_type="application/json")
+        return response, len(queries)
+
+    def test_query_count_does_not_grow_with_list_size(self):
+        self.put([self.contact(number, is_primary=number == 0) for number in range(3)])
+        counts = {}
+        for size in (4, 20):
+            # Each run deletes the primary contact, updates the others and creates a new primary.
+            current = self.client.get(self.url).json()
+            items = [{**kin, "first_name": "Jane", "is_primary": False} for kin in current[1:]]
+            items += [self.contact(number, is_primary=number == 0) for number in range(size - len(items))]
+            response, counts[size] = self.put(items)
+            self.assertEqual(response.status_code, 200, response.content)
+            self.assertEqual(len(response.json()), size)
+        self.assertEqual(counts[4], counts[20])
+        self.assertEqual(NextOfKin.objects.filter(profile__user=self.user).count(), 20)
+        self.assertTrue(Profile.objects.get(user=self.user).has_next_of_kin)
+
+        # Removing many contacts costs the same queries as removing one.
+        counts = {}
+        for deleted in (1, 19):
+            response, _ = self.put([self.contact(number, is_primary=number == 0) for number in range(deleted + 1)])
+            kept = response.json()[0]
+            response, counts[deleted] = self.put([kept])
+            self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(counts[1], counts[19])
+        self.assertEqual(NextOfKin.objects.filter(profile__user=self.user).count(), 1)
+        self.assertTrue(Profile.objects.get(user=self.user).has_next_of_kin)
+        self.assertFalse(Profile.next_of_kin_refresh_deferred())
+
+    def test_missing_profile(self):
+        Profile.objects.filter(user=self.user).delete()
+        response, _ = self.put([self.contact(1, is_primary=True)])
+        self.assertEqual(response.status_code, 404)
+
+    def test_primary_swap(self):
+        first, second = self.put([self.contact(1, is_primary=True), self.contact(2)])[0].json()
+        response, _ = self.put([{**first, "is_primary": False}, {**second, "is_primary": True}])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(NextOfKin.objects.get(is_primary=True).pk, NextOfKin.objects.get(first_name="John2").pk)
+
+    def test_invalid_lists_change_nothing(self):
+        other = create_user(email="john@example.com", id_no=2)
+        foreign = NextOfKin.objects.create(profile=other.profile, **self.contact(9))
+        for items in ([self.contact(1, is_primary=True), self.contact(2, is_primary=True)],
+                      [{**self.contact(1), "id": str(foreign.pk)}]):
+            with self.subTest(items=items):
+                self.assertEqual(self.put(items)[0].status_code, 400)
+        self.assertFalse(NextOfKin.objects.filter(profile__user=self.user).exists())
+
+    def test_empty_list_removes_every_next_of_kin(self):
+        self.put([self.contact(1, is_primary=True)])
+        response, _ = self.put([])
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(Profile.objects.get(user=self.user).has_next_of_kin)
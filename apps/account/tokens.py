@@ -0,0 +1,176 @@
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils.functional import cached_property
+from django.utils.translation import gettext_lazy as _
+from loguru import logger
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .helpers.revocation import get_revocation_store
+
+TOKEN_VERSION_CLAIM = "ver"
+TOKEN_VERSION_CACHE_TIMEOUT = 24 * 60 * 60
+
+
+def token_version_cache_key(user_id) -> str:
+    return f"token_version:{user_id}"
+
+
+def cache_token_version(user_id, version: int) -> None:
+    """
+    Store the current token version of a user in the cache.
+    :param user_id: The user id.
+    :param version: The token version.
+    """
+    cache.set(token_version_cache_key(user_id), version, TOKEN_VERSION_CACHE_TIMEOUT)
+
+
+async def acache_token_version(user_id, version: int) -> None:
+    await cache.aset(token_version_cache_key(user_id), version, TOKEN_VERSION_CACHE_TIMEOUT)
+
+
+def get_token_version(user_id):
+    """
+    Return the current token version of a user, reading the database only on a cache miss.
+    :param user_id: The user id.
+    :return: The token version, or None if the user does not exist
+    """
+    version = cache.get(token_version_cache_key(user_id))
+    if version is None:
+        version = get_user_model().objects.filter(pk=user_id).values_list("token_version", flat=True).first()
+        if version is not None:
+            cache_token_version(user_id, version)
+    return version
+
+
+def check_refresh_token(refresh, user) -> None:
+    """
+    Reject a refresh token from an older token epoch or revoked by a logout.
+    With rotation on, the token is marked as used. A used token presented again was copied, so
+    every token of the user is revoked by bumping the token version.
+    :param refresh: The validated refresh token.
+    :param user: The user the token was issued to.
+    :raises AuthenticationFailed: If the token was revoked or reused
+    """
+    if refresh.get(TOKEN_VERSION_CLAIM, user.token_version) != user.token_version:
+        raise AuthenticationFailed(_("Token has been revoked."), code="token_revoked")
+    store = get_revocation_store()
+    if api_settings.ROTATE_REFRESH_TOKENS:
+        previous = store.revoke_refresh_token(refresh, store.ROTATED)
+    else:
+        previous = store.lookup(refresh[api_settings.JTI_CLAIM])
+    if previous == store.ROTATED:
+        user.bump_token_version()
+        logger.warning(f"Refresh token reused for user {user.pk}, all tokens revoked")
+        raise AuthenticationFailed(_("Token has been revoked."), code="token_reused")
+    if previous is not None:
+        raise AuthenticationFailed(_("Token has been revoked."), code="token_revoked")
+
+
+def revoke_tokens(access_token, raw_refresh_token) -> None:
+    """
+    Revoke the access token of a request and its refresh token cookie, on logout.
+    :param access_token: The validated access token, or None.
+    :param raw_refresh_token: The refresh token cookie, or None.
+    """
+    store = get_revocation_store()
+    if access_token is not None:
+        store.revoke_access_token(access_token)
+    if raw_refresh_token:
+        try:
+            store.revoke_refresh_token(RefreshToken(raw_refresh_token))
+        except TokenError:
+            pass
+
+
+def rotate_refresh_token(refresh) -> dict:
+    """
+    Issue a new access token, and rotate the refresh token when ``ROTATE_REFRESH_TOKENS`` is on.
+    The token blacklist app is not installed, so rotation writes nothing to the database;
+    ``check_refresh_token`` revokes the old token.
+    :param refresh: The validated refresh token.
+    :return: Dictionary with the ``access`` and, when rotating, ``refresh`` tokens
+    """
+    data = {"access": str(refresh.access_token)}
+    if api_settings.ROTATE_REFRESH_TOKENS:
+        refresh.set_jti()
+        refresh.set_exp()
+        refresh.set_iat()
+        data["refresh"] = str(refresh)
+    return data
+
+
+class AccountRefreshToken(RefreshToken):
+    """
+    Refresh token carrying the claims needed to authorize a request without loading the user.
+    Access tokens created from it copy the same claims.
+    """
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token["email"] = user.email
+        token["role"] = user.role
+        token["account_status"] = user.account_status
+        token[TOKEN_VERSION_CLAIM] = user.token_version
+        return token
+
+
+class ClaimsUser:
+    """
+    Lightweight user built from the access token claims.
+    Only the id and the claims are read from the token. Everything else, permissions, staff flags,
+    ``save()`` and attribute writes included, goes to the real ``User`` row, loaded once on first use.
+    Once loaded, the row is authoritative for the claims too.
+    """
+    is_anonymous = False
+    is_authenticated = True
+
+    def __init__(self, token):
+        self.__dict__["token"] = token
+
+    def __str__(self):
+        return self.email
+
+    @cached_property
+    def id(self):
+        return self.token[api_settings.USER_ID_CLAIM]
+
+    @cached_property
+    def pk(self):
+        return self.id
+
+    def __eq__(self, other):
+        if isinstance(other, ClaimsUser):
+            return self.id == other.id
+        if isinstance(other, get_user_model()):
+            return str(self.id) == str(other.pk)
+        return NotImplemented
+
+    def __hash__(self):
+        return hash(self.id)
+
+    @property
+    def user(self):
+        """
+        The real user instance, loaded on first access.
+        """
+        user = self.__dict__.get("_user")
+        if user is None:
+            user = self.__dict__["_user"] = get_user_model().objects.get(pk=self.id)
+        return user
+
+    def has_role(self, role_name):
+        return self.role == role_name
+
+    def __getattr__(self, attr):
+        if attr.startswith("__") or attr in ("token", "_user"):
+            raise AttributeError(attr)
+        if "_user" not in self.__dict__ and attr in self.token:
+            return self.token[attr]
+        return getattr(self.user, attr)
+
+    def __setattr__(self, attr, value):
+        setattr(self.user, attr, value)
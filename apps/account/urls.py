@@ -1,10 +1,24 @@
+from django.conf import settings
 from django.urls import path
+from djoser.views import UserViewSet
 
+from .async_views import AsyncLogoutView, AsyncOTPVerifyView, AsyncTokenCreateView, AsyncTokenRefreshView
 from .views import CustomTokenCreatView, LogoutView, OTPVerifyView, CustomTokenRefreshView
 
-urlpatterns = [
-    path("login/", CustomTokenCreatView.as_view(), name="login"),
-    path("logout/", LogoutView.as_view(), name="logout"),
-    path("verify-otp/", OTPVerifyView.as_view(), name="verify_otp"),
-    path("refresh-token/", CustomTokenRefreshView.as_view(), name="refresh_token"),
-]
+# Set with the URLconf, which imports the djoser views anyway, so workers and commands never load them.
+UserViewSet.throttle_scope = {"create": "register"}
+
+if settings.AUTH_ASYNC_VIEWS:
+    urlpatterns = [
+        path("login/", AsyncTokenCreateView.as_view(), name="login"),
+        path("logout/", AsyncLogoutView.as_view(), name="logout"),
+        path("verify-otp/", AsyncOTPVerifyView.as_view(), name="verify_otp"),
+        path("refresh-token/", AsyncTokenRefreshView.as_view(), name="refresh_token"),
+    ]
+else:
+    urlpatterns = [
+        path("login/", CustomTokenCreatView.as_view(), name="login"),
+        path("logout/", LogoutView.as_view(), name="logout"),
+        path("verify-otp/", OTPVerifyView.as_view(), name="verify_otp"),
+        path("refresh-token/", CustomTokenRefreshView.as_view(), name="refresh_token"),
+    ]
@@ -1,5 +1,7 @@
 import string
 
+from django.conf import settings
+
 
 def generate_otp(length: int = 6) -> str:
     """
@@ -15,3 +17,24 @@ def generate_otp(length: int = 6) -> str:
     import random
 
     return ''.join(random.choices(string.digits, k=length))
+
+
+def get_client_ip(request) -> str:
+    """
+    Get the client IP address of a request.
+    Behind ``TRUSTED_PROXY_COUNT`` proxies, the address that many hops from the right of
+    ``X-Forwarded-For`` is used: the entries left of it are sent by the client and can be forged.
+
+    Args:
+        request: The HTTP request.
+
+    Returns:
+        str: The client IP address, or None if unknown.
+    """
+    proxies = settings.TRUSTED_PROXY_COUNT
+    forwarded_for = request.META.get("HTTP_X_FORWARDED_FOR")
+    if proxies and forwarded_for:
+        addresses = [address.strip() for address in forwarded_for.split(",") if address.strip()]
+        if addresses:
+            return addresses[-min(proxies, len(addresses))]
+    return request.META.get("REMOTE_ADDR")
@@ -2,18 +2,31 @@ from http import HTTPStatus
 from typing import Optional
 
 from django.conf import settings
-from django.utils import timezone
+from django.db import transaction
+from django.shortcuts import get_object_or_404
 from djoser.views import TokenCreateView, User
 from loguru import logger
 from rest_framework import serializers, permissions
+from rest_framework.exceptions import AuthenticationFailed
 from rest_framework.request import Request
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from rest_framework_simplejwt.views import TokenRefreshView
 
 from .helpers.emails import send_otp_email
-from .utils import generate_otp
+from .helpers.lockout import get_lockout_engine
+from .helpers.otp import get_otp_store
+from .metrics import OTP_SENT, OTP_VERIFICATIONS, REFRESH_FAILURES
+from .models import NextOfKin, Profile
+from .serializers import NextOfKinSerializer, TokenRefreshSerializer
+from .tokens import AccountRefreshToken, revoke_tokens
+from .utils import generate_otp, get_client_ip
+
+failed_login_logger = logger.bind(channel="auth.failed_login")
+
+# Refresh failure metric label by AuthenticationFailed code.
+REFRESH_FAILURE_REASONS = {"no_active_account": "inactive", "token_revoked": "revoked", "token_reused": "reused"}
 
 
 def set_auth_cookie(response: Response, access_token: str, refresh_token: Optional[str] = None) -> None:
@@ -29,7 +42,7 @@ def set_auth_cookie(response: Response, access_token: str, refresh_token: Option
         'path': settings.COOKIE_PATH,
         'httponly': settings.COOKIE_HTTPONLY,
         'samesite': settings.COOKIE_SAMESITE,
-        'secure': settings.SECURE_COOKIES,
+        'secure': settings.COOKIE_SECURE,
         'max_age': access_token_lifetime,
     }
     response.set_cookie(settings.COOKIE_NAME, access_token, **cookie_settings)
@@ -46,6 +59,8 @@ class CustomTokenCreatView(TokenCreateView):
     """
     Custom token create view to set cookies for access and refresh tokens.
     """
+    throttle_scope = "login"
+    throttle_key_fields = ("email",)
 
     def _action(self, serializer):
         """
@@ -56,14 +71,15 @@ class CustomTokenCreatView(TokenCreateView):
         user = serializer.user
         if user.is_locked_out:
             return Response({
-                "detail": f"Account is locked  due to multiple attempts try again after {settings.LOCKOUT_DURATION.to_seconds() / 60} minutes."},
+                "detail": f"Account is locked  due to multiple attempts try again after {settings.LOCKOUT_DURATION.total_seconds() / 60} minutes."},
                 status=HTTPStatus.FORBIDDEN)
 
         user.reset_failed_login_attempt()
         otp = generate_otp()
         user.set_otp(otp)
-        send_otp_email(user.email, otp)
-        logger.info(f"OTP sent to {user.email}: {otp}")
+        send_otp_email.delay(user.email, otp)
+        OTP_SENT.inc()
+        logger.info(f"OTP queued for {user.email}")
         return Response({
             "detail": "OTP sent to your email. Please verify to log in."
         }, status=HTTPStatus.OK)
@@ -76,20 +92,28 @@ class CustomTokenCreatView(TokenCreateView):
         :param kwargs: Additional keyword arguments.
         :return: The HTTP response object.
         """
+        ip_address = get_client_ip(request)
+        lockout_engine = get_lockout_engine()
+        if lockout_engine.is_ip_blocked(ip_address):
+            logger.warning(f"Login blocked for {ip_address} after too many failed attempts")
+            return Response({"detail": "Too many failed login attempts. Please try again later."},
+                            status=HTTPStatus.TOO_MANY_REQUESTS)
         serializer = self.get_serializer(data=request.data)
         try:
             serializer.is_valid(raise_exception=True)
             return self._action(serializer)
         except serializers.ValidationError as e:
             email = request.data.get('email')
-            user = User.objects.filter(email=email).first()
+            user = User.objects.filter(email=email).first() if email else None
             if user:
-                locked_user = user.handle_failed_login_attempt()
+                locked_user = user.handle_failed_login_attempt(ip_address)
                 if locked_user:
                     return Response({
                         "detail": "Account is temporarily locked due to multiple failed login attempts."},
                         status=HTTPStatus.FORBIDDEN)
-            logger.error(f"Failed login attempt for {email}")
+            elif email:
+                lockout_engine.register_failure(email, ip_address)
+            failed_login_logger.error(f"Failed login attempt for {email}")
             return Response({"detail": "Invalid credentials provided."}, status=HTTPStatus.BAD_REQUEST)
         except Exception as e:
             logger.error(f"Unexpected error during login: {str(e)}")
@@ -101,6 +125,8 @@ class CustomTokenRefreshView(TokenRefreshView):
     """
     Custom token refresh view to set cookies for access and refresh tokens.
     """
+    serializer_class = TokenRefreshSerializer
+    throttle_scope = "refresh"
 
     def post(self, request: Request, *args, **kwargs) -> Response:
         """
@@ -113,9 +139,18 @@ class CustomTokenRefreshView(TokenRefreshView):
         refresh_token = request.COOKIES.get('refresh_token')
         if not refresh_token:
             logger.error(f"No refresh token provided for {request.path}")
+            REFRESH_FAILURES.labels("missing").inc()
             return Response({"detail": "Refresh token not found."}, status=HTTPStatus.UNAUTHORIZED)
-        request.data['refresh'] = refresh_token
-        response = super().post(request, *args, **kwargs)
+        serializer = self.get_serializer(data={'refresh': refresh_token})
+        try:
+            serializer.is_valid(raise_exception=True)
+        except TokenError as e:
+            REFRESH_FAILURES.labels("invalid").inc()
+            raise InvalidToken(e.args[0])
+        except AuthenticationFailed as e:
+            REFRESH_FAILURES.labels(REFRESH_FAILURE_REASONS.get(e.get_codes(), "inactive")).inc()
+            raise
+        response = Response(serializer.validated_data, status=HTTPStatus.OK)
         if response.status_code == HTTPStatus.OK:
             access_token = response.data.get('access')
             refresh_token = response.data.get('refresh')
@@ -135,6 +170,8 @@ class OTPVerifyView(APIView):
     APi view to verify the OTP sent to the user.
     """
     permission_classes = [permissions.AllowAny]
+    throttle_scope = "verify_otp"
+    throttle_key_fields = ("email",)
 
     def post(self, request: Request, *args, **kwargs) -> Response:
         """
@@ -146,18 +183,24 @@ class OTPVerifyView(APIView):
         """
         email = request.data.get('email')
         otp = request.data.get('otp')
-        if not otp:
-            return Response({"detail": "OTP is required."}, status=HTTPStatus.BAD_REQUEST)
-        user = User.objects.filter(otp=otp, otp_expiry__gt=timezone.now()).first()
+        if not email or not otp:
+            return Response({"detail": "Email and OTP are required."}, status=HTTPStatus.BAD_REQUEST)
+        # The challenge store is checked first so that wrong codes never touch the users table.
+        if not get_otp_store().verify(email, otp):
+            OTP_VERIFICATIONS.labels("invalid").inc()
+            return Response({"detail": "Invalid or expired OTP."}, status=HTTPStatus.BAD_REQUEST)
+        user = User.objects.filter(email=email).first()
         if not user:
+            OTP_VERIFICATIONS.labels("invalid").inc()
             return Response({"detail": "Invalid or expired OTP."}, status=HTTPStatus.BAD_REQUEST)
 
         if user.is_locked_out:
+            OTP_VERIFICATIONS.labels("locked").inc()
             return Response({
-                "detail": f"Account is locked due to multiple attempts. Try again after {settings.LOCKOUT_DURATION.to_seconds() / 60} minutes."},
+                "detail": f"Account is locked due to multiple attempts. Try again after {settings.LOCKOUT_DURATION.total_seconds() / 60} minutes."},
                 status=HTTPStatus.FORBIDDEN)
-        user.verify_otp(otp)
-        refresh = RefreshToken.for_user(user)
+        OTP_VERIFICATIONS.labels("success").inc()
+        refresh = AccountRefreshToken.for_user(user)
         access_token = str(refresh.access_token)
         refresh_token = str(refresh)
         response = Response({
@@ -181,8 +224,45 @@ class LogoutView(APIView):
         :param kwargs: Additional keyword arguments.
         :return: The HTTP response object.
         """
+        revoke_tokens(request.auth, request.COOKIES.get('refresh_token'))
         response = Response({"detail": "Logged out successfully."}, status=HTTPStatus.OK)
         response.delete_cookie(settings.COOKIE_NAME)
         response.delete_cookie('refresh_token')
         response.delete_cookie('logged_in')
-        return response
\ No newline at end of file
+        return response
+
+class NextOfKinView(APIView):
+    """
+    API view to read and replace the next of kin list of the authenticated user's profile.
+    """
+    max_next_of_kin = 20
+
+    def get(self, request: Request, *args, **kwargs) -> Response:
+        """
+        List the next of kin of the profile.
+        :param request: The HTTP request object.
+        :param args: Additional positional arguments.
+        :param kwargs: Additional keyword arguments.
+        :return: The HTTP response object.
+        """
+        next_of_kin = NextOfKin.objects.filter(profile__user_id=request.user.pk).order_by("-is_primary", "created_at")
+        return Response(NextOfKinSerializer(next_of_kin, many=True).data)
+
+    def put(self, request: Request, *args, **kwargs) -> Response:
+        """
+        Replace the next of kin list of the profile, see ``NextOfKinListSerializer``.
+        The profile row is locked, so concurrent replacements of the same list apply one after the other.
+        :param request: The HTTP request object.
+        :param args: Additional positional arguments.
+        :param kwargs: Additional keyword arguments.
+        :return: The HTTP response object.
+        """
+        with transaction.atomic():
+            profile_id = get_object_or_404(
+                Profile.objects.select_for_update().filter(user_id=request.user.pk).values_list("pk", flat=True))
+            serializer = NextOfKinSerializer(list(NextOfKin.objects.filter(profile_id=profile_id)),
+                                             data=request.data, many=True, max_length=self.max_next_of_kin,
+                                             context={"profile_id": profile_id})
+            serializer.is_valid(raise_exception=True)
+            serializer.save()
+        return Response(serializer.data)
@@ -1,13 +1,37 @@
+from datetime import date
+
+from django.conf import settings
 from django.contrib import admin
 from django.contrib.contenttypes.admin import GenericTabularInline
 from django.utils.translation import gettext_lazy as _
 
-from .models import ContentView
+from .models import ContentTypeViewRollup, ContentView, ContentViewRollup
+from .paginator import KeysetPaginator
+from .retention import add_months, retention_start
 
 
 # Register your models here.
 
 
+class RetainedMonthFilter(admin.SimpleListFilter):
+    """
+    Filter on one retained ``view_month``. The choices come from the settings, not from the table,
+    and the filter reads a single partition on PostgreSQL.
+    """
+    title = _('view month')
+    parameter_name = 'view_month'
+
+    def lookups(self, request, model_admin):
+        start = retention_start()
+        months = [add_months(start, offset) for offset in range(settings.CONTENT_VIEW_RETENTION["MONTHS"])]
+        return [(f"{month:%Y-%m}", f"{month:%B %Y}") for month in reversed(months)]
+
+    def queryset(self, request, queryset):
+        if self.value() in dict(self.lookup_choices):
+            return queryset.filter(view_month=date.fromisoformat(f"{self.value()}-01"))
+        return queryset
+
+
 @admin.register(ContentView)
 class ContentViewAdmin(admin.ModelAdmin):
     """
@@ -15,10 +39,13 @@ class ContentViewAdmin(admin.ModelAdmin):
     """
     list_display = ('content_type', 'object_id', 'user', 'ip_address', 'last_viewed', 'created_at', 'updated_at',)
     search_fields = ('content_type__model', 'object_id', 'ip_address',)
-    list_filter = ('content_type', 'user', 'ip_address',)
-    date_hierarchy = 'last_viewed'
+    # The filters list the values of get_queryset, which only spans the retained window. The month
+    # filter replaces the date hierarchy, whose DISTINCT dates query scanned every retained row.
+    list_filter = (RetainedMonthFilter, 'content_type', ('user', admin.RelatedOnlyFieldListFilter), 'ip_address',)
     readonly_fields = ['content_type', 'object_id', 'user', 'ip_address', 'last_viewed', 'created_at', 'updated_at']
     ordering = ('-last_viewed',)
+    paginator = KeysetPaginator
+    show_full_result_count = False
 
     fieldsets = (
         (None, {
@@ -35,6 +62,15 @@ class ContentViewAdmin(admin.ModelAdmin):
          ),
     )
 
+    def get_queryset(self, request):
+        """
+        Content views of the retained window only, so expired rows waiting for the next prune and
+        their distinct filter values are never scanned.
+        :param request: The request object.
+        :return: The queryset
+        """
+        return super().get_queryset(request).filter(view_month__gte=retention_start())
+
     def has_add_permission(self, request):
         """
         Disable the add permission for ContentView.
@@ -51,6 +87,39 @@ class ContentViewAdmin(admin.ModelAdmin):
         """
         return False
 
+class ViewRollupAdmin(admin.ModelAdmin):
+    """
+    Read-only admin for the view rollups. Filter on a content type and a period for its trend.
+    """
+    list_filter = ('period', 'content_type',)
+    ordering = ('-bucket',)
+    paginator = KeysetPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ContentViewRollup)
+class ContentViewRollupAdmin(ViewRollupAdmin):
+    """
+    Admin interface for ContentViewRollup model.
+    """
+    list_display = ('content_type', 'object_id', 'period', 'bucket', 'views',)
+    search_fields = ('=object_id',)
+
+
+@admin.register(ContentTypeViewRollup)
+class ContentTypeViewRollupAdmin(ViewRollupAdmin):
+    """
+    Admin interface for ContentTypeViewRollup model.
+    """
+    list_display = ('content_type', 'period', 'bucket', 'views',)
+
+
 class ContentViewInline(GenericTabularInline):
     """
     Inline admin interface for ContentView model.
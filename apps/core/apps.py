@@ -1,6 +1,20 @@
 from django.apps import AppConfig
+from django.db.backends.signals import connection_created
+
+
+def install_query_metrics(sender, connection, **kwargs):
+    # Imported on the first connection, so processes that never query skip prometheus_client.
+    from .metrics import install_query_metrics
+
+    install_query_metrics(sender, connection, **kwargs)
 
 
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'apps.core'
+
+    def ready(self):
+        from fintech.bootstrap import configure_logging
+
+        configure_logging()
+        connection_created.connect(install_query_metrics, dispatch_uid="core.install_query_metrics")
@@ -0,0 +1,277 @@
+import atexit
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils.module_loading import import_string
+from loguru import logger
+
+def write_views(entries, batch_size=None) -> int:
+    """
+    Write aggregated view events with one bulk upsert per batch.
+    :param entries: Mapping of ``(content_type_id, object_id, user_id, ip_address)`` to the last view time.
+    :param batch_size: Rows per INSERT statement.
+    :return: Number of written rows
+    """
+    from .models import ContentView
+
+    views = [
+        ContentView(
+            content_type_id=content_type_id,
+            object_id=object_id,
+            user_id=user_id,
+            ip_address=ip_address,
+            last_viewed=last_viewed,
+            view_month=ContentView.month_of(last_viewed),
+            view_key=ContentView.make_view_key(content_type_id, object_id, user_id, ip_address),
+        )
+        for (content_type_id, object_id, user_id, ip_address), last_viewed in entries.items()
+    ]
+    ContentView.objects.bulk_create(
+        views,
+        batch_size=batch_size,
+        update_conflicts=True,
+        unique_fields=["view_key", "view_month"],
+        update_fields=["last_viewed", "updated_at"],
+    )
+    return len(views)
+
+
+def write_views_and_tallies(entries, tallies, batch_size=None) -> int:
+    """
+    Write aggregated view events and their hourly counts in one transaction.
+    :param entries: See ``write_views``.
+    :param tallies: Mapping of ``(content_type_id, object_id, hour)`` to the number of views.
+    :param batch_size: Rows per INSERT statement.
+    :return: Number of written view rows
+    """
+    from .rollups import write_tallies
+
+    with transaction.atomic():
+        written = write_views(entries, batch_size)
+        write_tallies(tallies)
+    return written
+
+
+def hour_of(viewed_at):
+    """
+    :param viewed_at: An aware datetime.
+    :return: The start of its hour in UTC, the bucket of the view tallies
+    """
+    from .rollups import hour_bucket
+
+    return hour_bucket(viewed_at)
+
+
+class BaseViewBuffer:
+    """
+    Base class for content view recorders.
+    """
+
+    def __init__(self, flush_size=None, flush_interval=None):
+        options = settings.CONTENT_VIEW_BUFFER
+        self.flush_size = flush_size or options.get("FLUSH_SIZE", 500)
+        self.flush_interval = flush_interval or options.get("FLUSH_INTERVAL", 30)
+
+    def record(self, content_type_id, object_id, user_id, ip_address, viewed_at):
+        """
+        Record one view event: the last view of the viewer and one more view of the object in its hour.
+        :param content_type_id: The content type id of the viewed object.
+        :param object_id: The id of the viewed object.
+        :param user_id: The viewer id, if authenticated.
+        :param ip_address: The viewer IP address, if known.
+        :param viewed_at: The time of the view.
+        """
+        raise NotImplementedError
+
+    def flush(self) -> int:
+        """
+        Write the buffered events to the database.
+        :return: Number of written rows
+        """
+        return 0
+
+
+class SynchronousViewBuffer(BaseViewBuffer):
+    """
+    Writes every view straight to the database. Used by tests and as a fallback.
+    """
+
+    def record(self, content_type_id, object_id, user_id, ip_address, viewed_at):
+        from .models import ContentView
+
+        try:
+            view, created = ContentView.objects.get_or_create(
+                view_key=ContentView.make_view_key(content_type_id, object_id, user_id, ip_address),
+                view_month=ContentView.month_of(viewed_at),
+                defaults={
+                    'content_type_id': content_type_id,
+                    'object_id': object_id,
+                    'user_id': user_id,
+                    'ip_address': ip_address,
+                    'last_viewed': viewed_at,
+                }
+            )
+            if not created:
+                view.last_viewed = viewed_at
+                view.save(update_fields=['last_viewed', 'updated_at'])
+        except IntegrityError:
+            pass
+        from .rollups import write_tallies
+
+        write_tallies({(content_type_id, object_id, hour_of(viewed_at)): 1})
+
+
+class MemoryViewBuffer(BaseViewBuffer):
+    """
+    Aggregates views in process memory and flushes them from the recording process
+    once the buffer reaches the flush size or the flush interval has passed.
+    """
+
+    def __init__(self, flush_size=None, flush_interval=None):
+        super().__init__(flush_size, flush_interval)
+        self._entries = {}
+        self._tallies = Counter()
+        self._lock = threading.Lock()
+        self._last_flush = time.monotonic()
+        atexit.register(self.flush)
+
+    def record(self, content_type_id, object_id, user_id, ip_address, viewed_at):
+        key = (content_type_id, object_id, user_id, ip_address)
+        hour = hour_of(viewed_at)
+        with self._lock:
+            previous = self._entries.get(key)
+            if previous is None or previous < viewed_at:
+                self._entries[key] = viewed_at
+            self._tallies[content_type_id, object_id, hour] += 1
+            due = (len(self._entries) >= self.flush_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            entries, self._entries = self._entries, {}
+            tallies, self._tallies = self._tallies, Counter()
+            self._last_flush = time.monotonic()
+        if not entries:
+            return 0
+        try:
+            return write_views_and_tallies(entries, tallies, self.flush_size)
+        except Exception as e:
+            logger.error(f"Failed to flush {len(entries)} content views: {e}")
+            with self._lock:
+                for key, viewed_at in entries.items():
+                    if self._entries.get(key, viewed_at) <= viewed_at:
+                        self._entries[key] = viewed_at
+                self._tallies.update(tallies)
+            return 0
+
+
+class RedisViewBuffer(BaseViewBuffer):
+    """
+    Aggregates views in a Redis hash shared by every process.
+    A second hash counts the views per object and hour. Both are flushed by the periodic
+    ``flush_content_views`` task, or earlier when the buffer reaches the flush size.
+    """
+
+    def __init__(self, flush_size=None, flush_interval=None, alias="default", key="content_views:buffer"):
+        super().__init__(flush_size, flush_interval)
+        self.alias = alias
+        self.key = key
+        self.tally_key = f"{key}:tallies"
+
+    @property
+    def client(self):
+        from django_redis import get_redis_connection
+
+        return get_redis_connection(self.alias)
+
+    @staticmethod
+    def encode(content_type_id, object_id, user_id, ip_address):
+        return f"{content_type_id}|{object_id}|{user_id or ''}|{ip_address or ''}"
+
+    @staticmethod
+    def decode(field):
+        content_type_id, object_id, user_id, ip_address = field.decode().split("|")
+        return int(content_type_id), uuid.UUID(object_id), user_id or None, ip_address or None
+
+    def record(self, content_type_id, object_id, user_id, ip_address, viewed_at):
+        field = self.encode(content_type_id, object_id, user_id, ip_address)
+        pipe = self.client.pipeline()
+        pipe.hset(self.key, field, viewed_at.timestamp())
+        pipe.hincrby(self.tally_key, f"{content_type_id}|{object_id}|{hour_of(viewed_at).timestamp():.0f}", 1)
+        pipe.hlen(self.key)
+        _, _, size = pipe.execute()
+        # Only the first process to notice a full buffer queues the flush.
+        if size >= self.flush_size and self.client.set(f"{self.key}:flush", 1, nx=True, ex=self.flush_interval):
+            from .tasks import flush_content_views
+
+            flush_content_views.delay()
+
+    @staticmethod
+    def decode_tally(field):
+        content_type_id, object_id, hour = field.decode().split("|")
+        return int(content_type_id), uuid.UUID(object_id), datetime.fromtimestamp(int(hour), tz=dt_timezone.utc)
+
+    def take(self, key):
+        """
+        Move a hash out of the way of new views and read it.
+        :param key: The hash key.
+        :return: Tuple of the batch key and the hash, or of None and an empty dict when nothing was buffered
+        """
+        from redis.exceptions import ResponseError
+
+        batch_key = f"{key}:{uuid.uuid4().hex}"
+        try:
+            self.client.rename(key, batch_key)
+        except ResponseError:
+            return None, {}
+        return batch_key, self.client.hgetall(batch_key)
+
+    def flush(self):
+        client = self.client
+        batch_key, raw = self.take(self.key)
+        if batch_key is None:
+            # Nothing was buffered since the last flush.
+            return 0
+        client.delete(f"{self.key}:flush")
+        tally_batch_key, raw_tallies = self.take(self.tally_key)
+        entries = {
+            self.decode(field): datetime.fromtimestamp(float(value), tz=dt_timezone.utc)
+            for field, value in raw.items()
+        }
+        tallies = {self.decode_tally(field): int(value) for field, value in raw_tallies.items()}
+        try:
+            written = write_views_and_tallies(entries, tallies, self.flush_size)
+        except Exception as e:
+            logger.error(f"Failed to flush {len(entries)} content views: {e}")
+            # Put the batch back without overwriting newer views.
+            pipe = client.pipeline()
+            for field, value in raw.items():
+                pipe.hsetnx(self.key, field, value)
+            for field, value in raw_tallies.items():
+                pipe.hincrby(self.tally_key, field, int(value))
+            pipe.execute()
+            written = 0
+        client.delete(*filter(None, (batch_key, tally_batch_key)))
+        return written
+
+
+_buffers = {}
+
+
+def get_view_buffer() -> BaseViewBuffer:
+    """
+    Return the view buffer configured in ``CONTENT_VIEW_BUFFER``.
+    :return: The configured view buffer
+    """
+    path = settings.CONTENT_VIEW_BUFFER["BACKEND"]
+    buffer = _buffers.get(path)
+    if buffer is None:
+        buffer = _buffers[path] = import_string(path)()
+    return buffer
@@ -0,0 +1,29 @@
+from django.core.cache.backends import locmem
+from django_redis import cache as redis_cache
+
+from .metrics import CACHE_GETS, cache_namespace
+
+MISSING = object()
+
+
+class CacheMetricsMixin:
+    """
+    Counts cache hits and misses per key namespace.
+    The async reads of the default backends go through ``get``, so they are counted too.
+    """
+
+    def get(self, key, default=None, version=None, **kwargs):
+        value = super().get(key, MISSING, version, **kwargs)
+        if value is MISSING:
+            CACHE_GETS.labels(cache_namespace(key), "miss").inc()
+            return default
+        CACHE_GETS.labels(cache_namespace(key), "hit").inc()
+        return value
+
+
+class RedisCache(CacheMetricsMixin, redis_cache.RedisCache):
+    pass
+
+
+class LocMemCache(CacheMetricsMixin, locmem.LocMemCache):
+    pass
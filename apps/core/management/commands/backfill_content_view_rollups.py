@@ -0,0 +1,54 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+from apps.core.models import ContentView, RollupCheckpoint
+from apps.core.rollups import fold, hour_bucket, locked_checkpoint
+
+BACKFILL_CHECKPOINT = "content_views_backfill"
+
+
+class Command(BaseCommand):
+    help = ("Build the view rollups from existing content views in chunks. ContentView keeps the last view "
+            "of each viewer per month only, so each row counts as one view in the hour it was last seen. Pass the time "
+            "the view tallies started as --until, later views are already counted by the compaction.")
+
+    def add_arguments(self, parser):
+        parser.add_argument("--until", required=True, help="ISO timestamp, only views before it are counted.")
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Content views per chunk.")
+        parser.add_argument("--force", action="store_true", help="Run even if a backfill already ran.")
+
+    def handle(self, *args, **options):
+        until = parse_datetime(options["until"])
+        if until is None or until.tzinfo is None:
+            raise CommandError("--until must be an ISO timestamp with a time zone.")
+        done = RollupCheckpoint.objects.filter(name=BACKFILL_CHECKPOINT, position__gt=0).first()
+        if done and not options["force"]:
+            raise CommandError(f"A backfill already ran, up to {done.updated_at:%Y-%m-%d %H:%M}. "
+                               "Running it again counts the views twice, use --force to do it anyway.")
+
+        chunk_size = options["chunk_size"]
+        # Walks the keyset index in time order, so each chunk adds to the rollups of a few hours only.
+        queryset = ContentView.objects.filter(last_viewed__lt=until).order_by("last_viewed", "pk").values_list(
+            "pk", "content_type_id", "object_id", "last_viewed")
+        last = None
+        processed = 0
+        while True:
+            chunk = queryset if last is None else queryset.filter(
+                Q(last_viewed__gt=last[1]) | Q(last_viewed=last[1], pk__gt=last[0]))
+            rows = list(chunk[:chunk_size])
+            if not rows:
+                break
+            tallies = Counter((content_type_id, object_id, hour_bucket(last_viewed))
+                              for _, content_type_id, object_id, last_viewed in rows)
+            # Holds the compaction lock, so both never add to the same rollup rows at once.
+            with locked_checkpoint():
+                fold(tallies)
+            processed += len(rows)
+            last = rows[-1][0], rows[-1][3]
+            self.stdout.write(f"Processed {processed} content views")
+        RollupCheckpoint.objects.update_or_create(name=BACKFILL_CHECKPOINT,
+                                                  defaults={"position": int(until.timestamp())})
+        self.stdout.write(self.style.SUCCESS(f"Backfilled the rollups from {processed} content views"))
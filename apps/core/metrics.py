@@ -0,0 +1,116 @@
+import os
+import re
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest
+from prometheus_client import multiprocess
+
+HTTP_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+UNMATCHED_ROUTE = "<unmatched>"
+CACHE_NAMESPACE = re.compile(r"^[a-z_]{1,32}$")
+
+HTTP_REQUESTS = Counter("http_requests_total", "Requests by route, method and status.",
+                        ["route", "method", "status"])
+HTTP_LATENCY = Histogram("http_request_duration_seconds", "Time to build the response.", ["route", "method"],
+                         buckets=(.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10))
+HTTP_RESPONSE_SIZE = Histogram("http_response_size_bytes", "Size of the response body.", ["route"],
+                               buckets=(100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000))
+DB_QUERIES = Histogram("http_request_db_queries", "Database queries run per request.", ["route"],
+                       buckets=(0, 1, 2, 5, 10, 20, 50, 100, 200))
+DB_DURATION = Histogram("http_request_db_seconds", "Time spent in database queries per request.", ["route"],
+                        buckets=(.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5))
+CACHE_GETS = Counter("cache_gets_total", "Cache reads by key namespace and result.", ["namespace", "result"])
+
+
+class QueryStats:
+    """
+    Database work of the current request.
+    """
+    __slots__ = ("count", "duration")
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+
+# Held in a context variable rather than a thread local, so queries run by ``sync_to_async``
+# on behalf of an async view are counted for the request.
+request_queries = ContextVar("request_queries", default=None)
+
+
+def count_queries(execute, sql, params, many, context):
+    """
+    Database execute wrapper that adds each query to the stats of the current request.
+    """
+    stats = request_queries.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.count += 1
+        stats.duration += time.perf_counter() - started
+
+
+def install_query_metrics(sender, connection, **kwargs):
+    """
+    ``connection_created`` receiver that installs ``count_queries`` on every database connection.
+    """
+    if count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(count_queries)
+
+
+def route_label(request) -> str:
+    """
+    The URL pattern that served the request, which keeps the label set as small as the URLconf.
+    :param request: The HTTP request object.
+    :return: The route label
+    """
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        return UNMATCHED_ROUTE
+    return match.route or match.view_name or UNMATCHED_ROUTE
+
+
+def method_label(request) -> str:
+    return request.method if request.method in HTTP_METHODS else "other"
+
+
+def cache_namespace(key) -> str:
+    """
+    The part of a cache key before the first colon, e.g. ``lockout`` for ``lockout:ip:10.0.0.1``.
+    Keys without a recognisable namespace are grouped, so client data never becomes a label.
+    :param key: The cache key.
+    :return: The namespace label
+    """
+    namespace = str(key).partition(":")[0]
+    return namespace if CACHE_NAMESPACE.match(namespace) and namespace != str(key) else "other"
+
+
+def metrics_registry():
+    """
+    The registry to export. With ``PROMETHEUS_MULTIPROC_DIR`` set, every worker writes its
+    samples to that directory and they are aggregated at scrape time.
+    :return: The registry
+    """
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics_view(request):
+    """
+    Expose the metrics in the Prometheus text format to the addresses in ``METRICS_ALLOWED_IPS``.
+    :param request: The HTTP request object.
+    :return: The HTTP response object
+    """
+    allowed = settings.METRICS_ALLOWED_IPS
+    if "*" not in allowed and request.META.get("REMOTE_ADDR") not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(generate_latest(metrics_registry()), content_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,52 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from .metrics import (DB_DURATION, DB_QUERIES, HTTP_LATENCY, HTTP_REQUESTS, HTTP_RESPONSE_SIZE, QueryStats,
+                      method_label, request_queries, route_label)
+
+
+class PrometheusMiddleware:
+    """
+    Records the latency, response size and database work of every request, labelled by route.
+    It supports both sync and async requests, so async views run without a thread hop.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started, stats = time.perf_counter(), QueryStats()
+        token = request_queries.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_queries.reset(token)
+        self.observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        started, stats = time.perf_counter(), QueryStats()
+        token = request_queries.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            request_queries.reset(token)
+        self.observe(request, response, time.perf_counter() - started, stats)
+        return response
+
+    @staticmethod
+    def observe(request, response, duration, stats):
+        route, method = route_label(request), method_label(request)
+        HTTP_REQUESTS.labels(route, method, response.status_code).inc()
+        HTTP_LATENCY.labels(route, method).observe(duration)
+        if not response.streaming:
+            HTTP_RESPONSE_SIZE.labels(route).observe(len(response.content))
+        DB_QUERIES.labels(route).observe(stats.count)
+        DB_DURATION.labels(route).observe(stats.duration)
@@ -0,0 +1,20 @@
+# Generated by Django 5.2 on 2026-10-17 02:54
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contentview',
+            index=models.Index(fields=['last_viewed', 'id'], name='core_contentview_keyset'),
+        ),
+    ]
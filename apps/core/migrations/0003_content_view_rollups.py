@@ -0,0 +1,85 @@
+# Generated by Django 5.2 on 2026-10-17 03:13
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('contenttypes', '0002_remove_content_type_name'),
+        ('core', '0002_contentview_keyset_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Name')),
+                ('position', models.BigIntegerField(default=0, verbose_name='Position')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Rollup Checkpoint',
+                'verbose_name_plural': 'Rollup Checkpoints',
+            },
+        ),
+        migrations.CreateModel(
+            name='ContentViewTally',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('object_id', models.UUIDField(verbose_name='Object ID')),
+                ('bucket', models.DateTimeField(verbose_name='Hour')),
+                ('views', models.PositiveIntegerField(verbose_name='Views')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='Content Type')),
+            ],
+            options={
+                'verbose_name': 'Content View Tally',
+                'verbose_name_plural': 'Content View Tallies',
+            },
+        ),
+        migrations.CreateModel(
+            name='ContentTypeViewRollup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4, verbose_name='Period')),
+                ('bucket', models.DateTimeField(verbose_name='Bucket')),
+                ('views', models.PositiveBigIntegerField(default=0, verbose_name='Views')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='Content Type')),
+            ],
+            options={
+                'verbose_name': 'Content Type View Rollup',
+                'verbose_name_plural': 'Content Type View Rollups',
+                'ordering': ['-bucket'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['bucket', 'id'], name='core_typerollup_keyset')],
+                'constraints': [models.UniqueConstraint(fields=('content_type', 'period', 'bucket'), name='core_contenttypeviewrollup_unique')],
+            },
+        ),
+        migrations.CreateModel(
+            name='ContentViewRollup',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('period', models.CharField(choices=[('hour', 'Hour'), ('day', 'Day')], max_length=4, verbose_name='Period')),
+                ('bucket', models.DateTimeField(verbose_name='Bucket')),
+                ('views', models.PositiveBigIntegerField(default=0, verbose_name='Views')),
+                ('object_id', models.UUIDField(verbose_name='Object ID')),
+                ('content_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='contenttypes.contenttype', verbose_name='Content Type')),
+            ],
+            options={
+                'verbose_name': 'Content View Rollup',
+                'verbose_name_plural': 'Content View Rollups',
+                'ordering': ['-bucket'],
+                'abstract': False,
+                'indexes': [models.Index(fields=['bucket', 'id'], name='core_viewrollup_keyset')],
+                'constraints': [models.UniqueConstraint(fields=('content_type', 'object_id', 'period', 'bucket'), name='core_contentviewrollup_unique')],
+            },
+        ),
+    ]
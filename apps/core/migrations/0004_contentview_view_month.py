@@ -0,0 +1,39 @@
+from datetime import timezone
+
+from django.db import migrations, models
+from django.db.models.functions import TruncMonth
+
+
+def fill_view_month(apps, schema_editor):
+    ContentView = apps.get_model('core', 'ContentView')
+    ContentView.objects.update(view_month=TruncMonth('last_viewed', output_field=models.DateField(), tzinfo=timezone.utc))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_content_view_rollups'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contentview',
+            name='view_month',
+            field=models.DateField(editable=False, null=True, verbose_name='View month'),
+        ),
+        migrations.RunPython(fill_view_month, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='contentview',
+            name='view_month',
+            field=models.DateField(editable=False, verbose_name='View month'),
+        ),
+        migrations.AlterField(
+            model_name='contentview',
+            name='view_key',
+            field=models.CharField(editable=False, max_length=64, verbose_name='View key'),
+        ),
+        migrations.AddConstraint(
+            model_name='contentview',
+            constraint=models.UniqueConstraint(fields=('view_key', 'view_month'), name='core_contentview_view_unique'),
+        ),
+    ]
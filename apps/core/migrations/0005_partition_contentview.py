@@ -0,0 +1,72 @@
+from datetime import date
+
+from django.db import migrations
+
+TABLE = 'core_contentview'
+PREMAKE_MONTHS = 2
+
+
+def add_months(month, months):
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_content_views(apps, schema_editor):
+    """
+    Rebuild core_contentview on PostgreSQL as a table partitioned by range of view_month, with a
+    partition per month holding rows, the coming months and a default partition. The rows are copied,
+    so this takes a while on large tables. The primary key becomes (id, view_month), as every unique
+    index of a partitioned table must include the partition key; the other constraints and indexes
+    are recreated under their names. Other databases keep a plain table.
+    """
+    connection = schema_editor.connection
+    if connection.vendor != 'postgresql':
+        return
+    quote = connection.ops.quote_name
+    staging = f'{TABLE}_partitioned'
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+                       "WHERE conrelid = %s::regclass", [TABLE])
+        constraints = cursor.fetchall()
+        cursor.execute("SELECT indexname, indexdef FROM pg_indexes WHERE schemaname = current_schema() "
+                       "AND tablename = %s", [TABLE])
+        indexes = [definition for name, definition in cursor.fetchall()
+                   if name not in {constraint[0] for constraint in constraints}]
+        cursor.execute(f"SELECT DISTINCT view_month FROM {quote(TABLE)}")
+        months = {month for month, in cursor.fetchall()}
+        cursor.execute("SELECT date_trunc('month', now() AT TIME ZONE 'UTC')::date")
+        current = cursor.fetchone()[0]
+        months.update(add_months(current, offset) for offset in range(PREMAKE_MONTHS + 1))
+
+        cursor.execute(f"CREATE TABLE {quote(staging)} (LIKE {quote(TABLE)} INCLUDING DEFAULTS) "
+                       f"PARTITION BY RANGE (view_month)")
+        for month in sorted(months):
+            cursor.execute(f"CREATE TABLE {quote(f'{TABLE}_p{month:%Y%m}')} PARTITION OF {quote(staging)} "
+                           f"FOR VALUES FROM (%s) TO (%s)", [month, add_months(month, 1)])
+        cursor.execute(f"CREATE TABLE {quote(f'{TABLE}_default')} PARTITION OF {quote(staging)} DEFAULT")
+        cursor.execute(f"INSERT INTO {quote(staging)} SELECT * FROM {quote(TABLE)}")
+        cursor.execute(f"DROP TABLE {quote(TABLE)}")
+        cursor.execute(f"ALTER TABLE {quote(staging)} RENAME TO {quote(TABLE)}")
+
+        for name, kind, definition in constraints:
+            if kind == 'p':
+                definition = 'PRIMARY KEY (id, view_month)'
+            cursor.execute(f"ALTER TABLE {quote(TABLE)} ADD CONSTRAINT {quote(name)} {definition}")
+        for definition in indexes:
+            cursor.execute(definition)
+
+
+def refuse_on_postgresql(apps, schema_editor):
+    if schema_editor.connection.vendor == 'postgresql':
+        raise NotImplementedError("core_contentview stays partitioned, restore it from a backup to go back.")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_contentview_view_month'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_content_views, refuse_on_postgresql),
+    ]
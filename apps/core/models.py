@@ -1,16 +1,86 @@
+import hashlib
 import uuid
+from datetime import timezone as dt_timezone
 
 from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
-from django.db import models, IntegrityError
+from django.db import models
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
+from .buffers import get_view_buffer
+
 # Create your models here.
 
 
 
+class DirtyFieldsMixin(models.Model):
+    """
+    Abstract model that remembers the values loaded from the database,
+    so saves and signals can tell which fields actually changed.
+    """
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.mark_clean()
+        return instance
+
+    def _tracked_values(self, fields=None):
+        values = {}
+        for field in self._meta.concrete_fields:
+            if fields is not None and field.name not in fields and field.attname not in fields:
+                continue
+            # Deferred fields are not loaded, so they cannot be dirty either.
+            if field.attname in self.__dict__:
+                values[field.name] = self.__dict__[field.attname]
+        return values
+
+    def mark_clean(self, fields=None):
+        """
+        Treat the current values as the stored ones.
+        :param fields: Only mark these fields, all loaded fields by default.
+        :return: None
+        """
+        if fields is None or "_loaded_values" not in self.__dict__:
+            self._loaded_values = {}
+        self._loaded_values.update(self._tracked_values(fields))
+
+    def get_dirty_fields(self):
+        """
+        Return the fields changed since the instance was loaded or last saved.
+        New instances report every field.
+        :return: Mapping of field names to their stored values
+        """
+        loaded = self.__dict__.get("_loaded_values")
+        if loaded is None:
+            return dict.fromkeys(self._tracked_values())
+        return {
+            name: loaded[name] for name, value in self._tracked_values().items()
+            if name not in loaded or loaded[name] != value
+        }
+
+    def is_dirty(self, *fields):
+        """
+        Check if any of the fields changed. Without arguments, checks every field.
+        :return: True if a field changed, False otherwise
+        """
+        dirty = self.get_dirty_fields()
+        return bool(dirty) if not fields else any(field in dirty for field in fields)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.mark_clean(kwargs.get("update_fields"))
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using=using, fields=fields, from_queryset=from_queryset)
+        self.mark_clean(fields)
+
+
 class TimeStampedModel(models.Model):
     """
     Abstract base model that provides created_at and updated_at fields.
@@ -25,7 +95,8 @@ class TimeStampedModel(models.Model):
 
 class ContentView(TimeStampedModel):
     """
-    Model to track content views.
+    Model to track content views: the last view of each viewer of an object, per month.
+    On PostgreSQL the table is partitioned by ``view_month``, see ``apps.core.retention``.
     """
     content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name=_('Content Type'))
     object_id = models.UUIDField(verbose_name=_('Object ID'))
@@ -33,12 +104,45 @@ class ContentView(TimeStampedModel):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, blank=True, null=True, verbose_name=_('User'))
     ip_address = models.GenericIPAddressField(verbose_name=_('IP Address'), blank=True, null=True)
     last_viewed = models.DateTimeField()
+    # First day of the UTC month of last_viewed. It never changes once the row exists, so it can
+    # be the partition key, and the retention drops whole months.
+    view_month = models.DateField(verbose_name=_('View month'), editable=False)
+    # Digest of (content_type, object_id, user, ip_address). Unlike a composite unique index it
+    # never contains NULLs, so anonymous views collide too and can be bulk upserted on any database.
+    view_key = models.CharField(verbose_name=_('View key'), max_length=64, editable=False)
 
     class Meta:
         verbose_name = _('Content View')
         verbose_name_plural = _('Content Views')
         ordering = ['-last_viewed']
-        unique_together = ('content_type', 'object_id', 'user', 'ip_address')
+        # Keyset of the default ordering, scanned backwards for most recent first.
+        indexes = [models.Index(fields=['last_viewed', 'id'], name='core_contentview_keyset')]
+        # Includes the partition key, as every unique index of a partitioned table must.
+        constraints = [models.UniqueConstraint(fields=['view_key', 'view_month'], name='core_contentview_view_unique')]
+
+    @staticmethod
+    def month_of(moment):
+        """
+        :param moment: An aware datetime.
+        :return: The first day of its UTC month
+        """
+        return moment.astimezone(dt_timezone.utc).date().replace(day=1)
+
+    @staticmethod
+    def make_view_key(content_type_id, object_id, user_id=None, ip_address=None):
+        """
+        Build the unique key of a (content, viewer) pair.
+        :return: Hex digest of the pair
+        """
+        raw = f"{content_type_id}|{object_id}|{user_id or ''}|{ip_address or ''}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    def save(self, *args, **kwargs):
+        if not self.view_key:
+            self.view_key = self.make_view_key(self.content_type_id, self.object_id, self.user_id, self.ip_address)
+        if not self.view_month:
+            self.view_month = self.month_of(self.last_viewed)
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return (
@@ -49,22 +153,106 @@ class ContentView(TimeStampedModel):
     def record_view(cls, content_object, user=None, ip_address=None):
         """
         Record a view for a content object.
+        The view goes through the configured view buffer, which may write it later in bulk.
         :param content_object: The content object being viewed.
         :param user: The user viewing the content (optional).
         :param ip_address: The IP address of the viewer (optional).
         """
         content_type = ContentType.objects.get_for_model(content_object)
-        try:
-            view, create = cls.objects.get_or_create(
-                content_type=content_type,
-                object_id=content_object.id,
-                user=user,
-                ip_address=ip_address,
-                defaults={'last_viewed': timezone.now()}
-            )
-            if not create:
-                view.last_viewed = timezone.now()
-                view.save(update_fields=['last_viewed'])
-
-        except IntegrityError:
-            pass
\ No newline at end of file
+        get_view_buffer().record(
+            content_type.pk,
+            content_object.id,
+            getattr(user, 'pk', None),
+            ip_address,
+            timezone.now(),
+        )
+
+
+class ContentViewTally(models.Model):
+    """
+    View counts of one object in one hour, written by the view buffers on every flush.
+    Rows are append-only and are folded into the rollups, then deleted, by ``compact_content_views``.
+    """
+    id = models.BigAutoField(primary_key=True)
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name=_('Content Type'))
+    object_id = models.UUIDField(verbose_name=_('Object ID'))
+    bucket = models.DateTimeField(verbose_name=_('Hour'))
+    views = models.PositiveIntegerField(verbose_name=_('Views'))
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = _('Content View Tally')
+        verbose_name_plural = _('Content View Tallies')
+
+
+class RollupPeriod(models.TextChoices):
+    HOUR = "hour", _("Hour")
+    DAY = "day", _("Day")
+
+
+class BaseViewRollup(TimeStampedModel):
+    """
+    Abstract number of views in an hour or a day, see ``apps.core.rollups``.
+    """
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, verbose_name=_('Content Type'))
+    period = models.CharField(verbose_name=_('Period'), max_length=4, choices=RollupPeriod.choices)
+    bucket = models.DateTimeField(verbose_name=_('Bucket'))
+    views = models.PositiveBigIntegerField(verbose_name=_('Views'), default=0)
+
+    class Meta:
+        abstract = True
+        ordering = ['-bucket']
+
+
+class ContentViewRollup(BaseViewRollup):
+    """
+    Views of one object per hour or per day.
+    """
+    object_id = models.UUIDField(verbose_name=_('Object ID'))
+
+    class Meta(BaseViewRollup.Meta):
+        verbose_name = _('Content View Rollup')
+        verbose_name_plural = _('Content View Rollups')
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'object_id', 'period', 'bucket'],
+                                    name='core_contentviewrollup_unique'),
+        ]
+        # Keyset of the default ordering, for the admin changelist.
+        indexes = [models.Index(fields=['bucket', 'id'], name='core_viewrollup_keyset')]
+
+    def __str__(self):
+        return f"{self.content_type} {self.object_id} {self.period} {self.bucket:%Y-%m-%d %H:%M}: {self.views}"
+
+
+class ContentTypeViewRollup(BaseViewRollup):
+    """
+    Views of every object of a content type per hour or per day.
+    """
+
+    class Meta(BaseViewRollup.Meta):
+        verbose_name = _('Content Type View Rollup')
+        verbose_name_plural = _('Content Type View Rollups')
+        constraints = [
+            models.UniqueConstraint(fields=['content_type', 'period', 'bucket'], name='core_contenttypeviewrollup_unique'),
+        ]
+        indexes = [models.Index(fields=['bucket', 'id'], name='core_typerollup_keyset')]
+
+    def __str__(self):
+        return f"{self.content_type} {self.period} {self.bucket:%Y-%m-%d %H:%M}: {self.views}"
+
+
+class RollupCheckpoint(models.Model):
+    """
+    High-water mark of a rollup job: the last ``ContentViewTally`` id it folded.
+    The row is locked while folding, so compactions and backfills never run concurrently.
+    """
+    name = models.CharField(verbose_name=_('Name'), max_length=50, unique=True)
+    position = models.BigIntegerField(verbose_name=_('Position'), default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = _('Rollup Checkpoint')
+        verbose_name_plural = _('Rollup Checkpoints')
+
+    def __str__(self):
+        return f"{self.name}: {self.position}"
@@ -0,0 +1,95 @@
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .paginator import Keyset, estimate_count
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination on an indexed keyset, e.g. ``(date_joined, id)`` for users.
+    Pages cost the same however deep they are. Views may set ``keyset_ordering``, otherwise the
+    queryset or model ordering is used. The count is estimated on large tables.
+    """
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = "page_size"
+    max_page_size = 100
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        ordering = getattr(view, "keyset_ordering", None)
+        if ordering:
+            queryset = queryset.order_by(*ordering)
+        self.keyset = Keyset.for_queryset(queryset)
+        if self.keyset is None:
+            # e.g. an ``?ordering=`` on a nullable or related field: fall back to the model ordering.
+            queryset = queryset.order_by(*queryset.model._meta.ordering)
+            self.keyset = Keyset.for_queryset(queryset)
+        if self.keyset is None:
+            raise ImproperlyConfigured(f"{queryset.model.__name__} ordering cannot be used as a keyset.")
+        page_size = self.get_page_size(request)
+
+        self.count = estimate_count(queryset)
+        cursor, reverse = request.query_params.get(self.cursor_query_param), False
+        if cursor:
+            try:
+                values, reverse = self.keyset.decode(cursor)
+            except ValueError:
+                raise NotFound(self.invalid_cursor_message)
+            queryset = queryset.filter(self.keyset.after(values, reverse))
+        ordered = queryset.order_by(*(self.keyset.reversed_ordering if reverse else self.keyset.ordering))
+        rows = list(ordered[:page_size + 1])
+        has_more, rows = len(rows) > page_size, rows[:page_size]
+        if reverse:
+            rows.reverse()
+        self.has_next = has_more if not reverse else True
+        self.has_previous = bool(cursor) if not reverse else has_more
+        self.first, self.last = (rows[0], rows[-1]) if rows else (None, None)
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_link(self, obj, reverse):
+        if obj is None:
+            return None
+        return replace_query_param(self.base_url, self.cursor_query_param,
+                                   self.keyset.encode(self.keyset.values(obj), reverse))
+
+    def get_next_link(self):
+        return self.get_link(self.last, reverse=False) if self.has_next else None
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.get_link(self.first, reverse=True) or remove_query_param(self.base_url, self.cursor_query_param)
+
+    def get_paginated_response(self, data):
+        return Response({
+            "count": self.count,
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "count": {"type": "integer", "description": "Exact below the estimate threshold, estimated above."},
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
@@ -0,0 +1,173 @@
+import base64
+import binascii
+import datetime
+import json
+from functools import cached_property
+from typing import Optional
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.db.models import Q
+
+
+def estimate_count(queryset, threshold=None) -> int:
+    """
+    Count the rows of a queryset, estimating on Postgres once the table is large.
+    An unfiltered queryset reads the table estimate kept by ANALYZE in ``pg_class.reltuples``,
+    a filtered one the row estimate of the planner. Below ``threshold`` rows both are counted exactly.
+    :param queryset: The queryset.
+    :param threshold: Table size from which counts are estimated, ``PAGINATION_ESTIMATE_THRESHOLD`` by default.
+    :return: The exact or estimated count
+    """
+    threshold = settings.PAGINATION_ESTIMATE_THRESHOLD if threshold is None else threshold
+    connection = connections[queryset.db]
+    if connection.vendor != "postgresql" or queryset.query.is_sliced or queryset.query.distinct:
+        return queryset.count()
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass",
+                       [connection.ops.quote_name(queryset.model._meta.db_table)])
+        row = cursor.fetchone()
+        # reltuples is -1 until the table is first analyzed.
+        if row is None or row[0] < threshold:
+            return queryset.count()
+        if not queryset.query.where:
+            return row[0]
+        sql, params = queryset.values("pk").query.sql_with_params()
+        cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]["Plan"]["Plan Rows"])
+
+
+class CursorEncoder(DjangoJSONEncoder):
+    """
+    Keeps microseconds, which ``DjangoJSONEncoder`` drops, so cursors seek past the exact key.
+    """
+
+    def default(self, o):
+        if isinstance(o, (datetime.datetime, datetime.time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class Keyset:
+    """
+    An ordering on non-null local fields ending with a unique one, so each row has a distinct key
+    and a page can start right after the key of the previous one instead of at an OFFSET.
+    """
+
+    def __init__(self, model, ordering):
+        self.model = model
+        self.fields = []
+        for name in ordering:
+            descending = name.startswith("-")
+            name = name.lstrip("-")
+            field = model._meta.pk if name == "pk" else model._meta.get_field(name)
+            self.fields.append((field, descending))
+
+    @classmethod
+    def for_queryset(cls, queryset) -> Optional["Keyset"]:
+        """
+        Build the keyset of the queryset ordering, appending the primary key when needed.
+        :param queryset: The queryset.
+        :return: The keyset, None if the ordering cannot be used as one
+        """
+        query = queryset.query
+        ordering = list(query.order_by or (queryset.model._meta.ordering if query.default_ordering else []))
+        if not all(isinstance(name, str) and "__" not in name and name.lstrip("-") != "?" for name in ordering):
+            return None
+        try:
+            keyset = cls(queryset.model, ordering)
+        except FieldDoesNotExist:
+            return None
+        if not keyset.fields or not keyset.fields[-1][0].unique:
+            keyset.fields.append((queryset.model._meta.pk, bool(keyset.fields) and keyset.fields[0][1]))
+        if any(field.null or not field.concrete or field.is_relation for field, _ in keyset.fields):
+            return None
+        return keyset
+
+    @property
+    def ordering(self):
+        return [f"-{field.name}" if descending else field.name for field, descending in self.fields]
+
+    @property
+    def reversed_ordering(self):
+        return [field.name if descending else f"-{field.name}" for field, descending in self.fields]
+
+    def values(self, obj) -> list:
+        return [getattr(obj, field.attname) for field, _ in self.fields]
+
+    def after(self, values, reverse=False) -> Q:
+        """
+        Filter the rows after the key in this ordering, or before it when ``reverse``.
+        The leading non-strict bound on the first field gives the database an index range to scan.
+        :param values: The key.
+        :param reverse: Seek backwards.
+        :return: The filter
+        """
+        condition = None
+        for (field, descending), value in reversed(list(zip(self.fields, values))):
+            lookup = "lt" if descending != reverse else "gt"
+            strict = Q(**{f"{field.name}__{lookup}": value})
+            condition = strict if condition is None else strict | (Q(**{field.name: value}) & condition)
+        (first, descending), value = self.fields[0], values[0]
+        return Q(**{f"{first.name}__{'lt' if descending != reverse else 'gt'}e": value}) & condition
+
+    def encode(self, values, reverse=False) -> str:
+        payload = json.dumps({"k": values, "r": reverse}, cls=CursorEncoder, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+    def decode(self, cursor):
+        """
+        Decode a cursor made by ``encode``.
+        :param cursor: The cursor.
+        :return: Tuple of the key and the direction
+        :raises ValueError: If the cursor is malformed
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+            values, reverse = payload["k"], bool(payload["r"])
+        except (binascii.Error, UnicodeDecodeError, TypeError, KeyError, json.JSONDecodeError) as e:
+            raise ValueError(e)
+        if not isinstance(values, list) or len(values) != len(self.fields):
+            raise ValueError("Wrong key length")
+        try:
+            return [field.to_python(value) for (field, _), value in zip(self.fields, values)], reverse
+        except Exception as e:
+            raise ValueError(e)
+
+
+class KeysetPaginator(Paginator):
+    """
+    Admin paginator for large tables. The count is estimated, and a page is fetched by finding the
+    key of the row before it with a narrow query and seeking past it, so only keys are skipped
+    instead of whole rows. Orderings that are not a keyset fall back to OFFSET.
+    """
+
+    @cached_property
+    def count(self):
+        return estimate_count(self.object_list)
+
+    def page(self, number):
+        # Estimated counts may be off, so pages past the estimate are empty instead of invalid.
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages["invalid_page"])
+        if number < 1:
+            raise EmptyPage(self.error_messages["min_page"])
+        bottom = (number - 1) * self.per_page
+        keyset = Keyset.for_queryset(self.object_list)
+        if keyset is None or bottom == 0:
+            rows = list(self.object_list[bottom:bottom + self.per_page])
+        else:
+            names = [field.name for field, _ in keyset.fields]
+            boundary = self.object_list.values_list(*names)[bottom - 1:bottom]
+            boundary = boundary[0] if boundary else None
+            rows = [] if boundary is None else list(
+                self.object_list.filter(keyset.after(list(boundary)))[:self.per_page])
+        return self._get_page(rows, number, self)
@@ -0,0 +1,12 @@
+from rest_framework.permissions import BasePermission
+
+
+class HasAllowedRole(BasePermission):
+    """
+    Allows users whose role is in the ``allowed_roles`` of the view.
+    The role is a token claim, so the check does not load the user.
+    """
+
+    def has_permission(self, request, view):
+        return bool(request.user and request.user.is_authenticated
+                    and any(request.user.has_role(role) for role in getattr(view, "allowed_roles", ())))
@@ -0,0 +1,234 @@
+"""
+Retention of ``ContentView`` rows.
+
+Rows are kept for ``CONTENT_VIEW_RETENTION["MONTHS"]`` months, the current one included, and are
+removed a whole ``view_month`` at a time, optionally archived first to one gzipped JSON lines file
+per month. On PostgreSQL the table is partitioned by ``view_month`` (migration 0005), so expired
+months are detached and dropped; elsewhere they are deleted in chunks.
+"""
+import gzip
+import json
+import re
+from datetime import date, datetime, timezone as dt_timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+from loguru import logger
+
+from .models import ContentView
+
+ARCHIVE_FIELDS = ("id", "content_type_id", "object_id", "user_id", "ip_address", "last_viewed", "view_month",
+                  "view_key", "created_at", "updated_at")
+PARTITION_NAME = re.compile(r"_p(\d{4})(\d{2})$")
+
+
+def add_months(month, months) -> date:
+    """
+    :param month: The first day of a month.
+    :param months: Months to add, may be negative.
+    :return: The first day of the resulting month
+    """
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def retention_start(now=None, months=None) -> date:
+    """
+    :param now: The current time, defaults to now.
+    :param months: Retained months, defaults to ``CONTENT_VIEW_RETENTION["MONTHS"]``.
+    :return: The first retained ``view_month``
+    """
+    months = months or settings.CONTENT_VIEW_RETENTION["MONTHS"]
+    return add_months(ContentView.month_of(now or timezone.now()), 1 - months)
+
+
+class ViewArchive:
+    """
+    Appends content views to one gzipped JSON lines file per month. Each write adds a gzip member,
+    so a month archived in several runs still reads as one file.
+    """
+
+    def __init__(self, directory):
+        self.directory = Path(directory)
+
+    def path(self, month) -> Path:
+        return self.directory / f"content_views-{month:%Y-%m}.jsonl.gz"
+
+    def write(self, month, rows) -> int:
+        """
+        :param month: The ``view_month`` of the rows.
+        :param rows: Tuples of the ``ARCHIVE_FIELDS`` values.
+        :return: Number of archived rows
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        count = 0
+        with gzip.open(self.path(month), "at", encoding="utf-8") as file:
+            for row in rows:
+                file.write(json.dumps(dict(zip(ARCHIVE_FIELDS, row)), cls=DjangoJSONEncoder) + "\n")
+                count += 1
+        return count
+
+
+class ChunkedDeleteRetention:
+    """
+    Deletes expired content views in chunks, oldest first along the keyset index, archiving each
+    chunk before deleting it. Rows are archived at least once: a run interrupted between the two
+    archives the chunk again on the next run.
+    """
+
+    def __init__(self, months=None, archive=None, chunk_size=None):
+        options = settings.CONTENT_VIEW_RETENTION
+        self.months = months or options["MONTHS"]
+        self.archive = archive if archive is not None else (
+            ViewArchive(options["ARCHIVE_DIR"]) if options["ARCHIVE"] else None)
+        self.chunk_size = chunk_size or options["CHUNK_SIZE"]
+
+    def prepare(self, now=None) -> list:
+        """
+        Get storage ready for the coming months.
+        :param now: The current time, defaults to now.
+        :return: Names of the created partitions
+        """
+        return []
+
+    def prune(self, now=None) -> int:
+        """
+        Remove the content views of the months before the retained window.
+        :param now: The current time, defaults to now.
+        :return: Number of removed rows
+        """
+        start = retention_start(now, self.months)
+        # view_month is the month of last_viewed, so this is view_month < start on the keyset index.
+        cutoff = datetime(start.year, start.month, 1, tzinfo=dt_timezone.utc)
+        queryset = ContentView.objects.filter(last_viewed__lt=cutoff).order_by("last_viewed", "id")
+        removed = 0
+        while True:
+            rows = list(queryset.values_list(*ARCHIVE_FIELDS)[:self.chunk_size])
+            if not rows:
+                return removed
+            if self.archive is not None:
+                months = {}
+                for row in rows:
+                    months.setdefault(row[6], []).append(row)
+                for month, month_rows in months.items():
+                    self.archive.write(month, month_rows)
+            ContentView.objects.filter(pk__in=[row[0] for row in rows]).delete()
+            removed += len(rows)
+
+
+class PartitionRetention(ChunkedDeleteRetention):
+    """
+    Keeps a partition per ``view_month`` on PostgreSQL: creates the partitions of the coming months
+    ahead of time and drops the expired ones, after streaming them to the archive. Rows left in the
+    default partition, and tables that are not partitioned, fall back to the chunked delete.
+    """
+
+    @property
+    def table(self) -> str:
+        return ContentView._meta.db_table
+
+    def partitioned(self) -> bool:
+        """
+        :return: True if the table is a partitioned PostgreSQL table
+        """
+        if connection.vendor != "postgresql":
+            return False
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)", [self.table])
+            row = cursor.fetchone()
+        return bool(row) and row[0] == "p"
+
+    def partitions(self) -> dict:
+        """
+        :return: Partition name by the month it holds, the default partition left out
+        """
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT child.relname FROM pg_inherits JOIN pg_class child ON child.oid = inhrelid "
+                           "WHERE inhparent = to_regclass(%s)", [self.table])
+            names = [name for name, in cursor.fetchall()]
+        partitions = {}
+        for name in names:
+            match = PARTITION_NAME.search(name)
+            if match:
+                partitions[date(int(match[1]), int(match[2]), 1)] = name
+        return partitions
+
+    def create_partition(self, month) -> str:
+        """
+        Create the partition of a month. Rows of that month already in the default partition are
+        moved into it, as PostgreSQL refuses the partition otherwise.
+        :param month: The first day of the month.
+        :return: The partition name
+        """
+        quote = connection.ops.quote_name
+        name = f"{self.table}_p{month:%Y%m}"
+        default = f"{self.table}_default"
+        bounds = [month, add_months(month, 1)]
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [default])
+            has_default = cursor.fetchone()[0]
+            if has_default:
+                cursor.execute(f"SELECT EXISTS (SELECT 1 FROM {quote(default)} "
+                               f"WHERE view_month >= %s AND view_month < %s)", bounds)
+                has_default = cursor.fetchone()[0]
+            if has_default:
+                cursor.execute(f"ALTER TABLE {quote(self.table)} DETACH PARTITION {quote(default)}")
+            cursor.execute(f"CREATE TABLE {quote(name)} PARTITION OF {quote(self.table)} "
+                           f"FOR VALUES FROM (%s) TO (%s)", bounds)
+            if has_default:
+                cursor.execute(f"WITH moved AS (DELETE FROM {quote(default)} WHERE view_month >= %s "
+                               f"AND view_month < %s RETURNING *) INSERT INTO {quote(self.table)} SELECT * FROM moved",
+                               bounds)
+                cursor.execute(f"ALTER TABLE {quote(self.table)} ATTACH PARTITION {quote(default)} DEFAULT")
+        return name
+
+    def prepare(self, now=None) -> list:
+        if not self.partitioned():
+            return []
+        current = ContentView.month_of(now or timezone.now())
+        existing = self.partitions()
+        created = []
+        for offset in range(settings.CONTENT_VIEW_RETENTION["PREMAKE_MONTHS"] + 1):
+            month = add_months(current, offset)
+            if month not in existing:
+                created.append(self.create_partition(month))
+        return created
+
+    def prune(self, now=None) -> int:
+        if not self.partitioned():
+            return super().prune(now)
+        quote = connection.ops.quote_name
+        start = retention_start(now, self.months)
+        removed = 0
+        for month, name in sorted(self.partitions().items()):
+            if month >= start:
+                continue
+            rows = ContentView.objects.filter(view_month=month).values_list(*ARCHIVE_FIELDS)
+            if self.archive is not None:
+                removed += self.archive.write(month, rows.iterator(chunk_size=self.chunk_size))
+            else:
+                removed += rows.count()
+            with connection.cursor() as cursor:
+                cursor.execute(f"ALTER TABLE {quote(self.table)} DETACH PARTITION {quote(name)}")
+                cursor.execute(f"DROP TABLE {quote(name)}")
+            logger.info(f"Dropped content view partition {name}")
+        return removed + super().prune(now)
+
+
+_engines = {}
+
+
+def get_retention_engine() -> ChunkedDeleteRetention:
+    """
+    Return the retention engine configured in ``CONTENT_VIEW_RETENTION``.
+    :return: The configured retention engine
+    """
+    path = settings.CONTENT_VIEW_RETENTION["BACKEND"]
+    engine = _engines.get(path)
+    if engine is None:
+        engine = _engines[path] = import_string(path)()
+    return engine
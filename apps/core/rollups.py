@@ -0,0 +1,169 @@
+"""
+Hourly and daily view counts per object and per content type.
+
+The view buffers write the number of views per object and hour to ``ContentViewTally`` on every
+flush. ``compact`` folds the tallies past the checkpoint into ``ContentViewRollup`` and
+``ContentTypeViewRollup`` and deletes them, so trend queries read a few rollup rows instead of
+scanning ``ContentView``, which only keeps the last view of each viewer per month.
+"""
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ContentTypeViewRollup, ContentViewRollup, ContentViewTally, RollupCheckpoint, RollupPeriod
+
+CHECKPOINT = "content_views"
+
+
+def hour_bucket(moment):
+    """
+    :param moment: An aware datetime.
+    :return: The start of its hour in UTC
+    """
+    return moment.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def day_bucket(moment):
+    """
+    :param moment: An aware datetime.
+    :return: The start of its day in UTC
+    """
+    return hour_bucket(moment).replace(hour=0)
+
+
+def write_tallies(tallies) -> int:
+    """
+    Append buffered view counts to the tallies.
+    :param tallies: Mapping of ``(content_type_id, object_id, hour)`` to the number of views.
+    :return: Number of written rows
+    """
+    ContentViewTally.objects.bulk_create([
+        ContentViewTally(content_type_id=content_type_id, object_id=object_id, bucket=bucket, views=views)
+        for (content_type_id, object_id, bucket), views in tallies.items()
+    ], batch_size=settings.CONTENT_VIEW_ROLLUPS["CHUNK_SIZE"])
+    return len(tallies)
+
+
+def _add(model, counts, key_fields):
+    """
+    Add view counts to the rollup rows of a model, creating the missing ones.
+    :param model: ``ContentViewRollup`` or ``ContentTypeViewRollup``.
+    :param counts: Mapping of the ``key_fields`` values to the views to add.
+    :param key_fields: The unique fields of the model, the content type first and the period and bucket last.
+    """
+    groups = defaultdict(list)
+    for key in counts:
+        groups[key[0], key[-2]].append(key)
+    existing = {}
+    # One query per content type and period. Tallies are folded in the order they were written, so
+    # the buckets of a chunk span a few hours and the objects times buckets product stays small.
+    for (content_type_id, period), keys in groups.items():
+        lookup = {"content_type_id": content_type_id, "period": period, "bucket__in": {key[-1] for key in keys}}
+        if "object_id" in key_fields:
+            lookup["object_id__in"] = {key[1] for key in keys}
+        for rollup in model.objects.filter(**lookup):
+            existing[tuple(getattr(rollup, field) for field in key_fields)] = rollup
+    now = timezone.now()
+    updated, created = [], []
+    for key, views in counts.items():
+        rollup = existing.get(key)
+        if rollup is None:
+            created.append(model(views=views, **dict(zip(key_fields, key))))
+        else:
+            # bulk_update does not touch auto_now fields.
+            rollup.views, rollup.updated_at = rollup.views + views, now
+            updated.append(rollup)
+    model.objects.bulk_update(updated, ["views", "updated_at"], batch_size=1000)
+    model.objects.bulk_create(created, batch_size=1000)
+
+
+def fold(tallies):
+    """
+    Add hourly view counts to the hourly and daily rollups of the objects and their content types.
+    Must run inside ``locked_checkpoint``.
+    :param tallies: Mapping of ``(content_type_id, object_id, hour)`` to the number of views.
+    """
+    objects, types = Counter(), Counter()
+    for (content_type_id, object_id, bucket), views in tallies.items():
+        for period, start in ((RollupPeriod.HOUR, bucket), (RollupPeriod.DAY, day_bucket(bucket))):
+            objects[content_type_id, object_id, period.value, start] += views
+            types[content_type_id, period.value, start] += views
+    _add(ContentViewRollup, objects, ("content_type_id", "object_id", "period", "bucket"))
+    _add(ContentTypeViewRollup, types, ("content_type_id", "period", "bucket"))
+
+
+@contextmanager
+def locked_checkpoint():
+    """
+    Open a transaction holding the lock of the checkpoint row, so only one job folds at a time.
+    :return: The checkpoint
+    """
+    with transaction.atomic():
+        RollupCheckpoint.objects.get_or_create(name=CHECKPOINT)
+        yield RollupCheckpoint.objects.select_for_update().get(name=CHECKPOINT)
+
+
+def compact(chunk_size=None, settle=None) -> int:
+    """
+    Fold the tallies past the checkpoint into the rollups, one chunk per transaction, and delete them.
+    A run stops at the first tally younger than the settle time and leaves it and every later id for
+    the next run: ids are allocated before commit, so a slow flush may still commit a lower id than
+    one already visible, and ``created_at`` is set before the insert, so it does not follow the ids.
+    :param chunk_size: Tallies per transaction, defaults to ``CONTENT_VIEW_ROLLUPS["CHUNK_SIZE"]``.
+    :param settle: Seconds a tally waits before it is folded, defaults to ``CONTENT_VIEW_ROLLUPS["SETTLE"]``.
+    :return: Number of folded tallies
+    """
+    options = settings.CONTENT_VIEW_ROLLUPS
+    chunk_size = chunk_size or options["CHUNK_SIZE"]
+    settle = options["SETTLE"] if settle is None else settle
+    cutoff = timezone.now() - timedelta(seconds=settle)
+    folded = 0
+    while True:
+        with locked_checkpoint() as checkpoint:
+            rows = list(
+                ContentViewTally.objects
+                .filter(id__gt=checkpoint.position)
+                .order_by("id")
+                .values_list("id", "content_type_id", "object_id", "bucket", "views", "created_at")[:chunk_size]
+            )
+            settled = next((index for index, row in enumerate(rows) if row[-1] > cutoff), len(rows))
+            unsettled, rows = settled < len(rows), rows[:settled]
+            if not rows:
+                return folded
+            tallies = Counter()
+            for _, content_type_id, object_id, bucket, views, _created_at in rows:
+                tallies[content_type_id, object_id, bucket] += views
+            fold(tallies)
+            checkpoint.position = rows[-1][0]
+            checkpoint.save(update_fields=["position", "updated_at"])
+            ContentViewTally.objects.filter(id__in=[row[0] for row in rows]).delete()
+        folded += len(rows)
+        if unsettled or len(rows) < chunk_size:
+            return folded
+
+
+def trend(content_type, object_id=None, period=RollupPeriod.DAY, since=None, until=None) -> list:
+    """
+    Views per bucket of an object, or of every object of a content type, from the rollups.
+    Buckets without views are left out.
+    :param content_type: The content type.
+    :param object_id: The object, all objects of the content type when None.
+    :param period: ``hour`` or ``day``.
+    :param since: First bucket to include, inclusive.
+    :param until: Last moment to include, exclusive.
+    :return: ``(bucket, views)`` tuples, oldest first
+    """
+    if object_id is None:
+        queryset = ContentTypeViewRollup.objects.filter(content_type=content_type)
+    else:
+        queryset = ContentViewRollup.objects.filter(content_type=content_type, object_id=object_id)
+    queryset = queryset.filter(period=period)
+    if since is not None:
+        queryset = queryset.filter(bucket__gte=since)
+    if until is not None:
+        queryset = queryset.filter(bucket__lt=until)
+    return list(queryset.order_by("bucket").values_list("bucket", "views"))
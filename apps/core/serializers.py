@@ -0,0 +1,40 @@
+from datetime import timedelta
+
+from django.contrib.contenttypes.models import ContentType
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from rest_framework import serializers
+
+from .models import RollupPeriod
+
+# Window of a trend query without ``since``, by period.
+DEFAULT_TREND_WINDOW = {RollupPeriod.HOUR: timedelta(hours=48), RollupPeriod.DAY: timedelta(days=30)}
+
+
+class ContentViewTrendQuerySerializer(serializers.Serializer):
+    """
+    Query parameters of the content view trend API.
+    """
+    content_type = serializers.CharField(help_text=_("The content type as app_label.model, e.g. account.profile."))
+    object_id = serializers.UUIDField(required=False, help_text=_("One object; all objects of the type if omitted."))
+    period = serializers.ChoiceField(choices=RollupPeriod.choices, default=RollupPeriod.DAY)
+    since = serializers.DateTimeField(required=False)
+    until = serializers.DateTimeField(required=False)
+
+    def validate_content_type(self, value):
+        try:
+            return ContentType.objects.get_by_natural_key(*value.lower().split(".", 1))
+        except (TypeError, ValueError, ContentType.DoesNotExist):
+            raise serializers.ValidationError(_("Unknown content type."))
+
+    def validate(self, attrs):
+        attrs.setdefault("until", timezone.now())
+        attrs.setdefault("since", attrs["until"] - DEFAULT_TREND_WINDOW[attrs["period"]])
+        if attrs["since"] >= attrs["until"]:
+            raise serializers.ValidationError({"since": _("Must be before until.")})
+        return attrs
+
+
+class ViewBucketSerializer(serializers.Serializer):
+    bucket = serializers.DateTimeField()
+    views = serializers.IntegerField()
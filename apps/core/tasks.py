@@ -0,0 +1,38 @@
+from celery import shared_task
+from loguru import logger
+
+from .buffers import get_view_buffer
+from .retention import get_retention_engine
+from .rollups import compact
+
+
+@shared_task(ignore_result=True)
+def flush_content_views():
+    """
+    Flush buffered content views to the database.
+    """
+    written = get_view_buffer().flush()
+    if written:
+        logger.info(f"Flushed {written} content views")
+
+
+@shared_task(ignore_result=True)
+def compact_content_views():
+    """
+    Fold the view tallies into the hourly and daily rollups.
+    """
+    folded = compact()
+    if folded:
+        logger.info(f"Folded {folded} content view tallies into the rollups")
+
+
+@shared_task(ignore_result=True)
+def prune_content_views():
+    """
+    Create the content view partitions of the coming months and remove the expired ones.
+    """
+    engine = get_retention_engine()
+    created = engine.prepare()
+    removed = engine.prune()
+    if created or removed:
+        logger.info(f"Created partitions {created}, removed {removed} expired content views")
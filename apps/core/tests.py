@@ -1,3 +1,417 @@
-from django.test import TestCase
+import gc
+import gzip
+import json
+import tempfile
+import uuid
+from datetime import datetime, timedelta, timezone as dt_timezone
+from types import SimpleNamespace
+from unittest import mock
+
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib import admin
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import caches
+from django.http import HttpResponse, HttpResponseNotFound
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import resolve, reverse
+from django.utils import timezone
+from prometheus_client import REGISTRY
+from rest_framework import serializers
+from rest_framework.generics import ListAPIView
+from rest_framework.permissions import AllowAny
+from rest_framework.test import APIRequestFactory
+
+from apps.account.tokens import AccountRefreshToken
+
+from .buffers import MemoryViewBuffer, SynchronousViewBuffer, get_view_buffer
+from .metrics import UNMATCHED_ROUTE, cache_namespace, method_label
+from .middleware import PrometheusMiddleware
+from .models import ContentTypeViewRollup, ContentView, ContentViewRollup, ContentViewTally, RollupCheckpoint
+from .paginator import Keyset, KeysetPaginator
+from .retention import ChunkedDeleteRetention, PartitionRetention, ViewArchive, retention_start
+from .rollups import compact, trend
+from .warmup import prefork_warmup
 
 # Create your tests here.
+
+test_settings = override_settings(
+    CACHES={"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}},
+    CONTENT_VIEW_BUFFER={"BACKEND": "apps.core.buffers.SynchronousViewBuffer", "FLUSH_SIZE": 500, "FLUSH_INTERVAL": 30},
+    TOKEN_REVOCATION_STORE="apps.account.helpers.revocation.InMemoryRevocationStore",
+    THROTTLE_RATE_LIMITER="apps.account.helpers.ratelimit.InMemoryRateLimiter",
+    BANK_NAME="Next Gen Bank",
+)
+
+
+class ContentViewSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ContentView
+        fields = ["id", "last_viewed"]
+
+
+class ContentViewList(ListAPIView):
+    queryset = ContentView.objects.all()
+    serializer_class = ContentViewSerializer
+    authentication_classes = []
+    permission_classes = [AllowAny]
+    throttle_classes = []
+
+
+class KeysetPaginationTests(TestCase):
+    """
+    Cursor pages and admin pages must cover every row once, in order, including rows that share
+    the leading sort value.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        content_type = ContentType.objects.get_for_model(ContentView)
+        now = timezone.now()
+        # Groups of three views share a timestamp, so pages split on the id tie-breaker.
+        ContentView.objects.bulk_create([
+            ContentView(content_type=content_type, object_id=uuid.uuid4(), ip_address=f"10.0.0.{index}",
+                        last_viewed=now - timedelta(minutes=index // 3), view_key=f"key-{index}",
+                        view_month=ContentView.month_of(now - timedelta(minutes=index // 3)))
+            for index in range(25)
+        ])
+        cls.expected = list(ContentView.objects.order_by("-last_viewed", "-pk").values_list("pk", flat=True))
+
+    def get(self, url):
+        response = ContentViewList.as_view()(APIRequestFactory().get(url))
+        response.render()
+        return response
+
+    def test_cursor_pages_cover_every_row_in_order(self):
+        seen, url, pages = [], "/views/?page_size=4", []
+        while url:
+            response = self.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.data["count"], 25)
+            pages.append(url)
+            seen += [uuid.UUID(row["id"]) for row in response.data["results"]]
+            url = response.data["next"]
+        self.assertEqual(seen, self.expected)
+        self.assertEqual(len(pages), 7)
+
+        # Walking back from the last page returns the same pages.
+        response = self.get(pages[-1])
+        back = []
+        while response.data["previous"]:
+            response = self.get(response.data["previous"])
+            back.insert(0, [uuid.UUID(row["id"]) for row in response.data["results"]])
+        self.assertEqual(sum(back, []), self.expected[:24])
+
+    def test_invalid_cursor_is_not_found(self):
+        self.assertEqual(self.get("/views/?cursor=not-a-cursor").status_code, 404)
+
+    def test_keyset_needs_non_null_local_fields(self):
+        self.assertIsNotNone(Keyset.for_queryset(ContentView.objects.all()))
+        self.assertIsNone(Keyset.for_queryset(ContentView.objects.order_by("ip_address")))
+        self.assertIsNone(Keyset.for_queryset(ContentView.objects.order_by("user__email")))
+
+    def test_admin_paginator_matches_offset_pages(self):
+        queryset = ContentView.objects.order_by("-last_viewed", "-pk")
+        paginator = KeysetPaginator(queryset, 4)
+        self.assertEqual(paginator.count, 25)
+        for number in paginator.page_range:
+            self.assertEqual([view.pk for view in paginator.page(number)],
+                             self.expected[(number - 1) * 4:number * 4])
+        self.assertEqual(list(paginator.page(paginator.num_pages + 1)), [])
+
+
+class WarmupTests(SimpleTestCase):
+    """
+    A failing warm-up step is skipped, and the objects surviving the warm-up are frozen.
+    """
+
+    @override_settings(WARMUP_STEPS={"web": ["apps.core.warmup.missing_step", "apps.core.warmup.compile_templates"]})
+    def test_failing_step_is_skipped(self):
+        try:
+            results = prefork_warmup("web")
+            self.assertGreater(gc.get_freeze_count(), 0)
+        finally:
+            gc.unfreeze()
+        self.assertEqual([path for path, _, _ in results],
+                         ["apps.core.warmup.missing_step", "apps.core.warmup.compile_templates"])
+        self.assertEqual([error is None for _, _, error in results], [False, True])
+
+
+@test_settings
+class ContentViewRollupTests(TestCase):
+    """
+    Every view, repeated ones included, ends up in the hourly and daily rollups once.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.content_type = ContentType.objects.get_for_model(ContentView)
+        cls.first, cls.second = uuid.uuid4(), uuid.uuid4()
+        cls.start = timezone.now().replace(hour=22, minute=10, second=0, microsecond=0) - timedelta(days=2)
+
+    def record(self, object_id, minutes, ip_address="10.0.0.1"):
+        get_view_buffer().record(self.content_type.pk, object_id, None, ip_address,
+                                 self.start + timedelta(minutes=minutes))
+
+    def test_compaction_counts_repeat_views(self):
+        for minutes in (0, 5, 70, 130):
+            self.record(self.first, minutes)
+        self.record(self.second, 5, ip_address="10.0.0.2")
+        self.assertEqual(ContentView.objects.count(), 2)
+
+        self.assertEqual(compact(settle=0), 5)
+        self.assertFalse(ContentViewTally.objects.exists())
+        hour = self.start.replace(minute=0)
+        self.assertEqual(trend(self.content_type, self.first, "hour"),
+                         [(hour, 2), (hour + timedelta(hours=1), 1), (hour + timedelta(hours=2), 1)])
+        self.assertEqual(trend(self.content_type, self.first, "day"),
+                         [(hour.replace(hour=0), 3), (hour.replace(hour=0) + timedelta(days=1), 1)])
+        self.assertEqual(trend(self.content_type, period="day"),
+                         [(hour.replace(hour=0), 4), (hour.replace(hour=0) + timedelta(days=1), 1)])
+
+        # A later run adds to the existing buckets and only reads the new tallies.
+        self.record(self.first, 1)
+        position = RollupCheckpoint.objects.get().position
+        self.assertEqual(compact(settle=0), 1)
+        self.assertGreater(RollupCheckpoint.objects.get().position, position)
+        self.assertEqual(trend(self.content_type, self.first, "hour")[0], (hour, 3))
+        self.assertEqual(compact(settle=0), 0)
+        self.assertEqual(ContentTypeViewRollup.objects.get(period="day", bucket=hour.replace(hour=0)).views, 5)
+
+    def test_young_tallies_wait_for_the_next_run(self):
+        self.record(self.first, 0)
+        self.assertEqual(compact(settle=60), 0)
+        self.assertFalse(ContentViewRollup.objects.exists())
+
+    def test_checkpoint_stops_at_the_first_young_tally(self):
+        # A flush that took its id first may set a later created_at than one with a higher id.
+        for minutes in (0, 1, 2):
+            self.record(self.first, minutes)
+        young, *settled = ContentViewTally.objects.order_by("id").values_list("id", flat=True)
+        ContentViewTally.objects.filter(id__in=settled).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(compact(settle=60), 0)
+        self.assertEqual(RollupCheckpoint.objects.get().position, 0)
+
+        ContentViewTally.objects.filter(id=young).update(created_at=timezone.now() - timedelta(minutes=5))
+        self.assertEqual(compact(settle=60, chunk_size=2), 3)
+        self.assertFalse(ContentViewTally.objects.exists())
+        self.assertEqual(trend(self.content_type, self.first, "hour"), [(self.start.replace(minute=0), 3)])
+
+    def test_trend_api(self):
+        self.record(self.first, 0)
+        self.record(self.first, 1)
+        compact(settle=0)
+        url = reverse("content_view_trend")
+        params = {"content_type": "core.contentview", "object_id": str(self.first), "period": "hour",
+                  "since": (self.start - timedelta(hours=1)).isoformat()}
+        User = get_user_model()
+        for role, status in ((User.RoleChoices.CUSTOMER, 403), (User.RoleChoices.BRANCH_MANAGER, 200)):
+            user = User.objects.create_user(
+                email=f"{role}@example.com", password="Str0ng-Passw0rd", first_name="Jane", last_name="Doe",
+                id_no=len(role), security_question=User.SecurityQuestion.PET_NAME, security_answer="rex", role=role,
+            )
+            self.client.cookies[settings.COOKIE_NAME] = str(AccountRefreshToken.for_user(user).access_token)
+            response = self.client.get(url, params)
+            self.assertEqual(response.status_code, status)
+        self.assertEqual(response.json()["total"], 2)
+        self.assertEqual(len(response.json()["buckets"]), 1)
+        self.assertEqual(self.client.get(url, {**params, "content_type": "core.nothing"}).status_code, 400)
+
+
+@test_settings
+class ContentViewBufferTests(TestCase):
+    """
+    Buffered views are upserted on ``(view_key, view_month)``: one row per viewer and month holding the
+    last view, and one tally per object and hour.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.content_type = ContentType.objects.get_for_model(ContentView)
+        cls.object_id = uuid.uuid4()
+        cls.start = datetime(2026, 3, 10, 9, 15, tzinfo=dt_timezone.utc)
+
+    def record(self, buffer, minutes, ip_address="10.0.0.1"):
+        buffer.record(self.content_type.pk, self.object_id, None, ip_address, self.start + timedelta(minutes=minutes))
+
+    def tallied(self):
+        return sorted(ContentViewTally.objects.values_list("bucket", "views"))
+
+    def test_memory_buffer_merges_repeat_views(self):
+        buffer = MemoryViewBuffer(flush_size=100, flush_interval=3600)
+        for minutes in (10, 0, 5):
+            self.record(buffer, minutes)
+        self.assertFalse(ContentView.objects.exists())
+
+        self.assertEqual(buffer.flush(), 1)
+        view = ContentView.objects.get()
+        self.assertEqual(view.last_viewed, self.start + timedelta(minutes=10))
+        self.assertEqual(view.view_month, self.start.date().replace(day=1))
+        self.assertEqual(self.tallied(), [(self.start.replace(minute=0), 3)])
+
+        # A later flush moves last_viewed forward on the same row; a new month starts a new row.
+        self.record(buffer, 60)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(buffer.flush(), 0)
+        self.assertEqual(ContentView.objects.get().last_viewed, self.start + timedelta(minutes=60))
+        self.record(buffer, 60 * 24 * 30)
+        buffer.flush()
+        self.assertEqual(ContentView.objects.count(), 2)
+        self.assertEqual(ContentView.objects.get(pk=view.pk).last_viewed, self.start + timedelta(minutes=60))
+        self.assertEqual(sum(views for _, views in self.tallied()), 5)
+
+    def test_memory_buffer_flushes_when_full(self):
+        buffer = MemoryViewBuffer(flush_size=2, flush_interval=3600)
+        self.record(buffer, 0)
+        self.record(buffer, 1)
+        self.assertFalse(ContentView.objects.exists())
+        self.record(buffer, 2, ip_address="10.0.0.2")
+        self.assertEqual(ContentView.objects.count(), 2)
+
+    def test_failed_flush_keeps_the_views(self):
+        buffer = MemoryViewBuffer(flush_size=100, flush_interval=3600)
+        self.record(buffer, 0)
+        with mock.patch("apps.core.buffers.write_views_and_tallies", side_effect=RuntimeError("down")):
+            self.assertEqual(buffer.flush(), 0)
+        self.record(buffer, 5)
+        self.assertEqual(buffer.flush(), 1)
+        self.assertEqual(ContentView.objects.get().last_viewed, self.start + timedelta(minutes=5))
+        self.assertEqual(self.tallied(), [(self.start.replace(minute=0), 2)])
+
+    def test_synchronous_buffer_writes_every_view(self):
+        buffer = get_view_buffer()
+        self.assertIsInstance(buffer, SynchronousViewBuffer)
+        self.record(buffer, 0)
+        self.assertEqual(ContentView.objects.get().last_viewed, self.start)
+        self.record(buffer, 70)
+        self.assertEqual(ContentView.objects.get().last_viewed, self.start + timedelta(minutes=70))
+        self.assertEqual(buffer.flush(), 0)
+        hour = self.start.replace(minute=0)
+        self.assertEqual(self.tallied(), [(hour, 1), (hour + timedelta(hours=1), 1)])
+
+
+class ContentViewRetentionTests(TestCase):
+    """
+    Expired months are archived and removed, and the admin only reads the retained window.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.content_type = ContentType.objects.get_for_model(ContentView)
+        cls.now = timezone.now()
+        # Two months kept: this one and the previous one.
+        cls.kept = retention_start(cls.now, months=2)
+        kept_from = datetime(cls.kept.year, cls.kept.month, 1, tzinfo=dt_timezone.utc)
+        moments = (cls.now, kept_from + timedelta(hours=1), kept_from - timedelta(hours=1),
+                   kept_from - timedelta(days=40), kept_from - timedelta(days=40))
+        for index, moment in enumerate(moments):
+            ContentView(content_type=cls.content_type, object_id=uuid.uuid4(), ip_address=f"10.0.1.{index}",
+                        last_viewed=moment).save()
+        cls.expired = sorted(str(view.pk) for view in ContentView.objects.filter(view_month__lt=cls.kept))
+
+    def test_prune_archives_expired_months(self):
+        self.assertEqual(len(self.expired), 3)
+        with tempfile.TemporaryDirectory() as directory:
+            # Sqlite tables are not partitioned, so partition retention deletes in chunks too.
+            retention = PartitionRetention(months=2, archive=ViewArchive(directory), chunk_size=2)
+            self.assertEqual(retention.prepare(self.now), [])
+            self.assertEqual(retention.prune(self.now), 3)
+            archived = []
+            for path in sorted(ViewArchive(directory).directory.iterdir()):
+                with gzip.open(path, "rt") as file:
+                    archived += [json.loads(line)["id"] for line in file]
+        self.assertEqual(sorted(archived), self.expired)
+        self.assertFalse(ContentView.objects.filter(view_month__lt=self.kept).exists())
+        self.assertEqual(ContentView.objects.count(), 2)
+        self.assertEqual(ChunkedDeleteRetention(months=2, archive=None).prune(self.now), 0)
+
+    @override_settings(CONTENT_VIEW_RETENTION={**settings.CONTENT_VIEW_RETENTION, "MONTHS": 2})
+    def test_admin_reads_the_retained_window(self):
+        request = RequestFactory().get("/")
+        request.user = get_user_model()(is_staff=True, is_superuser=True)
+        model_admin = admin.site._registry[ContentView]
+        self.assertEqual(model_admin.get_queryset(request).count(), ContentView.objects.filter(
+            view_month__gte=retention_start()).count())
+        changelist = model_admin.get_changelist_instance(request)
+        month_filter = changelist.filter_specs[0]
+        self.assertEqual([value for value, _ in month_filter.lookup_choices],
+                         [f"{self.now:%Y-%m}", f"{retention_start():%Y-%m}"])
+        request = RequestFactory().get("/", {"view_month": f"{self.now:%Y-%m}"})
+        request.user = get_user_model()(is_staff=True, is_superuser=True)
+        changelist = model_admin.get_changelist_instance(request)
+        self.assertEqual(changelist.get_queryset(request).count(), 1)
+
+
+@test_settings
+class MetricsTests(TestCase):
+    """
+    Requests are labelled by URL pattern with their database work, cache reads by key namespace,
+    and the metrics are only served to the allowed addresses.
+    """
+
+    @staticmethod
+    def sample(name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_route_labels(self):
+        url = reverse("content_view_trend")
+        route = resolve(url).route
+        before = self.sample("http_requests_total", route=route, method="GET", status="401")
+        unmatched = self.sample("http_requests_total", route=UNMATCHED_ROUTE, method="GET", status="404")
+        self.assertEqual(self.client.get(url).status_code, 401)
+        # Requests no pattern matched carry no resolver_match.
+        PrometheusMiddleware(lambda request: HttpResponseNotFound())(RequestFactory().get(f"/{uuid.uuid4()}/"))
+        self.assertEqual(self.sample("http_requests_total", route=route, method="GET", status="401"), before + 1)
+        self.assertEqual(self.sample("http_requests_total", route=UNMATCHED_ROUTE, method="GET", status="404"),
+                         unmatched + 1)
+        self.assertEqual(method_label(RequestFactory().generic("PROPFIND", "/")), "other")
+
+    def run_queries(self):
+        for _ in range(3):
+            ContentView.objects.count()
+        return HttpResponse("ok")
+
+    def request(self, route):
+        request = RequestFactory().get("/")
+        request.resolver_match = SimpleNamespace(route=route, view_name=None)
+        return request
+
+    def test_query_counts_per_request(self):
+        ContentView.objects.count()
+        PrometheusMiddleware(lambda request: self.run_queries())(self.request("test/sync/"))
+        self.assertEqual(self.sample("http_request_db_queries_sum", route="test/sync/"), 3)
+        self.assertEqual(self.sample("http_request_db_queries_count", route="test/sync/"), 1)
+
+        async def view(request):
+            return await sync_to_async(self.run_queries)()
+
+        middleware = PrometheusMiddleware(view)
+        self.assertTrue(iscoroutinefunction(middleware))
+        async_to_sync(middleware)(self.request("test/async/"))
+        self.assertEqual(self.sample("http_request_db_queries_sum", route="test/async/"), 3)
+        self.assertGreater(self.sample("http_request_db_seconds_sum", route="test/async/"), 0)
+
+    @override_settings(CACHES={"default": {"BACKEND": "apps.core.cache.LocMemCache"}})
+    def test_cache_namespace_labels(self):
+        self.assertEqual(cache_namespace("lockout:ip:10.0.0.1"), "lockout")
+        self.assertEqual(cache_namespace("jane@example.com"), "other")
+        self.assertEqual(cache_namespace("Jane@Example:x"), "other")
+        before = {result: self.sample("cache_gets_total", namespace="rollup", result=result)
+                  for result in ("hit", "miss")}
+        cache = caches["default"]
+        self.assertIsNone(cache.get("rollup:x"))
+        cache.set("rollup:x", 1)
+        self.assertEqual(cache.get("rollup:x"), 1)
+        self.assertEqual(async_to_sync(cache.aget)("rollup:x"), 1)
+        self.assertEqual(self.sample("cache_gets_total", namespace="rollup", result="hit"), before["hit"] + 2)
+        self.assertEqual(self.sample("cache_gets_total", namespace="rollup", result="miss"), before["miss"] + 1)
+
+    def test_metrics_are_restricted_to_allowed_addresses(self):
+        with override_settings(METRICS_ALLOWED_IPS=["127.0.0.1"]):
+            response = self.client.get("/metrics")
+            self.assertEqual(response.status_code, 200)
+            self.assertIn(b"http_requests_total", response.content)
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.0.0.9").status_code, 403)
+        with override_settings(METRICS_ALLOWED_IPS=["*"]):
+            self.assertEqual(self.client.get("/metrics", REMOTE_ADDR="10.0.0.9").status_code, 200)
@@ -0,0 +1,39 @@
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .permissions import HasAllowedRole
+from .rollups import trend
+from .serializers import ContentViewTrendQuerySerializer, ViewBucketSerializer
+
+
+class ContentViewTrendView(APIView):
+    """
+    API view answering views per hour or per day of an object or a content type from the rollups.
+    """
+    permission_classes = [IsAuthenticated, HasAllowedRole]
+    allowed_roles = ("branch_manager", "account_executive")
+
+    def get(self, request: Request, *args, **kwargs) -> Response:
+        """
+        Return the views per bucket, oldest first, and their total. Buckets without views are left out.
+        :param request: The HTTP request object.
+        :param args: Additional positional arguments.
+        :param kwargs: Additional keyword arguments.
+        :return: The HTTP response object.
+        """
+        query = ContentViewTrendQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        params = query.validated_data
+        content_type = params["content_type"]
+        buckets = [{"bucket": bucket, "views": views} for bucket, views in trend(**params)]
+        return Response({
+            "content_type": f"{content_type.app_label}.{content_type.model}",
+            "object_id": params.get("object_id"),
+            "period": params["period"],
+            "since": params["since"],
+            "until": params["until"],
+            "total": sum(bucket["views"] for bucket in buckets),
+            "buckets": ViewBucketSerializer(buckets, many=True).data,
+        })
@@ -0,0 +1,124 @@
+import gc
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+from loguru import logger
+
+
+def load_urlconf():
+    """
+    Import the URLconf, and with it every view, serializer and throttle, and fill the resolver caches.
+    """
+    from django.urls import get_resolver
+
+    resolver = get_resolver()
+    resolver.url_patterns
+    resolver.reverse_dict
+
+
+def compile_templates():
+    """
+    Compile ``WARMUP_TEMPLATES`` into the cached template loader.
+    """
+    from django.template.loader import get_template
+
+    for name in settings.WARMUP_TEMPLATES:
+        get_template(name)
+
+
+def load_countries():
+    """
+    Load the country names and the translation catalogs they are looked up in.
+    """
+    from django_countries import countries
+
+    list(countries)
+
+
+def load_phone_metadata():
+    """
+    Load the metadata of every phone number region, which phonenumbers otherwise reads per region on first use.
+    """
+    import phonenumbers
+    from phonenumbers import PhoneMetadata
+
+    for region in phonenumbers.SUPPORTED_REGIONS:
+        PhoneMetadata.metadata_for_region(region)
+
+
+def build_api_schema():
+    """
+    Build the OpenAPI schema once, which imports and registers the drf-spectacular extensions.
+    """
+    from drf_spectacular.drainage import GENERATOR_STATS
+    from drf_spectacular.generators import SchemaGenerator
+
+    with GENERATOR_STATS.silence():
+        SchemaGenerator().get_schema(request=None, public=True)
+
+
+def connect_databases():
+    """
+    Open the database connections that are reused across requests, see ``CONN_MAX_AGE``.
+    Connections closed after every request would be closed again before the first one.
+    """
+    for connection in connections.all():
+        if connection.settings_dict["CONN_MAX_AGE"] != 0:
+            connection.ensure_connection()
+
+
+def connect_caches():
+    """
+    Open a connection of every cache backend, e.g. the Redis pool also used for revocations and throttling.
+    """
+    from django.core.cache import caches
+
+    for alias in settings.CACHES:
+        caches[alias].get("warmup")
+
+
+def run_steps(paths) -> list:
+    """
+    Run warm-up steps in order. A failing step is logged and skipped, as warm-up must never stop a boot.
+    :param paths: Dotted paths of the steps.
+    :return: ``(path, seconds, error)`` tuples, the error being None for steps that succeeded
+    """
+    results = []
+    for path in paths:
+        started = time.perf_counter()
+        try:
+            import_string(path)()
+            error = None
+        except Exception as e:
+            error = repr(e)
+            logger.warning(f"Warm-up step {path} failed: {e}")
+        results.append((path, time.perf_counter() - started, error))
+    return results
+
+
+def prefork_warmup(role) -> list:
+    """
+    Run the ``WARMUP_STEPS`` of a server role in its master process, before it forks workers.
+    Connections opened by the steps are closed so no worker shares a socket. The surviving objects
+    are then moved to the permanent generation, so collections in the workers never write to the
+    pages they share with the master.
+    :param role: ``web`` or ``celery``.
+    :return: The step results, see ``run_steps``
+    """
+    results = run_steps(settings.WARMUP_STEPS.get(role, ()))
+    connections.close_all()
+    gc.collect()
+    gc.freeze()
+    logger.info(f"{role} warm-up took {sum(seconds for _, seconds, _ in results) * 1000:.0f} ms, "
+                f"{gc.get_freeze_count()} objects frozen")
+    return results
+
+
+def worker_warmup() -> list:
+    """
+    Run the ``WARMUP_WORKER_STEPS`` in a worker process, right after the fork.
+    :return: The step results, see ``run_steps``
+    """
+    return run_steps(settings.WARMUP_WORKER_STEPS)
@@ -0,0 +1,35 @@
+"""
+Process-wide initialization that used to run as a side effect of importing the settings.
+Each initializer runs once per process, on first use, so commands and workers that never
+log to files or talk to Cloudinary do not pay for it.
+"""
+import logging.config
+from functools import cache
+
+from django.conf import settings
+
+
+@cache
+def configure_logging():
+    """
+    Install the loguru sinks of ``LOGURU_LOGGING`` and route stdlib logging to loguru.
+    Called from ``CoreConfig.ready``; the log files themselves are only opened on the first write.
+    """
+    from loguru import logger
+
+    logger.configure(**settings.LOGURU_LOGGING)
+    logging.config.dictConfig(settings.LOGGING)
+
+
+@cache
+def configure_cloudinary():
+    """
+    Configure the Cloudinary client from the settings, before the first upload.
+    """
+    import cloudinary
+
+    cloudinary.config(
+        cloud_name=settings.CLOUDINARY_CLOUD_NAME,
+        api_key=settings.CLOUDINARY_API_KEY,
+        api_secret=settings.CLOUDINARY_API_SECRET,
+    )
@@ -1,6 +1,6 @@
 import os
 
-from celery import Celery
+from celery import Celery, signals
 from django.conf import settings
 
 # Set the default Django settings module for the 'celery' program.
@@ -14,6 +14,25 @@ app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks(lambda: settings.INSTALLED_APPS)
 
 
+@signals.worker_init.connect
+def warm_up_worker(**kwargs):
+    """
+    Warm up the worker master before the pool forks, see apps.core.warmup.
+    The per-process receiver is connected here, after the Django fixup's own, so the connections it
+    opens are not closed by the fixup's cleanup of inherited connections.
+    """
+    from apps.core.warmup import prefork_warmup
+
+    prefork_warmup("celery")
+    signals.worker_process_init.connect(warm_up_worker_process, weak=False)
+
+
+def warm_up_worker_process(**kwargs):
+    from apps.core.warmup import worker_warmup
+
+    worker_warmup()
+
+
 
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
@@ -2,10 +2,12 @@ from datetime import date, timedelta
 from os import getenv
 from pathlib import Path
 
-import cloudinary
 from dotenv import load_dotenv
+from kombu import Queue
 from loguru import logger
 
+from interceptor import LogSampler, file_sink
+
 BASE_DIR = Path(__file__).resolve(strict=True).parent.parent.parent
 
 APPS_DIR = BASE_DIR / 'apps'
@@ -43,6 +45,7 @@ LOCAL_APPS = ["apps.core", "apps.account"]
 INSTALLED_APPS = DJANGO_APPS + LOCAL_APPS + THIRD_PARTY_APPS
 
 MIDDLEWARE = [
+    'apps.core.middleware.PrometheusMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -83,17 +86,39 @@ DATABASES = {
         'USER': getenv('POSTGRES_USER'),
         'PASSWORD': getenv('POSTGRES_PASSWORD'),
         'HOST': getenv('POSTGRES_HOST'),
+        # Seconds a connection is reused across requests and tasks, 0 to close it after each one.
+        'CONN_MAX_AGE': int(getenv('CONN_MAX_AGE') or 0),
+        'CONN_HEALTH_CHECKS': True,
+    }
+}
+
+# Counts hits and misses per key namespace, see ``apps.core.cache``.
+CACHES = {
+    "default": {
+        "BACKEND": "apps.core.cache.RedisCache",
+        "LOCATION": getenv("REDIS_URL", "redis://redis:6379/1"),
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+        },
     }
 }
 
 PASSWORD_HASHERS = [
-    "django.contrib.auth.hashers.Argon2PasswordHasher",
+    "apps.account.hashers.TunedArgon2PasswordHasher",
     "django.contrib.auth.hashers.PBKDF2PasswordHasher",
     "django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher",
     "django.contrib.auth.hashers.BCryptSHA256PasswordHasher",
     "django.contrib.auth.hashers.ScryptPasswordHasher",
 ]
 
+# Recommended values for this host are printed by `manage.py calibrate_hashers`.
+ARGON2_PARAMETERS = {
+    "time_cost": int(getenv("ARGON2_TIME_COST", 2)),
+    "memory_cost": int(getenv("ARGON2_MEMORY_COST", 102400)),
+    "parallelism": int(getenv("ARGON2_PARALLELISM", 8)),
+}
+PASSWORD_HASHING_WORKERS = int(getenv("PASSWORD_HASHING_WORKERS", 0)) or None
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 
@@ -131,6 +156,17 @@ SITE_ID = 1
 STATIC_URL = '/static/'
 MEDIA_URL = '/media/'
 STATIC_ROOT = str(BASE_DIR / 'staticfiles')
+MEDIA_ROOT = str(BASE_DIR / 'media')
+
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    # Originals waiting for the image pipeline. The web and worker processes must share it.
+    "image_uploads": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+        "OPTIONS": {"location": str(BASE_DIR / "uploads")},
+    },
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -139,47 +175,58 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 LOGGING_CONFIG = None
 
+# Write log files from a background thread, so slow disks, rotation and compression never stall
+# a request. Worth it where writes block, e.g. network volumes; see ``manage.py benchmark_logging``.
+LOG_QUEUED = getenv("LOG_QUEUED", "False") == "True"
+# Variable values in tracebacks are costly to render and may contain credentials.
+LOG_DIAGNOSE = getenv("LOG_DIAGNOSE", "False") == "True"
+# Also write JSON lines to logs/app.jsonl for log shippers.
+LOG_JSON = getenv("LOG_JSON", "False") == "True"
+# Sampling and rate limits of the noisy log channels, see ``interceptor.LogSampler``.
+LOG_CHANNELS = {
+    "auth.failed_login": {"sample_rate": 1.0, "rate": 50},
+    "auth.token_error": {"sample_rate": 0.1, "rate": 10},
+}
+log_sampler = LogSampler(LOG_CHANNELS)
+# Log files are created on their first write, so processes that never log do not open them.
+LOG_FILE_OPTIONS = {"queued": LOG_QUEUED, "rotation": "10MB", "retention": "30 days", "compression": "zip",
+                    "delay": True}
+LOG_FORMAT = ("<green>{time:YYYY-MM-DD at HH:mm:ss}</green> | "
+              "<level>{level: <8}</level> | "
+              "<cyan>{module}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> | "
+              "<level>{message}</level>")
+
 LOGURU_LOGGING = {
     "handlers": [
-        {"sink": BASE_DIR / "logs/debug.log",
+        {**file_sink(BASE_DIR / "logs/debug.log", **LOG_FILE_OPTIONS),
          "level": "DEBUG",
-         "filter": lambda record: record["level"].no <= logger.level("WARNING").no,
-         "format": "<green>{time:YYYY-MM-DD at HH:mm:ss}</green> | "
-                   "<level>{level: <8}</level> | "
-                   "<cyan>{module}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> | "
-                   "<level>{message}</level>",
-         "rotation": "10MB",
-         "retention": "30 days",
-         "compression": "zip",
+         "filter": lambda record: record["level"].no <= logger.level("WARNING").no and log_sampler.keep(record),
+         "format": LOG_FORMAT,
          },
-        {"sink": BASE_DIR / "logs/error.log",
+        {**file_sink(BASE_DIR / "logs/error.log", **LOG_FILE_OPTIONS),
          "level": "ERROR",
-         "format": "<green>{time:YYYY-MM-DD at HH:mm:ss}</green> | "
-                   "<level>{level: <8}</level> | "
-                   "<cyan>{module}</cyan>:<cyan>{function}</cyan>:<cyan>{line}</cyan> | "
-                   "<level>{message}</level>",
-         "rotation": "10MB",
-         "retention": "30 days",
-         "compression": "zip",
+         "filter": log_sampler.keep,
+         "format": LOG_FORMAT,
          "backtrace": True,
-         "diagnose": True,
+         "diagnose": LOG_DIAGNOSE,
          },
-
+        *([{**file_sink(BASE_DIR / "logs/app.jsonl", **LOG_FILE_OPTIONS),
+            "level": "INFO",
+            "filter": log_sampler.keep,
+            "serialize": True,
+            }] if LOG_JSON else []),
     ],
+    "patcher": log_sampler,
 }
 
+# Applied by fintech.bootstrap.configure_cloudinary before the first upload. The SDK also reads
+# these variables from the environment when it is first imported.
 CLOUDINARY_CLOUD_NAME = getenv('CLOUDINARY_CLOUD_NAME')
 CLOUDINARY_API_KEY = getenv('CLOUDINARY_API_KEY')
 CLOUDINARY_API_SECRET = getenv('CLOUDINARY_API_SECRET')
 
-cloudinary.config(
-    cloud_name=CLOUDINARY_CLOUD_NAME,
-    api_key=CLOUDINARY_API_KEY,
-    api_secret=CLOUDINARY_API_SECRET,
-)
-
-logger.configure(**LOGURU_LOGGING)
-
+# Django leaves logging alone with LOGGING_CONFIG unset. LOGURU_LOGGING and LOGGING are installed by
+# fintech.bootstrap.configure_logging when the apps are ready, not when the settings are imported.
 LOGGING = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -191,14 +238,20 @@ LOGGING = {
 }
 
 AUTH_USER_MODEL = 'account.User'
+AUTHENTICATION_BACKENDS = ["apps.account.backends.AccountBackend"]
 DEFAULT_BIRTH_DATE = date(1900, 1, 1)
 DEFAULT_DATE = date(2000, 1, 1)
-DEFAULT_EXPIRY_DATE = date(2024, 1, 1)
 DEFAULT_COUNTRY = "CM"
 DEFAULT_PHONE_NUMBER = "+237650282777"
 
+# Reverse proxies in front of the app that append to X-Forwarded-For. The client address is read that
+# many hops from the right of the header; with 0 the header is ignored and REMOTE_ADDR is used.
+TRUSTED_PROXY_COUNT = int(getenv("TRUSTED_PROXY_COUNT") or 0)
+
 # Django Rest Framework settings
 REST_FRAMEWORK = {
+    # Throttles identify clients like get_client_ip does.
+    "NUM_PROXIES": TRUSTED_PROXY_COUNT,
     "DEFAULT_SCHEMA_CLASS": "drf_spectacular.openapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": [
         "apps.account.cookie_auth.CookieAuthentication",
@@ -206,7 +259,7 @@ REST_FRAMEWORK = {
     "DEFAULT_PERMISSION_CLASSES": [
         "rest_framework.permissions.IsAuthenticated",
     ],
-    "DEFAULT_PAGINATION_CLASS": "rest_framework.pagination.PageNumberPagination",
+    "DEFAULT_PAGINATION_CLASS": "apps.core.pagination.KeysetPagination",
     "PAGE_SIZE": 10,
     "DEFAULT_FILTER_BACKENDS": [
         "django_filters.rest_framework.DjangoFilterBackend",
@@ -214,29 +267,51 @@ REST_FRAMEWORK = {
         "rest_framework.filters.OrderingFilter",
     ],
     "DEFAULT_THROTTLE_CLASSES": [
-        "rest_framework.throttling.AnonRateThrottle",
-        "rest_framework.throttling.UserRateThrottle",
+        "apps.account.throttling.AnonGCRAThrottle",
+        "apps.account.throttling.UserGCRAThrottle",
+        "apps.account.throttling.ScopedGCRAThrottle",
     ],
+    # Each rate is also the burst size, see apps.account.throttling.GCRAThrottle.
     "DEFAULT_THROTTLE_RATES": {
         "anon": "50/day",
         "user": "100/day",
+        "login": "10/min",
+        "verify_otp": "10/min",
+        "refresh": "30/hour",
+        "register": "5/hour",
     },
 }
 
+# Tables with at least this many rows are counted from planner estimates, see apps.core.paginator.estimate_count.
+PAGINATION_ESTIMATE_THRESHOLD = 100_000
+
 # Jwt settings
 SIMPLE_JWT = {
     "ACCESS_TOKEN_LIFETIME": timedelta(minutes=30),
     "REFRESH_TOKEN_LIFETIME": timedelta(days=1),
     "ROTATE_REFRESH_TOKENS": True,
-    "BLACKLIST_AFTER_ROTATION": True,
+    # The blacklist app is not installed; rotated and logged out tokens are revoked through
+    # apps.account.helpers.revocation instead.
+    "BLACKLIST_AFTER_ROTATION": False,
     "ALGORITHM": "HS256",
     "SIGNING_KEY": getenv("SIGNING_KEY"),
     "AUTH_HEADER_TYPES": ("Bearer",),
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "USER_ID_FIELD": "id",
     "USER_ID_CLAIM": "user_id",
+    "TOKEN_USER_CLASS": "apps.account.tokens.ClaimsUser",
 }
 
+# Authorize API requests from token claims instead of loading the user row on every request.
+AUTH_STATELESS_USER = getenv("AUTH_STATELESS_USER", "False") == "True"
+
+# Serve login, OTP verification, refresh and logout with native async views. Enable under ASGI.
+AUTH_ASYNC_VIEWS = getenv("AUTH_ASYNC_VIEWS", "False") == "True"
+
+# Comma separated addresses allowed to scrape /metrics, "*" for any. Under gunicorn with several
+# workers, set PROMETHEUS_MULTIPROC_DIR to a directory emptied at startup so every worker is exported.
+METRICS_ALLOWED_IPS = [ip.strip() for ip in (getenv("METRICS_ALLOWED_IPS") or "127.0.0.1").split(",")]
+
 # Djoser settings
 DJOSER = {
     "LOGIN_FIELD": "email",
@@ -279,8 +354,82 @@ CELERY_RESULT_EXTENDED = True
 CELERY_RESULT_BACKEND_ALWAYS_RETRY = True
 CELERY_TASK_TIME_LIMIT = 5 * 60
 CELERY_TASK_SOFT_TIME_LIMIT = 60
-CELERY_BEAT_SCHEDULE = "django_celery_beat.schedulers:DatabaseScheduler"
+CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 CELERY_WORKER_SEND_TASK_EVENTS = True
+CELERY_IMPORTS = ["apps.account.helpers.emails", "apps.account.helpers.images"]
+CELERY_TASK_DEFAULT_QUEUE = "celery"
+CELERY_TASK_QUEUES = [
+    Queue("celery", routing_key="celery"),
+    # OTP and lockout mail get their own priority queue so a backlog of bulk mail never delays a login.
+    Queue("auth_mail", routing_key="auth_mail", queue_arguments={"x-max-priority": 10}),
+    # Image processing is CPU bound and runs on its own workers.
+    Queue("images", routing_key="images"),
+]
+CELERY_TASK_ROUTES = {
+    "apps.account.helpers.emails.*": {"queue": "auth_mail", "routing_key": "auth_mail"},
+    "apps.account.helpers.images.*": {"queue": "images", "routing_key": "images"},
+}
+
+# Warm-up steps, see apps.core.warmup. WARMUP_STEPS run in the gunicorn or Celery master before it
+# forks, so workers share the result; WARMUP_WORKER_STEPS run in each worker after the fork.
+WARMUP_STEPS = {
+    "web": [
+        "apps.core.warmup.load_urlconf",
+        "apps.core.warmup.compile_templates",
+        "apps.core.warmup.load_countries",
+        "apps.core.warmup.load_phone_metadata",
+        "apps.core.warmup.build_api_schema",
+    ],
+    "celery": [
+        "apps.account.helpers.email_templates.compile_email_templates",
+    ],
+}
+WARMUP_WORKER_STEPS = [
+    "apps.core.warmup.connect_databases",
+    "apps.core.warmup.connect_caches",
+]
+WARMUP_TEMPLATES = ["emails/base.html", "emails/otp_email.html", "emails/account_locked.html"]
+
+# Content view write-behind buffer
+CONTENT_VIEW_BUFFER = {
+    "BACKEND": getenv("CONTENT_VIEW_BUFFER_BACKEND", "apps.core.buffers.RedisViewBuffer"),
+    "FLUSH_SIZE": int(getenv("CONTENT_VIEW_FLUSH_SIZE", 500)),
+    "FLUSH_INTERVAL": int(getenv("CONTENT_VIEW_FLUSH_INTERVAL", 30)),
+}
+
+# Content view rollups, see apps.core.rollups. Tallies younger than SETTLE seconds wait for the next run.
+CONTENT_VIEW_ROLLUPS = {
+    "CHUNK_SIZE": int(getenv("CONTENT_VIEW_ROLLUP_CHUNK_SIZE", 5000)),
+    "SETTLE": int(getenv("CONTENT_VIEW_ROLLUP_SETTLE", 60)),
+    "INTERVAL": int(getenv("CONTENT_VIEW_ROLLUP_INTERVAL", 300)),
+}
+
+# Content view retention, see apps.core.retention. Months kept including the current one; expired
+# months are archived to gzipped JSON lines under ARCHIVE_DIR first unless ARCHIVE is off.
+CONTENT_VIEW_RETENTION = {
+    "BACKEND": getenv("CONTENT_VIEW_RETENTION_BACKEND", "apps.core.retention.PartitionRetention"),
+    "MONTHS": int(getenv("CONTENT_VIEW_RETENTION_MONTHS", 6)),
+    "ARCHIVE": getenv("CONTENT_VIEW_ARCHIVE", "True") == "True",
+    "ARCHIVE_DIR": getenv("CONTENT_VIEW_ARCHIVE_DIR", str(BASE_DIR / "archive" / "content_views")),
+    "PREMAKE_MONTHS": int(getenv("CONTENT_VIEW_PREMAKE_MONTHS", 2)),
+    "CHUNK_SIZE": int(getenv("CONTENT_VIEW_RETENTION_CHUNK_SIZE", 5000)),
+    "INTERVAL": int(getenv("CONTENT_VIEW_RETENTION_INTERVAL", 86400)),
+}
+
+CELERY_BEAT_SCHEDULE = {
+    "flush-content-views": {
+        "task": "apps.core.tasks.flush_content_views",
+        "schedule": CONTENT_VIEW_BUFFER["FLUSH_INTERVAL"],
+    },
+    "compact-content-views": {
+        "task": "apps.core.tasks.compact_content_views",
+        "schedule": CONTENT_VIEW_ROLLUPS["INTERVAL"],
+    },
+    "prune-content-views": {
+        "task": "apps.core.tasks.prune_content_views",
+        "schedule": CONTENT_VIEW_RETENTION["INTERVAL"],
+    },
+}
 
 # Setting up cookies
 COOKIE_NAME = "access"
@@ -2,29 +2,28 @@
 from .base import  *
 
 
-APPS_DIR = BASE_DIR / 'apps'
-local_env_file = BASE_DIR / "fintech" / ".envs" / ".env.local"
-if local_env_file.is_file():
-    load_dotenv(dotenv_path=local_env_file)
-
-
 SECRET_KEY = getenv("SECRET_KEY")
 
 # SECURITY WARNING: don't run with debug turned on in production!
 DEBUG = getenv("DEBUG")
 
 SITE_NAME = getenv("SITE_NAME")
+BANK_NAME = getenv("BANK_NAME")
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '*']
 ADMIN_URL = getenv("ADMIN_URL")
 
-EMAIL_BACKEND = 'django.core.mail.backends.CeleryEmailBackend'
+EMAIL_BACKEND = 'djcelery_email.backends.CeleryEmailBackend'
+CELERY_EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+EMAIL_BATCH_SIZE = 50
 EMAIL_HOST = getenv("EMAIL_HOST")
 EMAIL_PORT = getenv("EMAIL_PORT")
 DEFAULT_FROM_EMAIL = getenv("DEFAULT_FROM_EMAIL")
 DOMAIN_NAME = getenv("DOMAIN_NAME")
 
 MAX_UPLOAD_SIZE = 1 * 1024 * 1024
+IMAGE_MAX_PIXELS = 40_000_000
+IMAGE_PUBLISHER = getenv("IMAGE_PUBLISHER", "apps.account.helpers.images.CloudinaryImagePublisher")
 
 
 
@@ -33,6 +32,19 @@ CSRF_TRUSTED_ORIGINS = ['http://localhost:8000']
 
 LOGIN_ATTEMPTS_LIMIT = 3
 LOCKOUT_DURATION= timedelta(minutes=1)
+LOGIN_FAILURE_WINDOW = timedelta(minutes=15)
+LOGIN_IP_ATTEMPTS_LIMIT = 20
+LOGIN_LOCKOUT_ENGINE = "apps.account.helpers.lockout.CacheLockoutEngine"
 OTP_EXPIRATION_TIME = timedelta(minutes=1)
+OTP_MAX_ATTEMPTS = 5
+OTP_CHALLENGE_STORE = getenv("OTP_CHALLENGE_STORE", "apps.account.helpers.otp.RedisOTPStore")
+TOKEN_REVOCATION_STORE = getenv("TOKEN_REVOCATION_STORE", "apps.account.helpers.revocation.RedisRevocationStore")
+# Seconds between copies of the revocation log into the local bloom filter, the longest a revoked
+# access token can still pass in another process.
+TOKEN_REVOCATION_SYNC_INTERVAL = 1.0
+TOKEN_REVOCATION_BLOOM_CAPACITY = 100_000
+THROTTLE_RATE_LIMITER = getenv("THROTTLE_RATE_LIMITER", "apps.account.helpers.ratelimit.RedisRateLimiter")
+USERNAME_ALLOCATOR = "apps.account.helpers.usernames.DatabaseUsernameAllocator"
+USERNAME_BLOCK_SIZE = 100
 
 
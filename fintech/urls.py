@@ -4,11 +4,18 @@ from django.urls import path, include
 from django.utils.translation import gettext_lazy as _
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
 
+from apps.account.views import NextOfKinView
+from apps.core.metrics import metrics_view
+from apps.core.views import ContentViewTrendView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
     path("api/v1/schema/", SpectacularAPIView.as_view(), name="schema"),
     path("api/v1/auth/", include("apps.account.urls")),
     path("api/v1/auth/", include("djoser.urls")),
+    path("api/v1/profile/next-of-kin/", NextOfKinView.as_view(), name="next_of_kin"),
+    path("api/v1/content-views/trend/", ContentViewTrendView.as_view(), name="content_view_trend"),
     path(
         "api/v1/schema/swagger-ui/",
         SpectacularSwaggerView.as_view(url_name="schema"),
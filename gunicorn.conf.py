@@ -0,0 +1,27 @@
+import os
+
+from prometheus_client import multiprocess
+
+# Load the app in the master, so the warm-up below runs once and the workers share its memory.
+preload_app = os.getenv("GUNICORN_PRELOAD_APP", "True") == "True"
+
+
+def when_ready(server):
+    # Runs in the master before the first fork, see apps.core.warmup.
+    if preload_app:
+        from apps.core.warmup import prefork_warmup
+
+        prefork_warmup("web")
+
+
+def post_fork(server, worker):
+    if preload_app:
+        from apps.core.warmup import worker_warmup
+
+        worker_warmup()
+
+
+def child_exit(server, worker):
+    # Drop the live gauges of a dead worker from the multiprocess metrics, see apps.core.metrics.
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        multiprocess.mark_process_dead(worker.pid)
@@ -1,24 +1,157 @@
 import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
 from loguru import logger
+from loguru._file_sink import FileSink
 
 
 class InterceptHandler(logging.Handler):
     """
-    A custom logging handler that intercepts log messages and prints them to the console.
+    A custom logging handler that forwards stdlib log records to loguru.
     """
+    # Call site -> number of frames between ``emit`` and the code that logged the record.
+    _depths = {}
+    max_cached_depths = 4096
 
     def emit(self, record):
         try:
-            # Get the log message and level
-
-            level = record.levelname
-
+            level = logger.level(record.levelname).name
         except ValueError:
             level = record.levelno
-        #  # Get the logger name and message
-        frame, depth = logging.currentframe(), 2
-        while frame.f_code.co_filename == logging.__file__:
-            frame = frame.f_back
-            depth += 1
+        logger.opt(depth=self.caller_depth(record), exception=record.exc_info).log(level, record.getMessage())
+
+    @classmethod
+    def caller_depth(cls, record):
+        """
+        Find how deep the code that logged the record is below ``emit``.
+        The logging frames in between are the same for every record of a call site,
+        so the stack is only walked the first time a call site logs.
+        :param record: The log record.
+        :return: The depth to pass to ``logger.opt``
+        """
+        key = (record.pathname, record.lineno)
+        depth = cls._depths.get(key)
+        if depth is None:
+            # Frame 0 is this method and frame 1 is ``emit``.
+            frame, depth = sys._getframe(2), 1
+            while frame and frame.f_code.co_filename == logging.__file__:
+                frame = frame.f_back
+                depth += 1
+            if len(cls._depths) >= cls.max_cached_depths:
+                cls._depths.clear()
+            cls._depths[key] = depth
+        return depth
+
+
+class LogSampler:
+    """
+    Loguru patcher that samples and rate limits records of noisy channels.
+    Code logs to a channel with ``logger.bind(channel="auth.failed_login")``. Each channel may set
+    ``sample_rate``, the fraction of records kept, and ``rate``, the most records kept per second.
+    The decision is taken once per record and the sinks drop it through ``keep``. The next kept
+    record of the channel carries the number of records dropped in between as ``extra["suppressed"]``.
+    """
+
+    def __init__(self, channels):
+        self.channels = channels
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        extra = record["extra"]
+        policy = self.channels.get(extra.get("channel"))
+        if policy is None:
+            return
+        channel = extra["channel"]
+        sampled = random.random() < policy.get("sample_rate", 1.0)
+        now = time.monotonic()
+        with self._lock:
+            started, count, suppressed = self._windows.get(channel, (now, 0, 0))
+            if now - started >= 1:
+                started, count = now, 0
+            if sampled and count < policy.get("rate", float("inf")):
+                self._windows[channel] = (started, count + 1, 0)
+            else:
+                self._windows[channel] = (started, count, suppressed + 1)
+                extra["dropped"] = True
+                return
+        if suppressed:
+            extra["suppressed"] = suppressed
+
+    @staticmethod
+    def keep(record):
+        """
+        Sink filter that drops the records the sampler rejected.
+        :param record: The loguru record.
+        :return: True if the record must be written
+        """
+        return "dropped" not in record["extra"]
+
 
-        logger.opt(depth=depth, exception=record.exc_info).log(level, record.getMessage())
\ No newline at end of file
+class QueuedFileSink:
+    """
+    Loguru sink that hands formatted messages to a writer thread, which writes them to a file
+    with loguru's rotation, retention and compression. Unlike ``enqueue=True`` the record is
+    not pickled, so a log call costs about as much as a buffered write. Rotation and
+    compression still happen off the request path.
+    ``FileSink`` is private to loguru, which is pinned in requirements/base.txt.
+    """
+
+    def __init__(self, path, **options):
+        self.path = path
+        self.options = options
+        self._queue = None
+        self._writer = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        # Threads do not survive fork, so each process starts its own writer.
+        with self._lock:
+            if self._pid != os.getpid():
+                self._queue = queue.SimpleQueue()
+                self._writer = threading.Thread(target=self.run, args=(self._queue,),
+                                                name="log-writer", daemon=True)
+                self._writer.start()
+                self._pid = os.getpid()
+
+    def run(self, messages):
+        sink = FileSink(self.path, **self.options)
+        try:
+            for message in iter(messages.get, None):
+                sink.write(message)
+        finally:
+            sink.stop()
+
+    def write(self, message):
+        if self._pid != os.getpid():
+            self.start()
+        self._queue.put(message)
+
+    def stop(self):
+        """
+        Write the queued messages and close the file, called by loguru when the sink is removed.
+        """
+        with self._lock:
+            if self._pid == os.getpid():
+                self._queue.put(None)
+                self._writer.join()
+            self._pid = None
+
+
+def file_sink(path, queued=False, **options):
+    """
+    Build the loguru handler options of a log file.
+    :param path: The log file path.
+    :param queued: Write from a background thread.
+    :param options: Rotation, retention and compression options.
+    :return: The handler options
+    """
+    if queued:
+        return {"sink": QueuedFileSink(path, **options)}
+    return {"sink": path, **options}